@@ -1,37 +1,62 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, g
 from flask_cors import CORS
 import numpy as np
 from PIL import Image
-from rembg import remove
 import io
 import json
 from datetime import datetime
-import tensorflow as tf
 import os
-import requests
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from ..utils.config import (
-    INITIAL_MODEL_PATH, MODEL_DIR,
-    API_CONFIG, MODEL_TEMPLATES,
-    INTERFACE_DIR
+    MODEL_DIR, API_CONFIG, RESULTS_CONFIG, DATA_RANGES_INFO,
+    INTERFACE_DIR, MODEL_CONFIG
 )
-from ..federated_learning.model import create_model
+from ..federated_learning.model import (
+    create_model, compile_model, load_model, model_exists, store_model
+)
+from ..federated_learning import quantization
+from ..utils.model_index import get_model_index
+from ..utils.weights_store import model_key
+from ..utils.results_log import ResultsLogTail
+from ..utils.profiling import profiled
+from ..utils.metrics import get_registry, start_metrics
+from ..data.partition import get_partition
 
 app = Flask(__name__)
 CORS(app)
 
+_metrics = get_registry()
+REQUESTS = _metrics.counter('fl_api_requests_total', 'API requests by endpoint and status')
+REQUEST_DURATION = _metrics.histogram('fl_api_request_duration_seconds', 'API request latency')
+CACHE = _metrics.counter('fl_api_cache_total', 'API in-memory cache lookups')
+
+@app.before_request
+def _start_request_timer():
+    start_metrics('api')
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def _record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        # Label theo rule (vd. /model-stats/<model_name>) để số series không tăng theo URL
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_DURATION.observe(time.perf_counter() - start, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+def get_index():
+    """Model index của API: bản in-memory được watcher cập nhật khi index.json đổi."""
+    index = get_model_index()
+    index.watch()
+    return index
+
 def get_available_models():
     """Lấy danh sách tất cả các model có sẵn."""
-    models = []
-    for file in os.listdir(MODEL_DIR):
-        if file.endswith('.keras'):
-            path = os.path.join(MODEL_DIR, file)
-            models.append({
-                'name': file,
-                'path': path,
-                'last_modified': datetime.fromtimestamp(
-                    os.path.getmtime(path)
-                ).strftime('%Y-%m-%d %H:%M:%S')
-            })
     def get_priority(model):
         name = model['name'].lower()
         if 'best_additional_model' in name:
@@ -40,86 +65,117 @@ def get_available_models():
             return 1  # Ưu tiên thứ hai
         return 2     # Các file còn lại
 
-    # Sắp xếp theo priority trước, sau đó mới đến last_modified
-    return sorted(models, key=lambda x: (get_priority(x), 
-                        -datetime.strptime(x['last_modified'], '%Y-%m-%d %H:%M:%S').timestamp()))
+    # Sắp xếp theo priority trước, sau đó mới đến thời điểm lưu
+    entries = sorted(get_index().entries(), key=lambda m: (get_priority(m), -m['timestamp']))
+    return [
+        {'name': m['name'], 'path': m['path'], 'last_modified': m['last_modified']}
+        for m in entries
+    ]
 
-def load_model_by_name(model_name):
-    """Load model theo tên."""
-    model_path = os.path.join(MODEL_DIR, model_name)
-    if not os.path.exists(model_path):
+def get_model_info(model_name):
+    """Thông tin (name, path, last_modified) của một model."""
+    entry = get_index().get(model_name)
+    if entry is None:
         raise ValueError(f"Model {model_name} does not exist")
-    return tf.keras.models.load_model(model_path)
+    return {
+        'name': entry['name'],
+        'path': entry['path'],
+        'last_modified': entry['last_modified']
+    }
+
+def load_serving_model(model_name):
+    """Model dùng để predict: bản quantized đã publish (nếu bật và còn khớp hash), không thì float32."""
+    if API_CONFIG['serve_quantized']:
+        model = quantization.load_published(model_name)
+        if model is not None:
+            print(f"Serving {model.scheme} quantized {model_name}")
+            return model
+    return load_model(model_name)
+
+class ModelCache:
+    """LRU cache các models đã load, khoá theo tên và content hash trong index.
+
+    Model được lưu lại (hash mới) hoặc được quantize lại (report mới) sẽ được load
+    lại ở lần dùng tiếp theo. Mỗi tên
+    có lock riêng nên các request đồng thời không load cùng một model hai lần.
+    """
 
-def get_latest_model_path():
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get(self, model_name):
+        entry = get_index().get(model_name)
+        if entry is None:
+            raise ValueError(f"Model {model_name} does not exist")
+        name = model_key(model_name)
+        quantized = quantization.published_version(model_name) if API_CONFIG['serve_quantized'] else None
+        key = (name, entry['hash'] or entry['timestamp'], quantized)
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            with self._lock:
+                model = self._models.get(key)
+                if model is not None:
+                    self._models.move_to_end(key)
+            if model is not None:
+                CACHE.inc(cache='models', result='hit')
+                return model
+
+            CACHE.inc(cache='models', result='miss')
+            model = load_serving_model(model_name)
+            with self._lock:
+                # Bỏ bản cũ của cùng model (nếu đã được lưu lại) và các model ít dùng nhất
+                for stale in [k for k in self._models if k[0] == name]:
+                    del self._models[stale]
+                self._models[key] = model
+                while len(self._models) > self.capacity:
+                    self._models.popitem(last=False)
+            return model
+
+_model_cache = ModelCache(API_CONFIG['model_cache_size'])
+
+def load_model_by_name(model_name):
+    """Load model theo tên (qua cache của API)."""
+    return _model_cache.get(model_name)
+
+def get_latest_model_name():
     """Lấy model mới nhất từ các rounds training."""
-    try:
-        # Tìm tất cả các file model trong thư mục
-        model_files = [f for f in os.listdir(MODEL_DIR) if f.startswith('global_model_round_')]
-        if not model_files:
-            return INITIAL_MODEL_PATH
-        
-        # Lấy round number từ tên file
-        round_numbers = [int(f.split('_')[-1].replace('.keras', '')) for f in model_files]
-        latest_round = max(round_numbers)
-        
-        return MODEL_TEMPLATES['global'].format(latest_round)
-    except Exception as e:
-        print(f"Error finding latest model: {e}")
-        return INITIAL_MODEL_PATH
+    latest = get_index().latest_round('global_model')
+    return latest['name'] if latest else 'initial_model.keras'
 
 def get_dataset_statistics():
-    """Lấy thống kê về tập train và test của từng client."""
-    (x_train, y_train), (x_test, y_test) = tf.keras.datasets.mnist.load_data()
-    
-    # Tính toán thống kê cho từng client
-    client_stats = {}
-    
-    # Client 0: digits 0-2
-    train_mask_0 = np.isin(y_train, [0, 1, 2])
-    test_mask_0 = np.isin(y_test, [0, 1, 2])
-    train_labels_0 = y_train[train_mask_0]
-    test_labels_0 = y_test[test_mask_0]
-    
-    client_stats[0] = {
-        'train_samples': len(train_labels_0),
-        'test_samples': len(test_labels_0),
-        'train_distribution': {str(i): int(np.sum(train_labels_0 == i)) for i in [0, 1, 2]},
-        'test_distribution': {str(i): int(np.sum(test_labels_0 == i)) for i in [0, 1, 2]}
-    }
-    
-    # Client 1: digits 3-4
-    train_mask_1 = np.isin(y_train, [3, 4])
-    test_mask_1 = np.isin(y_test, [3, 4])
-    train_labels_1 = y_train[train_mask_1]
-    test_labels_1 = y_test[test_mask_1]
-    
-    client_stats[1] = {
-        'train_samples': len(train_labels_1),
-        'test_samples': len(test_labels_1),
-        'train_distribution': {str(i): int(np.sum(train_labels_1 == i)) for i in [3, 4]},
-        'test_distribution': {str(i): int(np.sum(test_labels_1 == i)) for i in [3, 4]}
+    """Lấy thống kê về tập train và test của từng client (từ histogram của partition)."""
+    partition = get_partition()
+    return {
+        cid: {
+            'train_samples': int(partition.histogram(cid, 'train').sum()),
+            'test_samples': int(partition.histogram(cid, 'test').sum()),
+            'train_distribution': {
+                str(label): count for label, count in partition.distribution(cid, 'train').items()
+            },
+            'test_distribution': {
+                str(label): count for label, count in partition.distribution(cid, 'test').items()
+            }
+        }
+        for cid in partition.client_ids
     }
-    
-    return client_stats
 
 def load_or_create_model():
     """Load model đã train hoặc tạo model mới nếu chưa có."""
     try:
-        model_path = get_latest_model_path()
-        if os.path.exists(model_path):
-            print(f"Loading model from {model_path}")
-            return tf.keras.models.load_model(model_path)
+        model_name = get_latest_model_name()
+        if model_exists(model_name):
+            print(f"Loading model {model_name}")
+            return load_model_by_name(model_name)
         else:
-            print(f"Creating new model as {model_path} does not exist")
-            model = create_model()
-            model.compile(
-                optimizer='adam',
-                loss='sparse_categorical_crossentropy',
-                metrics=['accuracy']
-            )
+            print(f"Creating new model as {model_name} does not exist")
+            model = compile_model(create_model())
             # Lưu model mới và thống kê dataset
-            model.save(INITIAL_MODEL_PATH)
+            store_model(model, 'initial_model', {'mode': 'initial', 'round': 0})
             dataset_stats = get_dataset_statistics()
             stats_path = os.path.join(MODEL_DIR, 'dataset_statistics.json')
             with open(stats_path, 'w') as f:
@@ -128,16 +184,10 @@ def load_or_create_model():
     except Exception as e:
         print(f"Error loading/creating model: {e}")
         # Trong trường hợp lỗi, tạo model mới
-        model = create_model()
-        model.compile(
-            optimizer='adam',
-            loss='sparse_categorical_crossentropy',
-            metrics=['accuracy']
-        )
-        return model
-
-def preprocess_image(image_data):
-    """Xử lý ảnh trước khi đưa vào model."""
+        return compile_model(create_model())
+
+def preprocess_image(image_data, remove_background=True):
+    """Xử lý ảnh trước khi đưa vào model (`remove_background=False` bỏ qua rembg)."""
     try:
         # Chuyển đổi bytes thành ảnh
         image = Image.open(io.BytesIO(image_data))
@@ -146,8 +196,12 @@ def preprocess_image(image_data):
         if image.mode != 'RGBA':
             image = image.convert('RGBA')
         
-        # Xoá nền bằng thư viện rembg
-        image_no_bg = remove(image)  # Xoá nền
+        # Xoá nền bằng thư viện rembg (import muộn: kéo theo ONNX runtime)
+        if remove_background:
+            from rembg import remove
+            image_no_bg = remove(image)  # Xoá nền
+        else:
+            image_no_bg = image
         
         # Chuyển đổi ảnh đã xoá nền sang grayscale
         image_no_bg = image_no_bg.convert('L')
@@ -164,10 +218,96 @@ def preprocess_image(image_data):
         print(f"Error preprocessing image: {e}")
         raise
 
-# Load model khi khởi động server
-model = load_or_create_model()
+def parse_raw_pixels(pixels, box=None):
+    """Ảnh grayscale uint8 (nét trắng trên nền đen như MNIST) -> input của model.
+
+    `pixels` là bytes hoặc list các giá trị 0-255: đủ 28x28 theo hàng, hoặc chỉ vùng
+    `box = (top, left, height, width)` chứa nét vẽ (phần còn lại là nền 0). Không
+    decode ảnh, không xoá nền, không resize.
+    """
+    height, width = MODEL_CONFIG['input_shape'][:2]
+    if isinstance(pixels, (bytes, bytearray)):
+        values = np.frombuffer(pixels, dtype=np.uint8)
+    else:
+        values = np.asarray(pixels)
+        if values.ndim != 1 or not np.issubdtype(values.dtype, np.integer):
+            raise ValueError("pixels must be a flat list of integers")
+        if values.size and (values.min() < 0 or values.max() > 255):
+            raise ValueError("pixel values must be in [0, 255]")
+        values = values.astype(np.uint8)
+
+    image = np.zeros((height, width), dtype=np.uint8)
+    if box is None:
+        if values.size != height * width:
+            raise ValueError(f"Expected {height * width} pixels, got {values.size}")
+        image[...] = values.reshape(height, width)
+    else:
+        top, left, box_height, box_width = (int(v) for v in box)
+        if min(top, left) < 0 or top + box_height > height or left + box_width > width:
+            raise ValueError(f"Bounding box {tuple(box)} is outside the {height}x{width} image")
+        if values.size != box_height * box_width:
+            raise ValueError(f"Expected {box_height * box_width} pixels for box {tuple(box)}, got {values.size}")
+        image[top:top + box_height, left:left + box_width] = values.reshape(box_height, box_width)
+    return image.reshape(1, height, width, 1).astype(np.float32) / 255.0
+
+def read_raw_pixels():
+    """Input dạng raw pixels của request, hoặc None nếu request gửi ảnh.
+
+    - `application/octet-stream`: 784 bytes, hoặc header 4 bytes (top, left,
+      height, width) + height*width bytes của vùng chứa nét vẽ
+    - JSON `{"pixels": [...] | "<base64>", "box": [top, left, height, width]}`
+      (`box` không bắt buộc)
+    """
+    if request.mimetype == 'application/octet-stream':
+        data = request.get_data()
+        height, width = MODEL_CONFIG['input_shape'][:2]
+        if len(data) == height * width:
+            return parse_raw_pixels(data)
+        if len(data) < 4:
+            raise ValueError(f"Expected {height * width} pixels or a 4-byte box header, got {len(data)} bytes")
+        return parse_raw_pixels(data[4:], tuple(data[:4]))
+    if request.is_json:
+        data = request.get_json()
+        if 'pixels' not in data:
+            return None
+        pixels = data['pixels']
+        if isinstance(pixels, str):
+            import base64
+            try:
+                pixels = base64.b64decode(pixels, validate=True)
+            except ValueError:
+                raise ValueError("pixels must be a list of integers or a base64 string")
+        return parse_raw_pixels(pixels, data.get('box'))
+    return None
+
+def read_image_inputs():
+    """Ảnh của request: JSON {'url' | 'urls'}, multipart (mọi file) hoặc raw body."""
+    if request.is_json:
+        data = request.get_json()
+        urls = data.get('urls') or ([data['url']] if data.get('url') else [])
+        if not urls:
+            return []
+        import requests
+        return [requests.get(url).content for url in urls]
+    if request.files:
+        return [f.read() for name in request.files for f in request.files.getlist(name)]
+    return [request.data] if request.data else []
+
+def get_default_model():
+    """(tên, model) mặc định cho /recognize: round mới nhất trong index, load qua
+    `ModelCache` nên đổi theo index (round mới, model lưu lại, bản int8 được publish).
+    Chưa có model nào thì tạo initial model."""
+    model_name = get_latest_model_name()
+    if model_exists(model_name):
+        return model_name, load_model_by_name(model_name)
+    return model_name, load_or_create_model()
+
+def _request_id():
+    """ID của request hiện tại: header X-Request-ID hoặc ID ngẫu nhiên."""
+    return request.headers.get('X-Request-ID') or uuid.uuid4().hex[:12]
 
 @app.route('/recognize', methods=['POST'])
+@profiled('recognize', lambda: f'req{_request_id()}')
 def recognize():
     try:
         # Kiểm tra và lấy model được chỉ định
@@ -179,25 +319,35 @@ def recognize():
             except ValueError as e:
                 return jsonify({'error': str(e)}), 400
         else:
-            model_name = os.path.basename(get_latest_model_path())
+            model_name, model = get_default_model()
             print(f"Using latest model: {model_name}")
 
-        # Kiểm tra xem có dữ liệu URL không
-        if request.is_json:
-            data = request.get_json()
-            image_url = data.get('url')
-            if image_url:
-                image_data = requests.get(image_url).content
+        # Raw pixels (vd. từ canvas) đi thẳng vào model, không qua decode/rembg
+        try:
+            image_array = read_raw_pixels()
+        except ValueError as e:
+            return jsonify({'error': str(e), 'success': False}), 400
+
+        if image_array is None:
+            # Kiểm tra xem có dữ liệu URL không
+            if request.is_json:
+                data = request.get_json()
+                image_url = data.get('url')
+                if image_url:
+                    import requests
+                    image_data = requests.get(image_url).content
+                else:
+                    return jsonify({'error': 'No image URL provided'}), 400
             else:
-                return jsonify({'error': 'No image URL provided'}), 400
-        else:
-            image_data = request.data
-            if not image_data:
-                return jsonify({'error': 'No image data received'}), 400
-            
-        # Xử lý ảnh và dự đoán
-        image_array = preprocess_image(image_data)
-        prediction = model.predict(image_array)
+                image_data = request.data
+                if not image_data:
+                    return jsonify({'error': 'No image data received'}), 400
+
+            # Xử lý ảnh
+            image_array = preprocess_image(image_data, API_CONFIG['remove_background'])
+
+        # Dự đoán (predict_on_batch: không dựng data pipeline cho một ảnh)
+        prediction = np.asarray(model.predict_on_batch(image_array))
         digit = np.argmax(prediction[0])
         confidence = float(prediction[0][digit])
         all_confidence = []
@@ -205,13 +355,7 @@ def recognize():
             all_confidence.append(round(float(i),6))
         
         # Chuẩn bị thông tin response
-        model_info = {
-            'name': model_name,
-            'path': os.path.join(MODEL_DIR, model_name),
-            'last_modified': datetime.fromtimestamp(
-                os.path.getmtime(os.path.join(MODEL_DIR, model_name))
-            ).strftime('%Y-%m-%d %H:%M:%S')
-        }
+        model_info = get_model_info(model_name)
         
         return jsonify({
             'digit': int(digit),
@@ -229,6 +373,97 @@ def recognize():
             'success': False
         }), 500
     
+_compare_executor = ThreadPoolExecutor(max_workers=API_CONFIG['compare_max_models'],
+                                       thread_name_prefix='compare')
+
+def _requested_models():
+    """Tên models cần so sánh: ?models=a,b, form field `models` hoặc JSON {'models': [...]}."""
+    if request.is_json:
+        names = request.get_json().get('models') or []
+    else:
+        names = (request.args.get('models') or request.form.get('models') or '').split(',')
+    # Giữ thứ tự, bỏ trùng lặp: model đầu tiên là baseline
+    return list(dict.fromkeys(name.strip() for name in names if name.strip()))
+
+def _predict(model_name, model, batch):
+    start = time.perf_counter()
+    probabilities = np.asarray(model.predict_on_batch(batch))
+    return model_name, probabilities, time.perf_counter() - start
+
+@app.route('/compare', methods=['POST'])
+@profiled('recognize', lambda: f'compare{_request_id()}')
+def compare():
+    """Chạy nhiều models trên cùng các ảnh (tiền xử lý một lần) và so sánh dự đoán."""
+    try:
+        model_names = _requested_models()
+        if not model_names:
+            return jsonify({'error': 'No models provided', 'success': False}), 400
+        if len(model_names) > API_CONFIG['compare_max_models']:
+            return jsonify({
+                'error': f"At most {API_CONFIG['compare_max_models']} models per request",
+                'success': False
+            }), 400
+        try:
+            models = {name: load_model_by_name(name) for name in model_names}
+        except ValueError as e:
+            return jsonify({'error': str(e), 'success': False}), 400
+
+        images = read_image_inputs()
+        if not images:
+            return jsonify({'error': 'No image data received', 'success': False}), 400
+        if len(images) > API_CONFIG['compare_max_images']:
+            return jsonify({
+                'error': f"At most {API_CONFIG['compare_max_images']} images per request",
+                'success': False
+            }), 400
+
+        # Tiền xử lý (rembg) một lần cho mọi model, rồi gom thành một batch
+        batch = np.concatenate([
+            preprocess_image(image, API_CONFIG['remove_background']) for image in images
+        ])
+
+        # Các models chạy song song trên cùng batch (TensorFlow nhả GIL khi tính toán)
+        futures = [
+            _compare_executor.submit(_predict, name, model, batch) for name, model in models.items()
+        ]
+        outputs = [future.result() for future in futures]
+
+        digits = {name: np.argmax(probabilities, axis=1) for name, probabilities, _ in outputs}
+        baseline = model_names[0]
+        stacked = np.stack([digits[name] for name in model_names])
+        all_agree = (stacked == stacked[0]).all(axis=0)
+
+        results = {}
+        for name, probabilities, seconds in outputs:
+            confidence = probabilities[np.arange(len(batch)), digits[name]]
+            results[name] = {
+                'digits': digits[name].tolist(),
+                'confidence': [round(float(c) * 100, 4) for c in confidence],
+                'all_confidence': np.round(probabilities.astype(float), 6).tolist(),
+                'agreement_with_baseline': float(np.mean(digits[name] == digits[baseline])),
+                'inference_time': round(seconds, 6),
+                'model_info': get_model_info(name),
+            }
+
+        return jsonify({
+            'success': True,
+            'num_images': len(batch),
+            'baseline': baseline,
+            'models': results,
+            'agreement': {
+                'all_models': float(np.mean(all_agree)),
+                'per_image': all_agree.tolist(),
+            },
+            'prediction_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        })
+
+    except Exception as e:
+        print(f"Error in compare: {e}")
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 500
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Endpoint kiểm tra trạng thái server."""
@@ -248,63 +483,140 @@ def health_check():
             'error': str(e)
         }), 500
     
+class ModelStatsTail(ResultsLogTail):
+    """Thống kê cho /model-stats, dựng tăng dần từ results log (.jsonl) của model.
+
+    Mỗi poll chỉ xử lý các round mới; response JSON được cache cho tới khi log
+    có record mới. Nếu chỉ có file kết quả .json cũ, file đó được chuyển thành
+    các record tương đương (đọc lại khi mtime đổi).
+    """
+
+    def __init__(self, results_path):
+        super().__init__(f'{results_path}l')
+        self.legacy_path = results_path
+        self.legacy_mtime = None
+        self.on_reset()
+
+    def on_reset(self):
+        self.accuracy_history = []
+        self.client_ids = {}
+        self.last_round = None
+        self.summary = None
+        self.timestamp = None
+        self.body = None
+
+    def on_record(self, record):
+        record_type = record.get('type')
+        if record_type == 'round':
+            self.accuracy_history.append({
+                'round': record['round'],
+                'accuracy': record['accuracy'],
+                'client_accuracies': {
+                    client['client_id']: client['accuracy']
+                    for client in record['client_metrics']
+                }
+            })
+            self.last_round = record
+            self.client_ids.update(dict.fromkeys(record.get('active_clients', [])))
+        elif record_type == 'summary':
+            self.summary = record
+        self.timestamp = record.get('timestamp', self.timestamp)
+        self.body = None
+
+    def refresh(self):
+        """Cập nhật từ log; trả về False nếu chưa có kết quả nào cho model."""
+        if os.path.exists(self.path):
+            self.poll()
+            return self.last_round is not None
+        if not os.path.exists(self.legacy_path):
+            return False
+        with self.lock:
+            mtime = os.path.getmtime(self.legacy_path)
+            if mtime != self.legacy_mtime:
+                with open(self.legacy_path, 'r') as f:
+                    data = json.load(f)
+                self.on_reset()
+                for round_metrics in data['training_info']['training_history']:
+                    self.on_record({'type': 'round', **round_metrics})
+                self.on_record({'type': 'summary', **data})
+                self.legacy_mtime = mtime
+        return self.last_round is not None
+
+    def response_body(self, model_name):
+        with self.lock:
+            CACHE.inc(cache='model_stats', result='hit' if self.body is not None else 'miss')
+            if self.body is None:
+                self.body = json.dumps(self._build(model_name))
+            return self.body
+
+    def _build(self, model_name):
+        if self.summary is not None:
+            client_ranges = self.summary['active_clients_info']['client_ranges']
+            overall = self.summary['dataset_statistics']['overall']
+            dataset_size = {
+                'train': overall['train']['total_samples'],
+                'test': overall['test']['total_samples']
+            }
+        else:
+            # Run đang chạy: chưa có summary, lấy labels từ cấu hình của clients
+            client_ranges = {
+                cid: DATA_RANGES_INFO['client_ranges'][cid]
+                for cid in self.client_ids if cid in DATA_RANGES_INFO['client_ranges']
+            }
+            dataset_size = None
+
+        client_labels = []
+        for client_info in client_ranges.values():
+            client_labels = client_labels + list(client_info['labels'])
+        client_labels = list(dict.fromkeys(client_labels))
+
+        return {
+            'model_name': model_name,
+            'total_rounds': self.last_round['round'],
+            'final_metrics': {
+                'accuracy': self.last_round['accuracy'],
+                'loss': self.last_round['loss']
+            },
+            'client_labels': client_labels,
+            'dataset_size': dataset_size,
+            'accuracy_history': self.accuracy_history,
+            'in_progress': self.summary is None,
+            'timestamp': self.timestamp,
+        }
+
+_model_stats = OrderedDict()
+_model_stats_lock = threading.Lock()
+
 @app.route('/model-stats/<model_name>', methods=['GET'])
 def get_stats(model_name):
-    """API endpoint để lấy thống kê model."""
-    json_name = model_name.replace('.keras', '.json')
-    json_path = os.path.join(MODEL_DIR, "results", json_name)
-    
-    # Check if file exists using os.path.exists instead of .exists()
-    if not os.path.exists(json_path):
+    """API endpoint để lấy thống kê model (cache in-memory LRU, tail results log)."""
+    results_name = model_name.replace('.keras', '.json')
+    with _model_stats_lock:
+        stats = _model_stats.get(results_name)
+        if stats is None:
+            stats = _model_stats[results_name] = ModelStatsTail(
+                os.path.join(RESULTS_CONFIG['save_dir'], results_name)
+            )
+            while len(_model_stats) > API_CONFIG['model_stats_cache_size']:
+                _model_stats.popitem(last=False)
+        else:
+            _model_stats.move_to_end(results_name)
+
+    if not stats.refresh():
+        # Không giữ trạng thái cho tên không có results (tên tuỳ ý từ URL)
+        with _model_stats_lock:
+            if _model_stats.get(results_name) is stats:
+                del _model_stats[results_name]
         return jsonify({
             'error': 'Model statistics not found',
             'status': f'No statistics found for model: {model_name}'
         }), 404
-        
-    # Read and parse JSON file
-    with open(json_path, 'r') as f:
-        data = json.load(f)
-    
-    # Extract required statistics
-    training_info = data['training_info']
-    dataset_stats = data['dataset_statistics']
-    active_clients = data['active_clients_info']
-    
-    # Compile client labels
-    client_labels = []
-    for _, client_info in active_clients['client_ranges'].items():
-        client_labels = client_labels + client_info['labels']
-    client_labels = list(dict.fromkeys(client_labels))
-    
-    # Calculate accuracy per round
-    accuracy_per_round = [
-        {
-            'round': round['round'],
-            'accuracy': round['accuracy'],  # Convert to percentage
-            'client_accuracies': {
-                client['client_id']: client['accuracy']
-                for client in round['client_metrics']
-            }
-        }
-        for round in training_info['training_history']
-    ]
-    
-    # Compile statistics
-    return jsonify({
-        'model_name': model_name,
-        'total_rounds': training_info['total_rounds'],
-        'final_metrics': {
-            'accuracy': training_info['final_accuracy'],  # Convert to percentage
-            'loss': training_info['final_loss']
-        },
-        'client_labels': client_labels,
-        'dataset_size': {
-            'train': dataset_stats['overall']['train']['total_samples'],
-            'test': dataset_stats['overall']['test']['total_samples']
-        },
-        'accuracy_history': accuracy_per_round,
-        'timestamp': data["timestamp"],
-    })
+    return app.response_class(stats.response_body(model_name), mimetype='application/json')
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Metrics của process API theo Prometheus text format."""
+    return app.response_class(get_registry().render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def serve_vue_app():
@@ -0,0 +1,144 @@
+"""Benchmark: truyền một update theo chunks qua kết nối chập chờn, so với gửi nguyên.
+
+Client (`UploadStore`) và server (`ChunkReceiver`) chạy trong cùng process; proxy giả
+làm lỗi ngẫu nhiên từng request (`--failure_rate`), làm hỏng dữ liệu (`--corrupt_rate`)
+và mất hẳn kết nối sau một số chunks (`--disconnect_after`), khi đó client "kết nối
+lại" thành proxy mới. Báo cáo số bytes server thực nhận so với kích thước update, số
+chunks phải hỏi lại, và kiểm tra update nhận được giống hệt từng bit. Với gửi nguyên,
+mỗi lần lỗi giữa chừng phải gửi lại cả update: số bytes kỳ vọng là
+nbytes / P(cả message không lỗi), với P = (1 - failure_rate) ^ số chunks.
+
+    python -m backend.benchmarks.chunked_transfer --size 25000000 --failure_rate 0.02
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from ..federated_learning import transfer
+from ..utils.config import TRANSFER_CONFIG
+
+
+class FlakyProxy:
+    """ClientProxy giả gọi thẳng `handle_transfer` của client, có lỗi giả lập."""
+
+    def __init__(self, cid, rng, failure_rate, corrupt_rate, disconnect_after=None):
+        self.cid = f'proxy-{cid}-{id(self)}'
+        self.client_id = cid
+        self.rng = rng
+        self.failure_rate = failure_rate
+        self.corrupt_rate = corrupt_rate
+        self.disconnect_after = disconnect_after
+        self.requests = 0
+
+    def get_properties(self, ins, timeout, group_id):
+        self.requests += 1
+        if self.disconnect_after is not None and self.requests > self.disconnect_after:
+            raise ConnectionError("connection lost")
+        if 'transfer_chunk' in ins.config and self.rng.random() < self.failure_rate:
+            raise TimeoutError("request timed out")
+        res = transfer.handle_transfer(self.client_id, ins)
+        data = res.properties.get('data')
+        if data and self.rng.random() < self.corrupt_rate:
+            corrupted = bytearray(data)
+            corrupted[self.rng.randrange(len(corrupted))] ^= 0xFF
+            res.properties['data'] = bytes(corrupted)
+        return res
+
+
+class ClientManager:
+    """Client manager giả: proxy mới xuất hiện khi client kết nối lại."""
+
+    def __init__(self):
+        self.proxies = {}
+
+    def all(self):
+        return dict(self.proxies)
+
+
+def run(args, rng):
+    data_rng = np.random.default_rng(args.seed)
+    arrays = [data_rng.standard_normal(args.size, dtype=np.float32)]
+    manifest = transfer.publish_update('1', arrays, {'transfer_chunk_bytes': args.chunk_bytes})
+    num_chunks = -(-arrays[0].nbytes // args.chunk_bytes)
+
+    manager = ClientManager()
+    first = FlakyProxy('1', rng, args.failure_rate, args.corrupt_rate, args.disconnect_after)
+    manager.proxies[first.cid] = first
+    finder = transfer.ProxyFinder(manager, busy={first.cid})
+
+    def reconnect():
+        # Client kết nối lại: proxy mới (kết nối ổn định từ đây)
+        proxy = FlakyProxy('1', rng, args.failure_rate, args.corrupt_rate)
+        manager.proxies[proxy.cid] = proxy
+        return finder.find(manifest['transfer_id'])
+
+    receiver = transfer.ChunkReceiver(manifest, np.float32)
+    start = time.perf_counter()
+    proxy = receiver.fetch(first, reconnect=reconnect)
+    elapsed = time.perf_counter() - start
+    transfer.release(proxy, manifest['transfer_id'])
+
+    whole_success = (1 - args.failure_rate) ** num_chunks * (1 - args.corrupt_rate) ** num_chunks
+    return {
+        'nbytes': arrays[0].nbytes,
+        'chunks': num_chunks,
+        'chunk_bytes': args.chunk_bytes,
+        'bytes_received': receiver.bytes_received,
+        'overhead': receiver.bytes_received / arrays[0].nbytes - 1,
+        'chunk_requests': sum(p.requests for p in manager.proxies.values()),
+        'reconnects': len(manager.proxies) - 1,
+        'seconds': elapsed,
+        'identical': bool(np.array_equal(receiver.vector.buffer, arrays[0])),
+        'whole_message_expected_bytes': arrays[0].nbytes / whole_success if whole_success else float('inf'),
+        'released': transfer.get_upload_store().get('1', manifest['transfer_id']) is None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=25_000_000,
+                        help="Parameters in the update (default: 25M, ~100 MB float32)")
+    parser.add_argument("--chunk_bytes", type=int, default=TRANSFER_CONFIG['chunk_bytes'])
+    parser.add_argument("--failure_rate", type=float, default=0.02,
+                        help="Probability that a chunk request fails")
+    parser.add_argument("--corrupt_rate", type=float, default=0.01,
+                        help="Probability that a chunk arrives corrupted")
+    parser.add_argument("--disconnect_after", type=int, default=None,
+                        help="Drop the connection after this many requests (default: half the chunks)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    if args.disconnect_after is None:
+        args.disconnect_after = max(1, args.size * 4 // args.chunk_bytes // 2)
+    # Không đợi giữa các lần hỏi lại: chỉ đo số bytes và thời gian xử lý
+    TRANSFER_CONFIG['retry_backoff'] = 0.0
+    TRANSFER_CONFIG['max_retries'] = 3
+
+    result = run(args, random.Random(args.seed))
+    print(f"\nChunked transfer benchmark ({result['nbytes'] / 2 ** 20:.1f} MB, "
+          f"{result['chunks']} chunks of {args.chunk_bytes / 2 ** 10:.0f} KB)")
+    print("=" * 60)
+    print(f"Failure rate {args.failure_rate:.1%}, corrupt rate {args.corrupt_rate:.1%}, "
+          f"disconnect after {args.disconnect_after} requests")
+    print(f"Bytes received:          {result['bytes_received'] / 2 ** 20:.1f} MB "
+          f"(+{result['overhead']:.1%} for retries)")
+    print(f"Chunk requests:          {result['chunk_requests']} ({result['reconnects']} reconnects)")
+    print(f"Whole-message expected:  {result['whole_message_expected_bytes'] / 2 ** 20:.1f} MB "
+          f"(plus a full resend per disconnect)")
+    print(f"Time:                    {result['seconds']:.2f}s")
+    print(f"Identical:               {result['identical']}, released: {result['released']}")
+    print("=" * 60)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({**vars(args), **result}, f, indent=4)
+        print(f"Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
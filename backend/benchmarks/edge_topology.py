@@ -0,0 +1,181 @@
+"""Chạy thử topology 2 tầng trên localhost: server gốc, các edge aggregators và
+các clients phía sau chúng, mỗi vai trò một process `backend.main`.
+
+Mặc định: 2 edges (101, 102), mỗi edge 2 clients (1-4), dữ liệu synthetic và
+2 rounds. Với `--flat` chạy thêm baseline cùng số clients nối thẳng vào server
+gốc. Báo cáo wall time và fan-in của server gốc (số updates mỗi round). Model,
+keys và results được ghi vào thư mục tạm, không đụng tới `backend/models`.
+
+    python -m backend.benchmarks.edge_topology --edges 2 --group_size 2 --num_rounds 2 --flat
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from ..utils.config import BASE_DIR
+
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+
+# Trỏ mọi đường dẫn ghi file sang FL_SANDBOX_DIR trước khi import các module khác
+BOOTSTRAP = """
+import os, sys
+from backend.utils import config
+sandbox = os.environ['FL_SANDBOX_DIR']
+config.MODEL_DIR = sandbox
+config.INITIAL_MODEL_PATH = os.path.join(sandbox, 'initial_model.keras')
+config.DATA_SUMMARY_TEMPLATE = os.path.join(sandbox, '{}_data_summary.json')
+config.WEIGHTS_STORE_CONFIG['dir'] = os.path.join(sandbox, 'weights')
+config.MODEL_INDEX_CONFIG['path'] = os.path.join(sandbox, 'index.json')
+config.RESULTS_CONFIG['save_dir'] = os.path.join(sandbox, 'results')
+config.QUANTIZATION_CONFIG['dir'] = os.path.join(sandbox, 'quantized')
+config.MONITOR_CONFIG['save_system_metrics'] = False
+from backend.main import main
+sys.argv = ['main.py'] + sys.argv[1:]
+main()
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Topology:
+    """Các process của một lần chạy; log của mỗi process nằm trong `sandbox/logs`."""
+
+    def __init__(self, sandbox, args):
+        self.sandbox = sandbox
+        self.args = args
+        self.processes = []
+        self.log_dir = os.path.join(sandbox, 'logs')
+        os.makedirs(self.log_dir, exist_ok=True)
+
+    def spawn(self, name, *argv):
+        env = dict(os.environ, PYTHONPATH=PROJECT_ROOT, TF_CPP_MIN_LOG_LEVEL='3',
+                   FL_SANDBOX_DIR=self.sandbox)
+        log = open(os.path.join(self.log_dir, f'{name}.log'), 'w')
+        common = ['--mode', 'initial', '--synthetic', '--threads', str(self.args.threads)]
+        process = subprocess.Popen(
+            [sys.executable, '-c', BOOTSTRAP] + common + list(argv),
+            cwd=PROJECT_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+        self.processes.append((name, process, log))
+        return process
+
+    def stop(self):
+        for _, process, log in self.processes:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            log.close()
+
+    def failed(self):
+        return [name for name, process, _ in self.processes if process.returncode not in (0, None)]
+
+
+def run(args, hierarchical):
+    sandbox = tempfile.mkdtemp(prefix='fl_edges_')
+    topology = Topology(sandbox, args)
+    root_address = f'127.0.0.1:{args.port}'
+    num_clients = args.edges * args.group_size
+    start = time.perf_counter()
+    try:
+        root_argv = ['--server', '--num_rounds', str(args.num_rounds)]
+        if hierarchical:
+            root_argv += ['--edges', str(args.edges)]
+        root = topology.spawn('root', *root_argv)
+        time.sleep(args.startup_delay)  # Server gốc tạo model rồi mới listen
+
+        for e in range(args.edges):
+            if hierarchical:
+                edge_id = 101 + e
+                edge_address = f'127.0.0.1:{free_port()}'
+                topology.spawn(f'edge_{edge_id}', '--edge', '--cid', str(edge_id),
+                               '--server_address', root_address,
+                               '--listen_address', edge_address,
+                               '--group_size', str(args.group_size))
+            for c in range(args.group_size):
+                cid = 1 + e * args.group_size + c
+                topology.spawn(f'client_{cid}', '--client', '--cid', str(cid),
+                               '--server_address', edge_address if hierarchical else root_address)
+
+        root.wait(timeout=args.timeout)
+        elapsed = time.perf_counter() - start
+        for _, process, _ in topology.processes:
+            process.wait(timeout=60)  # Edges và clients kết thúc sau server gốc
+        return {
+            'topology': 'hierarchical' if hierarchical else 'flat',
+            'clients': num_clients,
+            'edges': args.edges if hierarchical else 0,
+            'wall_time': elapsed,
+            'root_fan_in': _root_fan_in(sandbox),
+            'failed_processes': topology.failed(),
+        }
+    except subprocess.TimeoutExpired:
+        return {'topology': 'hierarchical' if hierarchical else 'flat', 'error': 'timeout',
+                'logs': topology.log_dir}
+    finally:
+        topology.stop()
+        if not args.keep:
+            shutil.rmtree(sandbox, ignore_errors=True)
+        else:
+            print(f"Logs kept in: {topology.log_dir}")
+
+
+def _root_fan_in(sandbox):
+    """Số updates server gốc nhận ở mỗi round (từ results log)."""
+    path = os.path.join(sandbox, 'results', 'best_initial_model.jsonl')
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [r['num_clients'] for r in records if r.get('type') == 'round']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--edges", type=int, default=2, help="Number of edge aggregators")
+    parser.add_argument("--group_size", type=int, default=2, help="Clients per edge")
+    parser.add_argument("--num_rounds", type=int, default=2, help="Rounds of the root server")
+    parser.add_argument("--threads", type=int, default=1, help="TensorFlow threads per process")
+    parser.add_argument("--port", type=int, default=8080, help="Root server port (fixed by start_server)")
+    parser.add_argument("--startup_delay", type=float, default=10.0,
+                        help="Seconds to wait for the root server before starting edges/clients")
+    parser.add_argument("--timeout", type=float, default=900.0, help="Seconds before giving up")
+    parser.add_argument("--flat", action="store_true",
+                        help="Also run the same clients connected directly to the root server")
+    parser.add_argument("--keep", action="store_true", help="Keep the sandbox directory and logs")
+    parser.add_argument("--output", type=str, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = [run(args, hierarchical=True)]
+    if args.flat:
+        results.append(run(args, hierarchical=False))
+
+    print("\nEdge topology benchmark")
+    print("=" * 50)
+    for result in results:
+        if 'error' in result:
+            print(f"{result['topology']:>12}: {result['error']} (logs: {result['logs']})")
+            continue
+        print(f"{result['topology']:>12}: {result['clients']} clients, {result['edges']} edges, "
+              f"{result['wall_time']:.1f}s, root fan-in per round {result['root_fan_in']}"
+              + (f", failed: {result['failed_processes']}" if result['failed_processes'] else ""))
+    print("=" * 50)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
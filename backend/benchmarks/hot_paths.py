@@ -0,0 +1,377 @@
+"""Micro-benchmarks cho các hot path, lưu kết quả làm baseline JSON và so sánh.
+
+Chạy offline trên CPU: dữ liệu synthetic (cache .npy của partitioner) và các
+ảnh mẫu trong `backend/mnist_samples`. Weights store và model index được trỏ
+sang thư mục tạm nên không ghi gì vào `models/`.
+
+    python -m backend.benchmarks.hot_paths --save baseline.json
+    python -m backend.benchmarks.hot_paths --compare baseline.json --threshold 0.2
+    python -m backend.benchmarks.hot_paths --groups crypto predict
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+
+from ..utils.config import BASE_DIR, MODEL_INDEX_CONFIG, WEIGHTS_STORE_CONFIG
+
+SAMPLES_DIR = os.path.join(BASE_DIR, 'mnist_samples')
+
+
+def measure(fn, repeat, warmup=1):
+    """Chạy `fn` `warmup` lần rồi đo `repeat` lần; trả về thống kê (ms)."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    times = np.array(times)
+    return {
+        'median_ms': float(np.median(times)),
+        'mean_ms': float(times.mean()),
+        'min_ms': float(times.min()),
+        'p95_ms': float(np.percentile(times, 95)),
+        'repeat': repeat,
+    }
+
+
+def _quiet(fn):
+    """Bỏ output của `fn` (các hàm được đo in log ra stdout)."""
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fn()
+    return run
+
+
+# ---- Các nhóm benchmark: mỗi hàm yield (tên, hàm cần đo, số lần lặp) ----
+
+def bench_aggregate_fit(ctx):
+    from flwr.common import Code, FitRes, Status
+    from ..federated_learning.flwr_server import FederatedServer
+    from ..federated_learning.model import create_model, compile_model
+    from ..utils.parameters import ParameterVector
+
+    class AggregationServer(FederatedServer):
+        """FederatedServer chỉ đo phần aggregation: không lưu model, không evaluate."""
+
+        def _create_global_model(self, mode):
+            return compile_model(create_model())
+
+        def _validate_phase(self, active_client_ids):
+            pass
+
+        def _finish_round(self, server_round, aggregated, round_metrics, round_start_time):
+            pass
+
+    server = _quiet(lambda: AggregationServer(mode='initial'))()
+    server.num_rounds = sys.maxsize
+    base = ParameterVector.from_ndarrays(server.model.get_weights())
+    rng = np.random.default_rng(0)
+
+    for num_clients in ctx.client_counts:
+        results = [
+            (
+                SimpleNamespace(cid=f'proxy-{i}'),
+                FitRes(
+                    status=Status(code=Code.OK, message=''),
+                    parameters=base.like(
+                        base.buffer + rng.standard_normal(base.size, dtype=np.float32)
+                    ).to_parameters(),
+                    num_examples=1000 + i,
+                    metrics={'client_id': str(i + 1), 'accuracy': 0.5, 'loss': 1.0},
+                ),
+            )
+            for i in range(num_clients)
+        ]
+        yield (f'aggregate_fit/{num_clients}_clients',
+               _quiet(lambda: server.aggregate_fit(1, results, [])), ctx.repeat(10))
+
+
+def bench_aggregation(ctx):
+    """Decode + weighted average/ring sum: tuần tự (1 thread) so với thread pool."""
+    from ..utils.config import CPU_CONFIG
+    from ..utils.parameters import ParameterVector, aggregation_threads
+
+    rng = np.random.default_rng(0)
+    shapes = [(ctx.aggregation_size // 2,), (ctx.aggregation_size - ctx.aggregation_size // 2,)]
+    base = ParameterVector.zeros(shapes)
+    default_threads = CPU_CONFIG['aggregation_threads']
+
+    def with_threads(threads, fn):
+        def run():
+            CPU_CONFIG['aggregation_threads'] = threads
+            try:
+                return fn()
+            finally:
+                CPU_CONFIG['aggregation_threads'] = default_threads
+        return run
+
+    for num_clients in ctx.client_counts:
+        parameters = [
+            base.like(rng.standard_normal(base.size, dtype=np.float32)).to_parameters()
+            for _ in range(num_clients)
+        ]
+        weights = [1000 + i for i in range(num_clients)]
+        rings = [ParameterVector(rng.integers(0, 2 ** 32, base.size, dtype=np.uint32), shapes, np.uint32)
+                 for _ in range(num_clients)]
+
+        def aggregate():
+            vectors = ParameterVector.from_parameters_list(parameters)
+            return ParameterVector.weighted_average(vectors, weights)
+
+        for label, threads in (('serial', 1), (f'{aggregation_threads()}_threads', None)):
+            yield (f'aggregation/{num_clients}_clients_{label}',
+                   with_threads(threads, aggregate), ctx.repeat(10))
+            yield (f'aggregation/ring_sum_{num_clients}_clients_{label}',
+                   with_threads(threads, lambda: ParameterVector.ring_sum(rings)), ctx.repeat(10))
+
+
+def bench_crypto(ctx):
+    from ..federated_learning.model import create_model
+    from ..utils.crypto import CryptoUtils
+    from ..utils.parameters import ParameterVector
+
+    vector = ParameterVector.from_ndarrays(create_model().get_weights())
+    private_key, _ = CryptoUtils.generate_keypair()
+    _, peer_public_key = CryptoUtils.generate_keypair()
+    shared_key = CryptoUtils.generate_shared_key(private_key, peer_public_key)
+    mask = CryptoUtils.generate_mask(shared_key, 1, vector.size)
+    ring = ParameterVector(CryptoUtils.quantize(vector.buffer, 1000), vector.shapes, np.uint32)
+    secret = CryptoUtils.serialize_private_key(private_key)
+    shares = CryptoUtils.split_secret(secret, 10, 5)
+
+    yield ('crypto/generate_mask',
+           lambda: CryptoUtils.generate_mask(shared_key, 1, vector.size), ctx.repeat(50))
+    yield 'crypto/quantize', lambda: CryptoUtils.quantize(vector.buffer, 1000), ctx.repeat(200)
+    yield 'crypto/apply_mask', lambda: CryptoUtils.apply_mask(ring, mask), ctx.repeat(200)
+    yield 'crypto/remove_mask', lambda: CryptoUtils.remove_mask(ring, mask), ctx.repeat(200)
+    yield 'crypto/dequantize', lambda: CryptoUtils.dequantize(ring.buffer, 1000), ctx.repeat(200)
+    yield ('crypto/shared_key',
+           lambda: CryptoUtils.generate_shared_key(private_key, peer_public_key), ctx.repeat(200))
+    yield 'crypto/split_secret_10', lambda: CryptoUtils.split_secret(secret, 10, 5), ctx.repeat(200)
+    yield ('crypto/combine_shares_5',
+           lambda: CryptoUtils.combine_shares(shares[:5], len(secret)), ctx.repeat(200))
+
+
+def bench_secure_aggregation(ctx):
+    """Key exchange của một round và phần unmask khi có 1 client bị drop (in-process)."""
+    from ..federated_learning.model import create_model
+    from ..federated_learning.secure_aggregation import (
+        SecureAggregationCoordinator, handle_properties
+    )
+
+    class Proxy(SimpleNamespace):
+        def get_properties(self, ins, timeout, group_id):
+            return handle_properties(self.cid, ins)
+
+    size = sum(w.size for w in create_model().get_weights())
+    rounds = iter(range(1, sys.maxsize))
+
+    for num_clients in ctx.client_counts:
+        proxies = [(Proxy(cid=str(i + 1)), None) for i in range(num_clients)]
+        coordinator = SecureAggregationCoordinator()
+
+        def setup():
+            server_round = next(rounds)
+            coordinator.setup(server_round, proxies)
+            return server_round
+
+        def recover():
+            server_round = setup()
+            survivors = [proxy.cid for proxy, _ in proxies[1:]]
+            coordinator.unmask_correction(server_round, survivors, size)
+
+        yield f'secagg/setup_{num_clients}_clients', _quiet(setup), ctx.repeat(5)
+        if num_clients >= 3:  # Với 2 clients, một survivor không đủ ngưỡng để khôi phục
+            yield f'secagg/setup_and_recover_{num_clients}_clients', _quiet(recover), ctx.repeat(5)
+
+
+def bench_load_data(ctx):
+    from ..federated_learning import flwr_client
+    from ..utils.config import DATA_RANGES_INFO
+
+    # Summary của dữ liệu synthetic ghi vào thư mục tạm, không đè file của clients thật
+    flwr_client.DATA_SUMMARY_TEMPLATE = os.path.join(ctx.tmp_dir, '{}_data_summary.json')
+    for cid in DATA_RANGES_INFO['client_ranges']:
+        yield (f'load_data/client_{cid}',
+               _quiet(lambda cid=cid: flwr_client.load_data(int(cid), synthetic=True)),
+               ctx.repeat(5))
+
+
+def bench_preprocess(ctx):
+    from ..api.server import preprocess_image
+
+    images = []
+    for file in sorted(os.listdir(SAMPLES_DIR)):
+        with open(os.path.join(SAMPLES_DIR, file), 'rb') as f:
+            images.append(f.read())
+    cycle = iter(range(sys.maxsize))
+
+    def run(remove_background):
+        return lambda: preprocess_image(images[next(cycle) % len(images)], remove_background)
+
+    yield 'preprocess_image/no_rembg', run(False), ctx.repeat(50)
+    yield 'preprocess_image/rembg', _quiet(run(True)), ctx.repeat(5)
+
+
+def bench_predict(ctx):
+    from ..federated_learning.model import create_model, compile_model
+
+    model = compile_model(create_model())
+    rng = np.random.default_rng(0)
+    for batch_size in ctx.batch_sizes:
+        x = rng.random((batch_size, 28, 28, 1), dtype=np.float32)
+        yield (f'predict/batch_{batch_size}',
+               lambda x=x: model.predict(x, verbose=0), ctx.repeat(20))
+
+
+def bench_model_io(ctx):
+    import tensorflow as tf
+    from ..federated_learning.model import create_model, compile_model, load_model, store_model
+
+    model = compile_model(create_model())
+    keras_path = os.path.join(ctx.tmp_dir, 'bench_model.keras')
+    model.save(keras_path)
+    store_model(model, 'bench_model')
+
+    yield 'model_io/store_model', lambda: store_model(model, 'bench_model'), ctx.repeat(10)
+    yield 'model_io/load_model', lambda: load_model('bench_model'), ctx.repeat(10)
+    yield 'model_io/keras_save', lambda: model.save(keras_path), ctx.repeat(10)
+    yield 'model_io/keras_load', lambda: tf.keras.models.load_model(keras_path), ctx.repeat(10)
+
+
+GROUPS = {
+    'aggregate_fit': bench_aggregate_fit,
+    'aggregation': bench_aggregation,
+    'crypto': bench_crypto,
+    'secure_aggregation': bench_secure_aggregation,
+    'load_data': bench_load_data,
+    'preprocess': bench_preprocess,
+    'predict': bench_predict,
+    'model_io': bench_model_io,
+}
+
+
+def run_benchmarks(ctx, groups):
+    results = {}
+    for group in groups:
+        for name, fn, repeat in GROUPS[group](ctx):
+            try:
+                results[name] = measure(fn, repeat)
+                print(f"{name:>32}: median {results[name]['median_ms']:9.3f} ms  "
+                      f"p95 {results[name]['p95_ms']:9.3f} ms  (n={repeat})")
+            except Exception as e:
+                # Ví dụ rembg cần tải model u2net, không có khi chạy offline
+                results[name] = {'skipped': f'{type(e).__name__}: {e}'}
+                print(f"{name:>32}: skipped ({results[name]['skipped'][:80]})")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """So sánh median với baseline; trả về danh sách các benchmark chậm hơn `threshold`."""
+    regressions = []
+    print(f"\nComparison with baseline (threshold {threshold:.0%})")
+    print("=" * 50)
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if 'median_ms' not in result or not base or 'median_ms' not in base:
+            continue
+        ratio = result['median_ms'] / base['median_ms']
+        if ratio > 1 + threshold:
+            status = 'REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            status = 'improved'
+        else:
+            status = 'ok'
+        result['baseline_median_ms'] = base['median_ms']
+        result['ratio'] = ratio
+        print(f"{name:>32}: {base['median_ms']:9.3f} -> {result['median_ms']:9.3f} ms "
+              f"({ratio:5.2f}x) {status}")
+    print("=" * 50)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", nargs="+", choices=list(GROUPS), default=list(GROUPS),
+                        help="Benchmark groups to run")
+    parser.add_argument("--client_counts", type=int, nargs="+", default=[2, 5, 10, 20],
+                        help="Client counts for aggregate_fit and aggregation")
+    parser.add_argument("--aggregation_size", type=int, default=2_000_000,
+                        help="Parameters per update for the aggregation group")
+    parser.add_argument("--batch_sizes", type=int, nargs="+",
+                        default=[1, 2, 4, 8, 16, 32, 64, 128, 256],
+                        help="Batch sizes for predict")
+    parser.add_argument("--repeat", type=int,
+                        help="Override the number of timed runs of every benchmark")
+    parser.add_argument("--save", type=str, help="Write results as a JSON baseline to this path")
+    parser.add_argument("--compare", type=str, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative slowdown of the median counted as a regression")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+
+    tmp_dir = tempfile.mkdtemp(prefix='fl_bench_')
+    # Store và index tạm (phải đặt trước khi các singleton được tạo)
+    WEIGHTS_STORE_CONFIG['dir'] = os.path.join(tmp_dir, 'weights')
+    MODEL_INDEX_CONFIG['path'] = os.path.join(tmp_dir, 'index.json')
+    ctx = SimpleNamespace(
+        tmp_dir=tmp_dir,
+        client_counts=args.client_counts,
+        aggregation_size=args.aggregation_size,
+        batch_sizes=args.batch_sizes,
+        repeat=lambda default: args.repeat or default,
+    )
+
+    print(f"\nHot path benchmarks ({', '.join(args.groups)})")
+    print("=" * 50)
+    try:
+        results = run_benchmarks(ctx, args.groups)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    print("=" * 50)
+
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+
+    if args.save:
+        import tensorflow as tf
+        report = {
+            'meta': {
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'tensorflow': tf.__version__,
+                'machine': platform.machine(),
+                'cpu_count': os.cpu_count(),
+            },
+            'results': results,
+        }
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"Results saved to: {args.save}")
+
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""Load test cho recognition API (`/recognize`, `/health`) trên localhost.
+
+Mặc định khởi động Flask app trong một process riêng (127.0.0.1, cổng trống),
+gửi lại các ảnh trong `backend/mnist_samples` cùng các PNG canvas synthetic
+với concurrency và request rate cấu hình được, rồi báo cáo throughput, latency
+p50/p95/p99, error rate và CPU/RSS của server theo thời gian.
+
+    python -m backend.benchmarks.load_test --concurrency 8 --duration 30
+    python -m backend.benchmarks.load_test --rate 20 --health_ratio 0.1 --no_rembg
+    python -m backend.benchmarks.load_test --url http://127.0.0.1:5000 --server_pid 1234
+"""
+import argparse
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from ..utils.config import BASE_DIR, MONITOR_CONFIG
+
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+SAMPLES_DIR = os.path.join(BASE_DIR, 'mnist_samples')
+RESULTS_DIR = os.path.join(MONITOR_CONFIG['monitoring_dir'], 'load_test')
+
+SERVER_SCRIPT = """
+from backend.utils.config import API_CONFIG
+API_CONFIG['remove_background'] = {remove_background}
+from backend.api import server
+server.get_default_model()
+server.app.run(host='127.0.0.1', port={port}, debug=False, threaded=True)
+"""
+
+
+# ---- Payloads ----
+
+def load_sample_images():
+    images = []
+    for file in sorted(os.listdir(SAMPLES_DIR)):
+        with open(os.path.join(SAMPLES_DIR, file), 'rb') as f:
+            images.append(f.read())
+    return images
+
+
+def synthetic_canvas_images(count, seed=0, size=280):
+    """PNG giống ảnh vẽ trên canvas của frontend: nét trắng dày trên nền đen."""
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        image = Image.new('RGBA', (size, size), (0, 0, 0, 255))
+        draw = ImageDraw.Draw(image)
+        points = [
+            (rng.uniform(0.25, 0.75) * size, rng.uniform(0.15, 0.85) * size)
+            for _ in range(rng.randint(3, 7))
+        ]
+        draw.line(points, fill=(255, 255, 255, 255), width=rng.randint(14, 24), joint='curve')
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        images.append(buffer.getvalue())
+    return images
+
+
+# ---- Server ----
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(remove_background, timeout=180):
+    """Chạy Flask app trong process con; trả về (process, base_url) khi server nhận kết nối."""
+    port = _free_port()
+    script = SERVER_SCRIPT.format(remove_background=remove_background, port=port)
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT, TF_CPP_MIN_LOG_LEVEL='3')
+    process = subprocess.Popen(
+        [sys.executable, '-c', script], cwd=PROJECT_ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API server exited with code {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise TimeoutError("API server did not start in time")
+
+
+class ProcessSampler(threading.Thread):
+    """Lấy mẫu CPU (%) và RSS (MB) của một process qua /proc mỗi `interval` giây."""
+
+    def __init__(self, pid, interval):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+        self._ticks = os.sysconf('SC_CLK_TCK')
+
+    def _read(self):
+        with open(f'/proc/{self.pid}/stat') as f:
+            # Bỏ phần "(comm)" có thể chứa dấu cách; utime, stime là field 14, 15
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / self._ticks
+        rss_kb, threads = 0, 0
+        with open(f'/proc/{self.pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss_kb = int(line.split()[1])
+                elif line.startswith('Threads:'):
+                    threads = int(line.split()[1])
+        return cpu_seconds, rss_kb / 1024, threads
+
+    def run(self):
+        start = time.perf_counter()
+        last_time, (last_cpu, _, _) = start, self._read()
+        while not self._stop_event.wait(self.interval):
+            try:
+                cpu, rss, threads = self._read()
+            except (FileNotFoundError, ProcessLookupError):
+                break
+            now = time.perf_counter()
+            self.samples.append({
+                't': now - start,
+                'cpu_percent': 100 * (cpu - last_cpu) / (now - last_time),
+                'rss_mb': rss,
+                'threads': threads,
+            })
+            last_time, last_cpu = now, cpu
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+# ---- Load generator ----
+
+class LoadGenerator:
+    """`concurrency` workers gửi request tới khi hết `duration` hoặc đủ `total` request.
+
+    Với `rate`, thời điểm gửi được lập lịch chung (open loop, `rate` req/s cho cả
+    hệ thống); không có `rate` thì mỗi worker gửi liên tục (closed loop).
+    """
+
+    def __init__(self, base_url, images, concurrency, rate=None, duration=None, total=None,
+                 health_ratio=0.0, timeout=60, seed=0):
+        self.base_url = base_url
+        self.images = images
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.total = total
+        self.health_ratio = health_ratio
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.records = []
+        self._lock = threading.Lock()
+        self._issued = 0
+
+    def _next_request(self):
+        """(index, thời điểm gửi dự kiến) hoặc None khi đã đủ."""
+        with self._lock:
+            index = self._issued
+            if self.total is not None and index >= self.total:
+                return None
+            scheduled = self.start + index / self.rate if self.rate else time.perf_counter()
+            if self.duration is not None and scheduled - self.start >= self.duration:
+                return None
+            self._issued += 1
+            is_health = self.rng.random() < self.health_ratio
+            image = None if is_health else self.images[index % len(self.images)]
+            return scheduled, image
+
+    def _send(self, image):
+        if image is None:
+            request = urllib.request.Request(f'{self.base_url}/health')
+            endpoint = 'health'
+        else:
+            request = urllib.request.Request(
+                f'{self.base_url}/recognize', data=image,
+                headers={'Content-Type': 'image/png'}, method='POST'
+            )
+            endpoint = 'recognize'
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            status = 0  # Lỗi kết nối / timeout
+        end = time.perf_counter()
+        return {
+            'endpoint': endpoint,
+            'status': status,
+            'start': start - self.start,
+            'latency_ms': (end - start) * 1000,
+        }
+
+    def _worker(self):
+        while True:
+            item = self._next_request()
+            if item is None:
+                return
+            scheduled, image = item
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            record = self._send(image)
+            with self._lock:
+                self.records.append(record)
+
+    def run(self):
+        self.start = time.perf_counter()
+        workers = [threading.Thread(target=self._worker) for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.elapsed = time.perf_counter() - self.start
+        return self.records
+
+
+def summarize_requests(records, elapsed):
+    def stats(subset):
+        if not subset:
+            return None
+        latencies = np.array([r['latency_ms'] for r in subset])
+        errors = sum(1 for r in subset if not 200 <= r['status'] < 300)
+        status_counts = {}
+        for r in subset:
+            status_counts[str(r['status'])] = status_counts.get(str(r['status']), 0) + 1
+        return {
+            'requests': len(subset),
+            'throughput_rps': len(subset) / elapsed if elapsed else 0.0,
+            'error_rate': errors / len(subset),
+            'status_codes': status_counts,
+            'latency_ms': {
+                'mean': float(latencies.mean()),
+                'p50': float(np.percentile(latencies, 50)),
+                'p95': float(np.percentile(latencies, 95)),
+                'p99': float(np.percentile(latencies, 99)),
+                'max': float(latencies.max()),
+            },
+        }
+
+    return {
+        'overall': stats(records),
+        'recognize': stats([r for r in records if r['endpoint'] == 'recognize']),
+        'health': stats([r for r in records if r['endpoint'] == 'health']),
+    }
+
+
+def summarize_server(samples):
+    if not samples:
+        return None
+    cpu = np.array([s['cpu_percent'] for s in samples])
+    rss = np.array([s['rss_mb'] for s in samples])
+    return {
+        'cpu_percent': {'mean': float(cpu.mean()), 'max': float(cpu.max())},
+        'rss_mb': {'start': float(rss[0]), 'max': float(rss.max()), 'end': float(rss[-1])},
+        'timeline': samples,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", type=str,
+                        help="Base URL of a running API (default: start one on localhost)")
+    parser.add_argument("--server_pid", type=int,
+                        help="PID of the running API for CPU/RSS sampling (with --url)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Number of concurrent workers")
+    parser.add_argument("--rate", type=float,
+                        help="Target requests per second for all workers (default: unthrottled)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Test duration in seconds")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests")
+    parser.add_argument("--health_ratio", type=float, default=0.0,
+                        help="Fraction of requests sent to /health instead of /recognize")
+    parser.add_argument("--synthetic", type=int, default=32,
+                        help="Number of synthetic canvas PNGs mixed with the bundled samples")
+    parser.add_argument("--no_rembg", action="store_true",
+                        help="Start the API with background removal disabled")
+    parser.add_argument("--sample_interval", type=float, default=0.5,
+                        help="Server CPU/RSS sampling interval in seconds")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout")
+    parser.add_argument("--output", type=str, help="Report path (default: monitoring_dir/load_test)")
+    args = parser.parse_args()
+
+    images = load_sample_images() + synthetic_canvas_images(args.synthetic)
+    random.Random(0).shuffle(images)
+
+    process = None
+    if args.url:
+        base_url, pid = args.url.rstrip('/'), args.server_pid
+    else:
+        print("Starting API server on localhost...")
+        process, base_url = start_server(remove_background=not args.no_rembg)
+        pid = process.pid
+
+    sampler = None
+    if pid is not None and os.path.exists(f'/proc/{pid}'):
+        sampler = ProcessSampler(pid, args.sample_interval)
+        sampler.start()
+
+    print(f"\nLoad test: {base_url}, concurrency {args.concurrency}, "
+          f"rate {args.rate or 'unthrottled'}, {len(images)} images")
+    print("=" * 50)
+    try:
+        generator = LoadGenerator(
+            base_url, images, args.concurrency,
+            rate=args.rate,
+            duration=args.duration if args.requests is None else None,
+            total=args.requests,
+            health_ratio=args.health_ratio,
+            timeout=args.timeout,
+        )
+        records = generator.run()
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'elapsed': generator.elapsed,
+        'requests': summarize_requests(records, generator.elapsed),
+        'server': summarize_server(sampler.samples if sampler else []),
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+    for endpoint in ('recognize', 'health'):
+        stats = report['requests'][endpoint]
+        if stats is None:
+            continue
+        latency = stats['latency_ms']
+        print(f"{endpoint:>10}: {stats['requests']} requests, "
+              f"{stats['throughput_rps']:.2f} req/s, errors {stats['error_rate']:.1%}, "
+              f"p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, "
+              f"p99 {latency['p99']:.1f} ms")
+    if report['server']:
+        server = report['server']
+        print(f"{'server':>10}: CPU mean {server['cpu_percent']['mean']:.0f}% "
+              f"(max {server['cpu_percent']['max']:.0f}%), "
+              f"RSS max {server['rss_mb']['max']:.0f} MB")
+    print("=" * 50)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load_test_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Report saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
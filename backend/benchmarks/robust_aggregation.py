@@ -0,0 +1,109 @@
+"""Benchmark: thời gian và bộ nhớ của các phương pháp tổng hợp (FedAvg, median,
+trimmed mean, Krum) theo số clients.
+
+Updates là weights synthetic quanh một model chung; một phần clients gửi update
+hỏng (nhân lớn) để so sánh sai số của kết quả so với trung bình của các clients
+tốt. Bộ nhớ là peak của tracemalloc (NumPy báo allocations cho tracemalloc) trong
+lúc tổng hợp, không tính các updates đầu vào.
+
+    python -m backend.benchmarks.robust_aggregation --client_counts 10 50 100 500
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from ..federated_learning.aggregators import METHODS, aggregate
+from ..utils.config import AGGREGATION_CONFIG
+from ..utils.parameters import ParameterVector, aggregation_threads
+
+
+def make_updates(num_clients, size, corrupted_ratio, seed=0):
+    """Updates của `num_clients` clients; `corrupted_ratio` trong số đó bị nhân 100."""
+    rng = np.random.default_rng(seed)
+    shapes = [(size,)]
+    center = rng.standard_normal(size, dtype=np.float32) * 0.1
+    vectors = [
+        ParameterVector(center + rng.standard_normal(size, dtype=np.float32) * 0.01, shapes)
+        for _ in range(num_clients)
+    ]
+    num_corrupted = int(corrupted_ratio * num_clients)
+    for vector in vectors[:num_corrupted]:
+        vector.buffer *= 100
+    honest = ParameterVector.weighted_average(vectors[num_corrupted:], [1] * (num_clients - num_corrupted))
+    return vectors, honest
+
+
+def run_method(method, vectors, weights, repeat):
+    aggregate(vectors, weights, method)  # warmup (thread pool, BLAS)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        aggregate(vectors, weights, method)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    result, used = aggregate(vectors, weights, method)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, used, float(np.median(times)), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--client_counts", type=int, nargs="+", default=[10, 50, 100, 500],
+                        help="Numbers of clients")
+    parser.add_argument("--size", type=int, default=121930,
+                        help="Parameters per update (default: size of the MNIST model)")
+    parser.add_argument("--methods", nargs="+", choices=METHODS, default=list(METHODS))
+    parser.add_argument("--corrupted", type=float, default=0.1,
+                        help="Fraction of clients sending corrupted updates")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (median)")
+    parser.add_argument("--output", type=str, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    print(f"\nAggregation benchmark ({args.size} parameters, {args.corrupted:.0%} corrupted, "
+          f"{aggregation_threads()} threads)")
+    print("=" * 78)
+    print(f"{'clients':>8} {'method':>13} {'median ms':>10} {'peak MB':>9} {'used':>6} {'error vs honest':>16}")
+    results = []
+    for num_clients in args.client_counts:
+        vectors, honest = make_updates(num_clients, args.size, args.corrupted)
+        weights = [1] * num_clients
+        num_corrupted = int(args.corrupted * num_clients)
+        # Tham số robust theo số clients lỗi: Krum với f = số clients lỗi, Multi-Krum
+        # lấy trung bình n - 2f updates, trimmed mean bỏ đúng tỷ lệ lỗi ở mỗi đầu
+        AGGREGATION_CONFIG['krum_byzantine'] = max(1, num_corrupted)
+        AGGREGATION_CONFIG['krum_selected'] = max(1, num_clients - 2 * num_corrupted)
+        AGGREGATION_CONFIG['trim_ratio'] = max(args.corrupted, 1 / num_clients)
+        for method in args.methods:
+            try:
+                result, used, seconds, peak = run_method(method, vectors, weights, args.repeat)
+            except ValueError as e:
+                print(f"{num_clients:>8} {method:>13} skipped: {e}")
+                continue
+            error = float(np.abs(result.buffer - honest.buffer).max())
+            results.append({
+                'clients': num_clients,
+                'method': method,
+                'median_ms': seconds * 1000,
+                'peak_mb': peak / 2 ** 20,
+                'used_updates': len(used),
+                'max_error_vs_honest': error,
+            })
+            print(f"{num_clients:>8} {method:>13} {seconds * 1000:>10.1f} {peak / 2 ** 20:>9.1f} "
+                  f"{len(used):>6} {error:>16.4g}")
+        del vectors
+    print("=" * 78)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Kiểm tra local endpoint /metrics của API: gửi vài request rồi scrape và
+validate output theo Prometheus text exposition format.
+
+Chạy offline qua Flask test client (không mở socket, không dùng rembg).
+Weights store và model index được trỏ sang thư mục tạm. Exit code 1 nếu
+output sai format hoặc thiếu metric.
+
+    python -m backend.benchmarks.scrape_metrics
+"""
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+from ..utils.config import API_CONFIG, BASE_DIR, MODEL_INDEX_CONFIG, WEIGHTS_STORE_CONFIG
+
+SAMPLE_IMAGE = os.path.join(BASE_DIR, 'mnist_samples', '0.png')
+
+METRIC_NAME = r'[a-zA-Z_:][a-zA-Z0-9_:]*'
+LABEL = r'[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\[\\"n])*"'
+SAMPLE_LINE = re.compile(
+    rf'^({METRIC_NAME})(\{{{LABEL}(?:,{LABEL})*\}})? '
+    r'(-?(?:[0-9.]+(?:[eE][-+]?[0-9]+)?|\+Inf|-Inf|NaN))$'
+)
+HELP_LINE = re.compile(rf'^# HELP ({METRIC_NAME}) .*$')
+TYPE_LINE = re.compile(rf'^# TYPE ({METRIC_NAME}) (counter|gauge|histogram|summary|untyped)$')
+
+EXPECTED = (
+    'fl_api_requests_total',
+    'fl_api_request_duration_seconds',
+    'fl_api_cache_total',
+)
+
+
+def validate(text):
+    """Danh sách lỗi format của `text` (rỗng nếu hợp lệ) và tập metric có sample."""
+    errors, types, seen = [], {}, set()
+    if not text.endswith('\n'):
+        errors.append('output must end with a newline')
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line:
+            continue
+        if line.startswith('# HELP'):
+            if not HELP_LINE.match(line):
+                errors.append(f'line {number}: malformed HELP: {line}')
+        elif line.startswith('# TYPE'):
+            match = TYPE_LINE.match(line)
+            if not match:
+                errors.append(f'line {number}: malformed TYPE: {line}')
+            elif match.group(1) in types:
+                errors.append(f'line {number}: duplicate TYPE for {match.group(1)}')
+            else:
+                types[match.group(1)] = match.group(2)
+        elif line.startswith('#'):
+            continue
+        else:
+            match = SAMPLE_LINE.match(line)
+            if not match:
+                errors.append(f'line {number}: malformed sample: {line}')
+                continue
+            name = match.group(1)
+            family = re.sub(r'_(bucket|sum|count)$', '', name)
+            if name not in types and not (family in types and types[family] == 'histogram'):
+                errors.append(f'line {number}: sample before TYPE: {name}')
+            seen.add(family if family in types else name)
+    return errors, seen
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp(prefix='fl_scrape_')
+    WEIGHTS_STORE_CONFIG['dir'] = os.path.join(tmp_dir, 'weights')
+    MODEL_INDEX_CONFIG['path'] = os.path.join(tmp_dir, 'index.json')
+    API_CONFIG['remove_background'] = False  # rembg cần tải model u2net
+    try:
+        from ..api.server import app
+        client = app.test_client()
+
+        with open(SAMPLE_IMAGE, 'rb') as f:
+            image = f.read()
+        for _ in range(3):
+            response = client.post('/recognize', data=image,
+                                   content_type='application/octet-stream')
+            print(f"POST /recognize -> {response.status_code}")
+        client.get('/model-stats/does_not_exist.keras')
+
+        response = client.get('/metrics')
+        text = response.get_data(as_text=True)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"GET /metrics -> {response.status_code} ({response.content_type})")
+    errors, seen = validate(text)
+    if response.status_code != 200:
+        errors.append(f'/metrics returned {response.status_code}')
+    if not response.content_type.startswith('text/plain'):
+        errors.append(f'unexpected content type: {response.content_type}')
+    errors += [f'missing metric: {name}' for name in EXPECTED if name not in seen]
+
+    print(f"{len(text.splitlines())} lines, {len(seen)} metric families")
+    if errors:
+        print("Invalid /metrics output:")
+        for error in errors:
+            print(f"  {error}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark: thời gian khởi động và RSS của CLI theo từng mode.
+
+Mỗi kịch bản chạy trong một process Python mới; đo wall time và peak RSS
+(`ru_maxrss` của process con qua `os.wait4`). Các mode chỉ đo phần import
+module của vai trò đó (không train, không mở socket).
+
+    python -m backend.benchmarks.startup --repeat 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Tên kịch bản -> tham số cho `python`
+SCENARIOS = {
+    'help': ['-m', 'backend.main', '--help'],
+    'invalid_args': ['-m', 'backend.main', '--mode', 'initial'],
+    'import_main': ['-c', 'import backend.main'],
+}
+for _role in ('api', 'simulate', 'server', 'client', 'edge'):
+    SCENARIOS[f'{_role}_mode'] = [
+        '-c', f'from backend.main import import_mode_module; import_mode_module({_role!r})'
+    ]
+
+
+def run_once(argv):
+    """Chạy một process con; trả về (wall time giây, peak RSS MB, exit code)."""
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT, TF_CPP_MIN_LOG_LEVEL='3')
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable] + argv, cwd=PROJECT_ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # Linux báo ru_maxrss theo KB
+    return elapsed, usage.ru_maxrss / 1024, process.returncode
+
+
+def run_scenario(argv, repeat):
+    runs = [run_once(argv) for _ in range(repeat)]
+    return {
+        'wall_time': statistics.median(t for t, _, _ in runs),
+        'max_rss_mb': statistics.median(rss for _, rss, _ in runs),
+        'exit_codes': sorted({code for _, _, code in runs}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs per scenario (median is reported)")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS),
+                        default=list(SCENARIOS), help="Scenarios to run")
+    parser.add_argument("--output", type=str, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    print(f"\nStartup benchmark ({args.repeat} runs per scenario, median)")
+    print("=" * 50)
+    results = {}
+    for name in args.scenarios:
+        results[name] = run_scenario(SCENARIOS[name], args.repeat)
+        print(f"{name:>14}: {results[name]['wall_time']:6.2f}s  "
+              f"{results[name]['max_rss_mb']:7.1f} MB  "
+              f"exit={results[name]['exit_codes']}")
+    print("=" * 50)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark: thời gian một round khi nhiều clients chạy chung một host.
+
+So sánh TensorFlow mặc định (mỗi process dùng toàn bộ cores, oversubscribed)
+với thread budget chia đều cores cho các clients (tuỳ chọn pin cores).
+
+    python -m backend.benchmarks.thread_budget --clients 3
+"""
+import argparse
+import json
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+from ..federated_learning.model import create_model, compile_model
+from ..utils.config import DATA_CONFIG
+from ..utils.cpu import configure_cpu, get_available_cores
+
+
+def _client_worker(slot, threads, pin_cores, colocated, samples, epochs, batch_size,
+                   barrier, results):
+    """Một client giả lập: train trên dữ liệu ngẫu nhiên sau khi mọi client sẵn sàng."""
+    settings = configure_cpu(
+        threads=threads,
+        pin_cores=pin_cores,
+        slot=slot,
+        colocated_clients=colocated
+    )
+    rng = np.random.default_rng(slot)
+    x = rng.random((samples, 28, 28, 1), dtype=np.float32)
+    y = rng.integers(0, 10, samples)
+
+    model = compile_model(create_model())
+    # Warm-up để trace train step trước khi đo
+    model.fit(x[:batch_size], y[:batch_size], batch_size=batch_size, verbose=0)
+
+    barrier.wait()
+    start = time.perf_counter()
+    model.fit(x, y, epochs=epochs, batch_size=batch_size, verbose=0)
+    results.put((slot, time.perf_counter() - start, settings['intra_op_threads']))
+
+
+def run_round(clients, threads, pin_cores, samples, epochs, batch_size):
+    """Chạy `clients` process train song song; round time là client chậm nhất."""
+    ctx = mp.get_context('spawn')
+    barrier = ctx.Barrier(clients)
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(
+            target=_client_worker,
+            args=(slot, threads, pin_cores, clients, samples, epochs, batch_size,
+                  barrier, results)
+        )
+        for slot in range(clients)
+    ]
+    for process in processes:
+        process.start()
+    timings = sorted(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+
+    client_times = [t for _, t, _ in timings]
+    return {
+        'threads': timings[0][2],
+        'pin_cores': pin_cores,
+        'round_time': max(client_times),
+        'mean_client_time': float(np.mean(client_times)),
+        'client_times': client_times,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=DATA_CONFIG['num_clients']['initial'],
+                        help="Number of co-located clients")
+    parser.add_argument("--samples", type=int, default=8000,
+                        help="Training samples per client")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch_size", type=int, default=DATA_CONFIG['batch_size'])
+    parser.add_argument("--threads", type=int,
+                        help="Threads per client for the budgeted run (default: auto)")
+    parser.add_argument("--pin_cores", action="store_true",
+                        help="Also pin each budgeted client to its own cores")
+    parser.add_argument("--output", type=str, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    print(f"\nThread budget benchmark: {args.clients} clients on "
+          f"{len(get_available_cores())} cores")
+    print("=" * 50)
+
+    runs = {
+        'default': run_round(args.clients, None, False,
+                             args.samples, args.epochs, args.batch_size),
+        'budget': run_round(args.clients, args.threads or 'auto', args.pin_cores,
+                            args.samples, args.epochs, args.batch_size),
+    }
+    for name, run in runs.items():
+        print(f"{name:>8}: threads={run['threads'] or 'default'}, "
+              f"round time {run['round_time']:.2f}s, "
+              f"mean client time {run['mean_client_time']:.2f}s")
+    speedup = runs['default']['round_time'] / runs['budget']['round_time']
+    print(f"Speedup: {speedup:.2f}x")
+    print("=" * 50)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'clients': args.clients, 'runs': runs, 'speedup': speedup}, f, indent=4)
+        print(f"Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,27 @@
-import tensorflow as tf
 import numpy as np
-from utils.config import DATA_CONFIG, RANDOM_SEED
+from ..utils.config import RANDOM_SEED
+from .partition import get_partition, load_dataset
 
 np.random.seed(RANDOM_SEED)
 
 def load_and_preprocess_mnist():
-    """Load và tiền xử lý dữ liệu MNIST."""
-    (x_train, y_train), (x_test, y_test) = tf.keras.datasets.mnist.load_data()
-    
-    # Normalize pixel values
-    x_train = x_train.astype('float32') / 255
-    x_test = x_test.astype('float32') / 255
-    
-    # Reshape to (samples, height, width, channels)
-    x_train = x_train.reshape((-1, 28, 28, 1))
-    x_test = x_test.reshape((-1, 28, 28, 1))
-    
+    """Load và tiền xử lý dữ liệu MNIST (float32 đã normalize, shape (N, 28, 28, 1))."""
+    x_train, y_train, x_test, y_test = load_dataset()
     return (x_train, y_train), (x_test, y_test)
 
-def prepare_data():
-    (x_train, y_train), (x_test, y_test) = load_and_preprocess_mnist()
-    
-    # Split training data for clients
-    num_clients = DATA_CONFIG['num_clients']
+def prepare_data(scheme=None, alpha=None):
+    """Dữ liệu của từng client theo partitioner dùng chung (`DATA_CONFIG['partition']`)."""
+    partition = get_partition(scheme=scheme, alpha=alpha)
     client_data = []
-    shard_size = len(x_train) // num_clients
-    
-    for i in range(num_clients):
-        start = i * shard_size
-        end = start + shard_size
+
+    for cid in partition.client_ids:
+        x_train, y_train, x_test, y_test = partition.client_data(cid)
         client_data.append({
-            "x_train": x_train[start:end],
-            "y_train": y_train[start:end],
+            "client_id": cid,
+            "x_train": x_train,
+            "y_train": y_train,
             "x_test": x_test,
             "y_test": y_test
         })
     
-    return client_data
\ No newline at end of file
+    return client_data
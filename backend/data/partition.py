@@ -0,0 +1,257 @@
+"""Chia dữ liệu MNIST cho các clients (một nguồn duy nhất cho client, server và API).
+
+Dataset được chuyển một lần thành các file .npy float32 và memory-map; mỗi
+partition được tính một lần thành index arrays + histogram theo label và cache
+ra đĩa, nên các lần sau không phải load lại dataset gốc hay chia lại.
+"""
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+from ..utils.config import DATA_CONFIG, DATA_RANGES_INFO, MODEL_CONFIG, RANDOM_SEED
+
+SCHEMES = ('iid', 'label_range', 'dirichlet')
+DATASET_ARRAYS = ('x_train', 'y_train', 'x_test', 'y_test')
+SPLITS = ('train', 'test')
+
+_datasets = {}
+_partitions = {}
+_lock = threading.Lock()
+
+
+def load_dataset(synthetic=None):
+    """(x_train, y_train, x_test, y_test) memory-mapped từ cache .npy (tạo nếu chưa có).
+
+    x ở dạng float32 (N, 28, 28, 1) đã chia 255. Với `synthetic=True` dùng dữ
+    liệu ngẫu nhiên cùng shape (chạy offline); mặc định theo `DATA_CONFIG['synthetic']`.
+    Mỗi process chỉ mở một lần.
+    """
+    if synthetic is None:
+        synthetic = DATA_CONFIG['synthetic']
+    prefix = 'synthetic' if synthetic else 'mnist'
+    with _lock:
+        if prefix in _datasets:
+            return _datasets[prefix]
+
+        cache_dir = DATA_CONFIG['cache_dir']
+        paths = {name: os.path.join(cache_dir, f'{prefix}_{name}.npy') for name in DATASET_ARRAYS}
+        if not all(os.path.exists(path) for path in paths.values()):
+            _write_dataset_cache(paths, synthetic)
+
+        _datasets[prefix] = tuple(np.load(paths[name], mmap_mode='r') for name in DATASET_ARRAYS)
+        return _datasets[prefix]
+
+
+def _write_dataset_cache(paths, synthetic):
+    if synthetic:
+        rng = np.random.default_rng(RANDOM_SEED)
+        arrays = {
+            'x_train': rng.random((60000, 28, 28, 1), dtype=np.float32),
+            'y_train': rng.integers(0, 10, 60000, dtype=np.uint8),
+            'x_test': rng.random((10000, 28, 28, 1), dtype=np.float32),
+            'y_test': rng.integers(0, 10, 10000, dtype=np.uint8),
+        }
+    else:
+        import tensorflow as tf
+        (x_train, y_train), (x_test, y_test) = tf.keras.datasets.mnist.load_data()
+        arrays = {
+            'x_train': x_train.reshape(-1, 28, 28, 1).astype(np.float32) / np.float32(255.0),
+            'y_train': y_train,
+            'x_test': x_test.reshape(-1, 28, 28, 1).astype(np.float32) / np.float32(255.0),
+            'y_test': y_test,
+        }
+
+    os.makedirs(os.path.dirname(paths['x_train']), exist_ok=True)
+    for name, array in arrays.items():
+        tmp_path = f'{paths[name]}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, paths[name])
+
+
+def label_proportions(client_ranges, scheme, alpha, rng, num_classes):
+    """Ma trận (num_classes, num_clients): tỉ lệ mẫu của mỗi label chia cho từng client.
+
+    - iid: mọi label chia đều cho mọi client.
+    - label_range: mỗi label chia đều cho các clients có label đó trong `labels`.
+    - dirichlet: tỉ lệ của mỗi label ~ Dirichlet(alpha) trên các clients có label đó.
+    """
+    if scheme not in SCHEMES:
+        raise ValueError(f"Unknown partition scheme: {scheme} (expected one of {SCHEMES})")
+
+    eligible = np.zeros((num_classes, len(client_ranges)), dtype=bool)
+    for j, client_info in enumerate(client_ranges.values()):
+        if scheme == 'iid':
+            eligible[:, j] = True
+        else:
+            eligible[list(client_info['labels']), j] = True
+
+    if scheme == 'dirichlet':
+        weights = rng.dirichlet(np.full(len(client_ranges), float(alpha)), size=num_classes)
+        weights = weights * eligible
+    else:
+        weights = eligible.astype(np.float64)
+    totals = weights.sum(axis=1, keepdims=True)
+    return np.divide(weights, totals, out=np.zeros_like(weights), where=totals > 0)
+
+
+def split_indices(labels, proportions, rng):
+    """Chia index của `labels` cho các clients theo `proportions` (không trùng lặp)."""
+    num_classes, num_clients = proportions.shape
+    parts = [[] for _ in range(num_clients)]
+    for label in range(num_classes):
+        if proportions[label].sum() == 0:
+            continue  # Không client nào giữ label này
+        idx = rng.permutation(np.flatnonzero(labels == label))
+        cuts = np.round(np.cumsum(proportions[label])[:-1] * len(idx)).astype(np.int64)
+        for j, chunk in enumerate(np.split(idx, cuts)):
+            parts[j].append(chunk)
+    # Index tăng dần để đọc tuần tự từ file memory-mapped
+    return [
+        np.sort(np.concatenate(p)).astype(np.int64) if p else np.empty(0, dtype=np.int64)
+        for p in parts
+    ]
+
+
+class DataPartition:
+    """Partition đã tính: index arrays và histogram theo label của từng client.
+
+    `indices[split][cid]` là index vào dataset dùng chung, `histograms[split][cid]`
+    là số mẫu mỗi label (độ dài `num_classes`).
+    """
+
+    def __init__(self, key, client_ranges, indices, histograms, synthetic=False):
+        self.key = key
+        self.client_ranges = client_ranges
+        self.indices = indices
+        self.histograms = histograms
+        self.synthetic = synthetic
+
+    @property
+    def client_ids(self):
+        return list(self.client_ranges)
+
+    def _check(self, cid):
+        cid = str(cid)
+        if cid not in self.client_ranges:
+            raise ValueError(f"Invalid client ID: {cid}")
+        return cid
+
+    def histogram(self, cid, split='train'):
+        return self.histograms[split][self._check(cid)]
+
+    def client_data(self, cid, dataset=None):
+        """(x_train, y_train, x_test, y_test) của client (copy từ dataset memory-mapped)."""
+        cid = self._check(cid)
+        x_train, y_train, x_test, y_test = dataset or load_dataset(self.synthetic)
+        train_idx, test_idx = self.indices['train'][cid], self.indices['test'][cid]
+        return x_train[train_idx], y_train[train_idx], x_test[test_idx], y_test[test_idx]
+
+    def distribution(self, cid, split='train'):
+        """{label: số mẫu} của các label client có."""
+        hist = self.histogram(cid, split)
+        return {int(label): int(hist[label]) for label in np.flatnonzero(hist)}
+
+    def summary(self, cid):
+        """Data summary của client (cùng định dạng file `client_<cid>_data_summary.json`)."""
+        cid = self._check(cid)
+        summary = {'client_id': int(cid) if cid.isdigit() else cid}
+        for split in SPLITS:
+            distribution = self.distribution(cid, split)
+            total = int(self.histogram(cid, split).sum())
+            summary[split] = {
+                'total_samples': total,
+                'samples_per_label': distribution,
+                'labels_distribution': {
+                    str(label): f"{(count/total*100):.2f}%"
+                    for label, count in distribution.items()
+                }
+            }
+        client_info = self.client_ranges[cid]
+        summary['allowed_labels'] = list(client_info['labels'])
+        summary['description'] = client_info.get('description', '')
+        return summary
+
+    def save(self, path):
+        arrays = {
+            f'{kind}_{split}_{cid}': data[split][cid]
+            for kind, data in (('idx', self.indices), ('hist', self.histograms))
+            for split in SPLITS
+            for cid in self.client_ranges
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, key, client_ranges, synthetic=False):
+        with np.load(path) as data:
+            indices, histograms = (
+                {split: {cid: data[f'{kind}_{split}_{cid}'] for cid in client_ranges}
+                 for split in SPLITS}
+                for kind in ('idx', 'hist')
+            )
+        return cls(key, client_ranges, indices, histograms, synthetic)
+
+
+def get_partition(scheme=None, alpha=None, seed=None, num_clients=None, synthetic=None):
+    """Partition (đã cache) của dataset cho các clients.
+
+    Mặc định chia cho các clients trong `DATA_RANGES_INFO['client_ranges']` theo
+    `DATA_CONFIG['partition']`. Với `num_clients`, chia cho các clients '1'..N
+    được giữ mọi label (simulation). Cùng tham số và seed luôn cho cùng kết quả.
+    """
+    cfg = DATA_CONFIG['partition']
+    if synthetic is None:
+        synthetic = DATA_CONFIG['synthetic']
+    scheme = scheme or cfg['scheme']
+    alpha = float(alpha if alpha is not None else cfg['alpha'])
+    seed = int(seed if seed is not None else cfg['seed'])
+    num_classes = MODEL_CONFIG['num_classes']
+    if num_clients is None:
+        client_ranges = DATA_RANGES_INFO['client_ranges']
+    else:
+        client_ranges = {
+            str(i + 1): {'labels': list(range(num_classes)), 'description': 'Simulated client'}
+            for i in range(num_clients)
+        }
+
+    spec = {
+        'dataset': 'synthetic' if synthetic else 'mnist',
+        'scheme': scheme,
+        'alpha': alpha if scheme == 'dirichlet' else None,
+        'seed': seed,
+        'clients': {cid: list(info['labels']) for cid, info in client_ranges.items()},
+    }
+    key = hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+    with _lock:
+        if key in _partitions:
+            return _partitions[key]
+    path = os.path.join(DATA_CONFIG['cache_dir'], 'partitions', f"{spec['dataset']}_{scheme}_{key}.npz")
+    if os.path.exists(path):
+        partition = DataPartition.load(path, key, client_ranges, synthetic)
+    else:
+        partition = _compute_partition(key, client_ranges, scheme, alpha, seed, num_classes, synthetic)
+        partition.save(path)
+    with _lock:
+        return _partitions.setdefault(key, partition)
+
+
+def _compute_partition(key, client_ranges, scheme, alpha, seed, num_classes, synthetic):
+    _, y_train, _, y_test = load_dataset(synthetic)
+    rng = np.random.default_rng(seed)
+    # Cùng ma trận tỉ lệ cho train và test: tập test của client có cùng phân bố label
+    proportions = label_proportions(client_ranges, scheme, alpha, rng, num_classes)
+    indices, histograms = {}, {}
+    for split, labels in (('train', np.asarray(y_train)), ('test', np.asarray(y_test))):
+        parts = split_indices(labels, proportions, rng)
+        indices[split] = dict(zip(client_ranges, parts))
+        histograms[split] = {
+            cid: np.bincount(labels[idx], minlength=num_classes).astype(np.int64)
+            for cid, idx in indices[split].items()
+        }
+    return DataPartition(key, client_ranges, indices, histograms, synthetic)
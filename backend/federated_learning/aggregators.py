@@ -0,0 +1,166 @@
+"""Robust aggregation cho updates không mask: coordinate-wise median, trimmed mean và
+(Multi-)Krum.
+
+Các updates được xếp thành ma trận clients × tham số float32 theo từng chunk cột
+(`AGGREGATION_CONFIG['chunk_bytes']`) nên bộ nhớ phụ chỉ tỉ lệ với chunk, không với
+kích thước model. Các chunk chạy song song trên thread pool của `parameters`.
+"""
+import numpy as np
+
+from ..utils.config import AGGREGATION_CONFIG
+from ..utils.parameters import ParameterVector, aggregation_threads, parallel_map
+
+METHODS = ('fedavg', 'median', 'trimmed_mean', 'krum')
+
+
+def _shapes(vectors):
+    if not vectors:
+        raise ValueError("No parameter vectors to aggregate")
+    shapes = vectors[0].shapes
+    for vector in vectors[1:]:
+        if vector.shapes != shapes:
+            raise ValueError("Cannot aggregate vectors with different layer shapes")
+    return shapes
+
+
+def _column_chunks(num_clients, size):
+    """Các khoảng cột [start, stop) sao cho ma trận num_clients × cột vừa `chunk_bytes`."""
+    columns = max(1, AGGREGATION_CONFIG['chunk_bytes'] // (4 * num_clients))
+    return [(start, min(start + columns, size)) for start in range(0, size, columns)]
+
+
+def _stack(vectors, start, stop):
+    """Ma trận clients × (stop - start) float32 của một chunk cột."""
+    matrix = np.empty((len(vectors), stop - start), dtype=np.float32)
+    for row, vector in zip(matrix, vectors):
+        row[...] = vector.buffer[start:stop]
+    return matrix
+
+
+def _columnwise(vectors, reduce):
+    """Áp dụng `reduce(matrix, out)` cho từng chunk cột, ghi kết quả vào vector mới."""
+    shapes = _shapes(vectors)
+    result = np.empty(vectors[0].size, dtype=np.float32)
+
+    def run(bounds):
+        start, stop = bounds
+        reduce(_stack(vectors, start, stop), result[start:stop])
+
+    parallel_map(run, _column_chunks(len(vectors), result.size))
+    return ParameterVector(result, shapes)
+
+
+def finite_updates(vectors):
+    """Mỗi vector có toàn giá trị hữu hạn (không NaN/Inf) hay không."""
+    return parallel_map(lambda vector: bool(np.isfinite(vector.buffer).all()), vectors)
+
+
+def coordinate_median(vectors):
+    """Median theo từng toạ độ (np.partition, không sort toàn bộ)."""
+    num_clients = len(vectors)
+    half = num_clients // 2
+
+    def reduce(matrix, out):
+        if num_clients % 2:
+            matrix.partition(half, axis=0)
+            out[...] = matrix[half]
+        else:
+            matrix.partition((half - 1, half), axis=0)
+            np.add(matrix[half - 1], matrix[half], out=out)
+            out *= 0.5
+
+    return _columnwise(vectors, reduce)
+
+
+def trimmed_mean(vectors, trim_ratio=None):
+    """Trung bình theo từng toạ độ sau khi bỏ `trim_ratio` giá trị nhỏ nhất và lớn nhất."""
+    if trim_ratio is None:
+        trim_ratio = AGGREGATION_CONFIG['trim_ratio']
+    # trim_ratio < 0.5 luôn giữ lại ít nhất một update (2 * trim < num_clients)
+    if not 0 <= trim_ratio < 0.5:
+        raise ValueError(f"trim_ratio must be in [0, 0.5), got {trim_ratio}")
+    num_clients = len(vectors)
+    trim = int(trim_ratio * num_clients)
+
+    def reduce(matrix, out):
+        if trim:
+            matrix.partition((trim, num_clients - trim - 1), axis=0)
+        out[...] = matrix[trim:num_clients - trim].mean(axis=0, dtype=np.float64)
+
+    return _columnwise(vectors, reduce)
+
+
+def pairwise_distances(vectors):
+    """Ma trận khoảng cách Euclid bình phương (float64) giữa các updates.
+
+    Mỗi chunk cột đóng góp ||a||² + ||b||² - 2·a·b (một phép nhân ma trận); chunk được
+    trừ trung bình cột trước để tránh mất chính xác khi các updates gần nhau. Các
+    phần được cộng theo thứ tự chunk nên kết quả không phụ thuộc số threads.
+    """
+    _shapes(vectors)
+    num_clients = len(vectors)
+    chunks = _column_chunks(num_clients, vectors[0].size)
+
+    def partial(bounds):
+        matrix = _stack(vectors, *bounds)
+        matrix -= matrix.mean(axis=0)
+        norms = np.einsum('ij,ij->i', matrix, matrix, dtype=np.float64)
+        gram = matrix @ matrix.T
+        return norms[:, None] + norms[None, :] - 2 * gram.astype(np.float64)
+
+    distances = np.zeros((num_clients, num_clients), dtype=np.float64)
+    # Mỗi lượt tối đa một chunk mỗi thread để giới hạn số ma trận n × n đang giữ
+    batch = max(1, aggregation_threads())
+    for i in range(0, len(chunks), batch):
+        for part in parallel_map(partial, chunks[i:i + batch]):
+            distances += part
+    np.maximum(distances, 0, out=distances)
+    np.fill_diagonal(distances, 0)
+    return distances
+
+
+def krum_scores(vectors, num_byzantine=None):
+    """Điểm Krum: tổng khoảng cách tới n - f - 2 updates gần nhất (thấp = đáng tin)."""
+    if num_byzantine is None:
+        num_byzantine = AGGREGATION_CONFIG['krum_byzantine']
+    num_clients = len(vectors)
+    closest = num_clients - num_byzantine - 2
+    if closest < 1:
+        raise ValueError(
+            f"Krum with f={num_byzantine} needs at least {num_byzantine + 3} clients, got {num_clients}"
+        )
+    distances = pairwise_distances(vectors)
+    np.fill_diagonal(distances, np.inf)  # Không tính khoảng cách tới chính nó
+    return np.partition(distances, closest - 1, axis=1)[:, :closest].sum(axis=1)
+
+
+def krum(vectors, weights, num_byzantine=None, num_selected=None):
+    """(Multi-)Krum: weighted average của `num_selected` updates có điểm thấp nhất.
+
+    Trả về (ParameterVector, indices của các updates được chọn).
+    """
+    if num_selected is None:
+        num_selected = AGGREGATION_CONFIG['krum_selected']
+    scores = krum_scores(vectors, num_byzantine)
+    selected = sorted(np.argsort(scores, kind='stable')[:max(1, num_selected)].tolist())
+    return (
+        ParameterVector.weighted_average([vectors[i] for i in selected], [weights[i] for i in selected]),
+        selected,
+    )
+
+
+def aggregate(vectors, weights, method=None):
+    """Tổng hợp updates theo `method` (mặc định `AGGREGATION_CONFIG['method']`).
+
+    Trả về (ParameterVector, indices của các updates được dùng).
+    """
+    method = method or AGGREGATION_CONFIG['method']
+    if method == 'fedavg':
+        return ParameterVector.weighted_average(vectors, weights), list(range(len(vectors)))
+    if method == 'median':
+        return coordinate_median(vectors), list(range(len(vectors)))
+    if method == 'trimmed_mean':
+        return trimmed_mean(vectors), list(range(len(vectors)))
+    if method == 'krum':
+        return krum(vectors, weights)
+    raise ValueError(f"Unknown aggregation method: {method} (expected one of {', '.join(METHODS)})")
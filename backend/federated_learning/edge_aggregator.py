@@ -0,0 +1,221 @@
+"""Edge aggregator cho hierarchical aggregation (2 tầng).
+
+Edge là Flower server cho một nhóm clients và là một Flower client của server gốc
+(`FederatedServer`). Mỗi khi server gốc gọi `fit`, edge chạy một round với nhóm của
+nó (có secure aggregation trong nhóm) và gửi lên đúng một update: weighted average
+của nhóm cùng tổng số examples. Server gốc vì vậy chỉ nhận O(số edges) updates.
+
+    python main.py --mode initial --server --edges 2
+    python main.py --mode initial --edge --cid 101 --listen_address 127.0.0.1:8081
+    python main.py --mode initial --client --cid 1 --server_address 127.0.0.1:8081
+"""
+import time
+
+import flwr as fl
+import numpy as np
+from flwr.common import Code, Parameters, Status
+from flwr.server.superlink.fleet.grpc_bidi.grpc_server import start_grpc_server
+
+from .flwr_server import BYTES_SENT, FederatedServer
+from .secure_aggregation import get_keyring, handle_properties
+from .transfer import connect, empty_parameters, handle_transfer, is_transfer_request, publish_update
+from ..utils.config import EDGE_CONFIG, SECURE_AGG_CONFIG
+from ..utils.crypto import CryptoUtils
+from ..utils.metrics import start_metrics
+from ..utils.parameters import ParameterVector
+
+
+class EdgeStrategy(FederatedServer):
+    """FederatedServer cho nhóm clients của một edge: chỉ tổng hợp updates.
+
+    Không giữ Keras model, không evaluate trên test set và không lưu gì; kết quả
+    của round gần nhất nằm trong `last_update`. Config server gốc gửi cho edge
+    (`root_config`) được chuyển tiếp cho các clients của nhóm.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.root_config = {}
+        self.last_update = None
+        super().__init__(*args, **kwargs)
+
+    def _create_global_model(self, mode):
+        return None
+
+    def _forward_root_config(self, instructions):
+        # Secure aggregation trong nhóm dùng round và keys riêng của edge
+        config = {k: v for k, v in self.root_config.items() if k != 'secagg_round'}
+        for _, ins in instructions:
+            ins.config.update(config)
+        return instructions
+
+    def configure_fit(self, server_round, parameters, client_manager):
+        return self._forward_root_config(
+            super().configure_fit(server_round, parameters, client_manager)
+        )
+
+    def configure_evaluate(self, server_round, parameters, client_manager):
+        return self._forward_root_config(
+            super().configure_evaluate(server_round, parameters, client_manager)
+        )
+
+    def aggregate_fit(self, server_round, results, failures):
+        self.last_update = None
+        print(f"\nEdge round {server_round}: {len(results)} results, {len(failures)} failures")
+        if len(results) < SECURE_AGG_CONFIG['min_clients_for_unmasking']:
+            print(f"Insufficient clients for unmasking. Need at least {SECURE_AGG_CONFIG['min_clients_for_unmasking']}")
+            self.secure_aggregation.discard(server_round)
+            return None, {}
+
+        active_client_ids = set()
+        for client_proxy, fit_res in results:
+            if fit_res.metrics.get('client_id'):
+                self.client_id_map[client_proxy.cid] = str(fit_res.metrics['client_id'])
+                active_client_ids.add(str(fit_res.metrics['client_id']))
+
+        aggregated, metrics = self.aggregate_updates(server_round, results, active_client_ids)
+        if aggregated is None:
+            return None, {}
+        self.last_update = {
+            'vector': aggregated,
+            'num_examples': sum(fit_res.num_examples for _, fit_res in results),
+            'clients': sorted(active_client_ids, key=int),
+            'accuracy': _weighted_metric(results, 'accuracy'),
+            'loss': _weighted_metric(results, 'loss'),
+        }
+        return aggregated.to_parameters(), {}
+
+
+def _weighted_metric(results, name):
+    """Trung bình theo số examples của một metric trong kết quả của các clients."""
+    pairs = [(res.metrics[name], res.num_examples) for _, res in results if name in res.metrics]
+    total = sum(n for _, n in pairs)
+    return float(sum(value * n for value, n in pairs) / total) if total else 0.0
+
+
+class EdgeAggregator(fl.client.Client):
+    """Flower client của server gốc, chạy một round của nhóm cho mỗi lần fit/evaluate."""
+
+    def __init__(self, edge_id, server):
+        self.edge_id = str(edge_id)
+        self.server = server
+        self.strategy = server.strategy
+        self.round = 0
+
+    def _status(self, code=Code.OK, message="Success"):
+        return Status(code=code, message=message)
+
+    def get_properties(self, ins):
+        # Edge là một bên của secure aggregation (và gửi update theo chunks) ở server gốc
+        if is_transfer_request(ins):
+            return handle_transfer(self.edge_id, ins)
+        return handle_properties(self.edge_id, ins)
+
+    def get_parameters(self, ins):
+        return fl.common.GetParametersRes(
+            status=self._status(),
+            parameters=self.server.parameters
+        )
+
+    def fit(self, ins):
+        fit_start = time.perf_counter()
+        # Dùng số round của server gốc (nếu có) để log và keys hai tầng khớp nhau
+        self.round = int(ins.config.get('secagg_round', self.round + 1))
+        self.server.parameters = ins.parameters
+        self.strategy.root_config = dict(ins.config)
+
+        self.server.fit_round(server_round=self.round, timeout=EDGE_CONFIG['round_timeout'])
+        update = self.strategy.last_update
+        if update is None:
+            return fl.common.FitRes(
+                status=self._status(Code.FIT_NOT_IMPLEMENTED, f"Edge {self.edge_id}: group round failed"),
+                parameters=Parameters(tensors=[], tensor_type=""),
+                num_examples=0,
+                metrics={}
+            )
+
+        vector = update['vector']
+        if 'secagg_round' in ins.config:
+            # Như một client: update của nhóm (đã nhân số examples) + masks của server gốc
+            ring = ParameterVector(
+                CryptoUtils.quantize(vector.buffer, update['num_examples']), vector.shapes, np.uint32
+            )
+            vector = CryptoUtils.apply_mask(
+                ring, get_keyring().mask(self.edge_id, self.round, ring.size)
+            )
+        metrics = {
+            'client_id': self.edge_id,
+            'edge_clients': ','.join(update['clients']),
+            'accuracy': update['accuracy'],
+            'loss': update['loss'],
+            'fit_time': time.perf_counter() - fit_start,
+        }
+        manifest = publish_update(self.edge_id, vector.to_ndarrays(), ins.config)
+        if manifest is not None:
+            metrics.update(manifest)
+            parameters = empty_parameters()
+        else:
+            parameters = vector.to_parameters()
+            BYTES_SENT.inc(sum(len(t) for t in parameters.tensors), component='edge', stage='fit')
+        return fl.common.FitRes(
+            status=self._status(),
+            parameters=parameters,
+            num_examples=update['num_examples'],
+            metrics=metrics
+        )
+
+    def evaluate(self, ins):
+        self.server.parameters = ins.parameters
+        self.strategy.root_config = dict(ins.config)
+        result = self.server.evaluate_round(server_round=self.round, timeout=EDGE_CONFIG['round_timeout'])
+        results = result[2][0] if result is not None else []
+        num_examples = sum(res.num_examples for _, res in results)
+        if not num_examples:
+            return fl.common.EvaluateRes(
+                status=self._status(Code.EVALUATE_NOT_IMPLEMENTED, f"Edge {self.edge_id}: group evaluation failed"),
+                loss=0.0,
+                num_examples=0,
+                metrics={}
+            )
+        return fl.common.EvaluateRes(
+            status=self._status(),
+            loss=float(result[0]),
+            num_examples=num_examples,
+            metrics={'accuracy': _weighted_metric(results, 'accuracy')}
+        )
+
+
+def start_edge(mode, edge_id, group_size=None, listen_address=None, root_address=None):
+    """Chạy edge aggregator cho đến khi server gốc kết thúc."""
+    group_size = group_size or EDGE_CONFIG['group_size']
+    listen_address = listen_address or EDGE_CONFIG['listen_address']
+    root_address = root_address or EDGE_CONFIG['root_address']
+
+    print("\nEdge Aggregator Configuration:")
+    print("=" * 50)
+    print(f"Edge ID: {edge_id}")
+    print(f"Mode: {mode}")
+    print(f"Group size: {group_size}")
+    print(f"Listening for clients on: {listen_address}")
+    print(f"Root server: {root_address}")
+    print("=" * 50)
+
+    # Mọi client của nhóm tham gia mọi round (sampling do server gốc làm theo edge)
+    strategy = EdgeStrategy(
+        mode=mode,
+        fraction_fit=1.0,
+        fraction_evaluate=1.0,
+        min_fit_clients=group_size,
+        min_evaluate_clients=group_size,
+        min_available_clients=group_size,
+    )
+    client_manager = fl.server.SimpleClientManager()
+    server = fl.server.Server(client_manager=client_manager, strategy=strategy)
+    grpc_server = start_grpc_server(client_manager=client_manager, server_address=listen_address)
+    start_metrics(f'edge_{edge_id}')
+
+    try:
+        connect(root_address, EdgeAggregator(edge_id, server))
+    finally:
+        # Server gốc đã kết thúc: cho các clients của nhóm ngắt kết nối
+        server.disconnect_all_clients(timeout=None)
+        grpc_server.stop(grace=1)
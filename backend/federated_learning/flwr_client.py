@@ -1,132 +1,323 @@
 import os
 import flwr as fl
-import tensorflow as tf
 import numpy as np
 import json
+import time
 import argparse
-from .model import create_model
+from statistics import NormalDist
+from .model import (
+    create_model, compile_model, load_model, model_exists, list_models
+)
 from ..utils.config import (
-    DATA_CONFIG, DATA_RANGES_INFO, DATA_SUMMARY_TEMPLATE, SECURE_AGG_CONFIG,
-    INITIAL_MODEL_PATH, CLIENT_MODEL_TEMPLATE, TEST_CONFIG, MODEL_DIR
+    DATA_CONFIG, DATA_RANGES_INFO, DATA_SUMMARY_TEMPLATE,
+    INITIAL_MODEL_PATH, CLIENT_MODEL_TEMPLATE, TEST_CONFIG, MODEL_DIR, CPU_CONFIG,
+    FL_CONFIG, MODEL_CONFIG, RESULTS_CONFIG
 )
+from ..utils.cpu import configure_cpu, parse_threads
 from ..utils.crypto import CryptoUtils
-
+from ..utils.parameters import ParameterVector
+from ..utils.profiling import profiled
+from ..utils.metrics import get_registry, start_metrics
+from ..data.partition import get_partition, load_dataset
+from .secure_aggregation import get_keyring, handle_properties
+from .transfer import connect, empty_parameters, handle_transfer, is_transfer_request, publish_update
+
+
+_metrics = get_registry()
+BYTES_SENT = _metrics.counter('fl_bytes_sent_total', 'Serialized parameter bytes sent')
+BYTES_RECEIVED = _metrics.counter('fl_bytes_received_total', 'Serialized parameter bytes received')
+FIT_DURATION = _metrics.histogram('fl_client_fit_duration_seconds', 'Local training time per round')
+PARAMETER_CACHE = _metrics.counter(
+    'fl_client_parameter_cache_total', 'Rounds where decoding parameters was skipped (hit) or needed (miss)'
+)
+EVAL_CACHE = _metrics.counter('fl_client_eval_cache_total', 'Evaluate calls served from the cached result')
 
 class MnistClient(fl.client.NumPyClient):
-    def __init__(self, cid):  # Chỉ cần nhận cid
+    def __init__(self, cid, data=None):
         self.cid = str(cid)
         
-        # Load data cho client
-        self.x_train, self.y_train, self.x_test, self.y_test = load_data(cid)
-
-        # Load model mới nhất từ thư mục models
-        self.model = self._load_latest_model()
-
-        # Setup crypto
-        self._setup_crypto()
-        
-        # Store masks for current round
-        self.current_masks = None
-        self.peer_pubkeys = {}
-
-    def _setup_crypto(self):
-        """Setup cryptographic components"""
-        # Generate key pair
-        self.private_key, self.public_key = CryptoUtils.generate_keypair()
-        
-        # Save public key
-        key_path = os.path.join(
-            SECURE_AGG_CONFIG['key_storage'], 
-            f'client_{self.cid}_pub.pem'
-        )
-        with open(key_path, 'wb') as f:
-            f.write(CryptoUtils.serialize_public_key(self.public_key))
-
-    def _load_latest_model(self):
-        """Load model mới nhất hoặc tạo model mới nếu chưa có."""
-        models = [f for f in os.listdir(MODEL_DIR) if f.endswith('.keras')]
-        if not models:
-            # Nếu chưa có model nào, tạo model mới
-            model = create_model()
-            model.compile(
-                optimizer='adam',
-                loss='sparse_categorical_crossentropy',
-                metrics=['accuracy']
+        # Load data cho client (hoặc dùng partition có sẵn, ví dụ khi simulate)
+        if data is None:
+            data = load_data(cid)
+        self.x_train, self.y_train, self.x_test, self.y_test = data
+
+        # Chỉ dựng kiến trúc và compile một lần; weights luôn nhận từ server.
+        # Keras cache train function trên model nên các round sau dùng lại
+        # train step đã trace, miễn là không compile lại.
+        self.model = compile_model(create_model())
+        self._train_split = None
+
+        # Digest của weights server gửi mà model đang giữ (None sau khi train)
+        self.weights_digest = None
+        self._eval_sample = None
+        self._eval_cache = None
+
+        # Buffer phẳng tái sử dụng cho weights sau mỗi lần train
+        self.params = ParameterVector.from_ndarrays(self.model.get_weights())
+
+    def set_data(self, x_train, y_train, x_test, y_test):
+        """Thay dữ liệu local của client (dùng khi một client phục vụ nhiều virtual clients)."""
+        self.x_train, self.y_train = x_train, y_train
+        self.x_test, self.y_test = x_test, y_test
+        self._train_split = None
+        self._eval_sample = None
+        self._eval_cache = None
+
+    def _get_train_split(self, validation_split):
+        """Tách train/validation một lần (giống `validation_split` của Keras) và cache lại."""
+        if self._train_split is None or self._train_split[0] != validation_split:
+            split_at = int(len(self.x_train) * (1 - validation_split))
+            x = self.x_train.astype(np.float32, copy=False)
+            self._train_split = (
+                validation_split,
+                (x[:split_at], self.y_train[:split_at]),
+                (x[split_at:], self.y_train[split_at:]) if split_at < len(x) else None,
             )
-            return model
-
-        # Load model mới nhất
-        models.sort(key=lambda x: os.path.getmtime(os.path.join(MODEL_DIR, x)))
-        latest_model = os.path.join(MODEL_DIR, models[-1])
-        return tf.keras.models.load_model(latest_model)
+        return self._train_split[1], self._train_split[2]
+
+    def _get_eval_sample(self, sample_fraction):
+        """Mẫu con phân tầng theo label của tập test (cố định cho mỗi fraction)."""
+        if sample_fraction >= 1.0:
+            return self.x_test, self.y_test
+        if self._eval_sample is None or self._eval_sample[0] != sample_fraction:
+            rng = np.random.default_rng(int(self.cid))
+            indices = []
+            for label in np.unique(self.y_test):
+                label_indices = np.flatnonzero(self.y_test == label)
+                size = max(1, int(round(len(label_indices) * sample_fraction)))
+                indices.append(rng.choice(label_indices, size=size, replace=False))
+            indices = np.sort(np.concatenate(indices))
+            self._eval_sample = (sample_fraction, self.x_test[indices], self.y_test[indices])
+        return self._eval_sample[1], self._eval_sample[2]
+
+    def _cached_evaluation(self, config):
+        """Kết quả evaluate đã tính cho cùng digest và sample fraction (nếu có)."""
+        digest = config.get('params_digest')
+        key = (digest, config.get('sample_fraction', 1.0))
+        if digest is not None and self._eval_cache is not None and self._eval_cache[0] == key:
+            return self._eval_cache[1]
+        return None
+
+    def needs_parameters(self, config, evaluate=False):
+        """False nếu client đã giữ (hoặc đã đánh giá) đúng weights có digest trong config."""
+        digest = config.get('params_digest')
+        if digest is None:
+            return True
+        if digest == self.weights_digest:
+            return False
+        return not (evaluate and self._cached_evaluation(config) is not None)
+
+    def _set_parameters(self, parameters, digest):
+        """Set weights từ server; `parameters=None` khi model đã giữ đúng weights của digest."""
+        if parameters is not None:
+            self.model.set_weights(parameters)
+        self.weights_digest = digest
+
+    def to_client(self):
+        return MnistFlowerClient(self)
 
     def get_parameters(self, config):
         return self.model.get_weights()
 
+    @profiled('fit', lambda self, parameters, config: f"client{self.cid}_round{config.get('round_id', 0)}")
     def fit(self, parameters, config):
-        # Get peer public keys from config
-        self.peer_pubkeys = {
-            cid: CryptoUtils.deserialize_public_key(key_bytes)
-            for cid, key_bytes in config.get('peer_pubkeys', {}).items()
-            if cid != self.cid
-        }
-        
         # Set model parameters
-        self.model.set_weights(parameters)
+        self._set_parameters(parameters, config.get('params_digest'))
 
+        (x_train, y_train), validation_data = self._get_train_split(
+            config.get('validation_split', DATA_CONFIG['validation_split'])
+        )
+        fit_start = time.perf_counter()
         history = self.model.fit(
-            self.x_train,
-            self.y_train,
+            x_train,
+            y_train,
             epochs=config.get('local_epochs', DATA_CONFIG['local_epochs']),
             batch_size=config.get('batch_size', DATA_CONFIG['batch_size']),
-            validation_split=config.get('validation_split', DATA_CONFIG['validation_split']),
+            validation_data=validation_data,
             verbose=config.get('verbose', 1)
         )
-
-        # Get model update
-        update = self.model.get_weights()
-        
-        # Generate masks for each peer
-        masks = []
-        for peer_id, peer_pubkey in self.peer_pubkeys.items():
-            # Generate shared key
-            shared_key = CryptoUtils.generate_shared_key(
-                self.private_key, 
-                peer_pubkey
+        fit_time = time.perf_counter() - fit_start
+        FIT_DURATION.observe(fit_time, client=self.cid)
+
+        # Get model update (copy vào buffer phẳng có sẵn)
+        update = self.params.assign(self.model.get_weights())
+        self.weights_digest = None
+
+        if 'secagg_round' in config:
+            # Server chỉ thấy tổng: gửi update (fixed point uint32) đã nhân số examples
+            # cộng pairwise masks; masks triệt tiêu khi server cộng trong vành
+            ring = ParameterVector(
+                CryptoUtils.quantize(update.buffer, len(self.x_train)), update.shapes, np.uint32
             )
-            
-            # Generate mask
-            mask = CryptoUtils.generate_mask(
-                shared_key,
-                config.get('round_id', 0),
-                [w.shape for w in update]
+            update = CryptoUtils.apply_mask(
+                ring, get_keyring().mask(self.cid, int(config['secagg_round']), update.size)
             )
-            
-            if int(peer_id) > int(self.cid):
-                # Add mask if peer has higher ID
-                masks.append(mask)
-            else:
-                # Subtract mask if peer has lower ID
-                masks.append([-m for m in mask])
-                
-        # Combine all masks
-        total_mask = [sum(m) for m in zip(*masks)] if masks else [0] * len(update)
-        self.current_masks = total_mask
-        
-        # Apply mask to update
-        masked_update = CryptoUtils.apply_mask(update, total_mask)
-        
+
         # Return masked update
-        return masked_update, len(self.x_train), {
+        return update.to_ndarrays(), len(self.x_train), {
             'accuracy': history.history['accuracy'][-1],
             'loss': history.history['loss'][-1],
-            'client_id': self.cid
+            'client_id': self.cid,
+            'fit_time': fit_time
         }
 
     def evaluate(self, parameters, config):
-        self.model.set_weights(parameters)
-        loss, accuracy = self.model.evaluate(self.x_test, self.y_test)
-        return loss, len(self.x_test), {"accuracy": accuracy}
+        cached = self._cached_evaluation(config)
+        EVAL_CACHE.inc(client=self.cid, result='miss' if cached is None else 'hit')
+        if cached is not None:
+            return cached
+
+        self._set_parameters(parameters, config.get('params_digest'))
+        sample_fraction = config.get('sample_fraction', 1.0)
+        x_test, y_test = self._get_eval_sample(sample_fraction)
+        loss, accuracy = self.model.evaluate(
+            x_test, y_test,
+            verbose=config.get('verbose', DATA_CONFIG['evaluation_verbose'])
+        )
+
+        metrics = {"accuracy": accuracy}
+        if len(y_test) < len(self.y_test):
+            ci_low, ci_high = accuracy_confidence_interval(
+                accuracy, len(y_test), len(self.y_test),
+                config.get('confidence', FL_CONFIG['evaluate_confidence'])
+            )
+            metrics.update({
+                'accuracy_ci_low': ci_low,
+                'accuracy_ci_high': ci_high,
+                'sample_size': len(y_test),
+            })
+
+        result = (loss, len(y_test), metrics)
+        if config.get('params_digest') is not None:
+            self._eval_cache = ((config['params_digest'], sample_fraction), result)
+        return result
+
+class MnistFlowerClient(fl.client.Client):
+    """Flower `Client` cho MnistClient: chỉ deserialize parameters khi digest
+    server gửi khác với weights client đang giữ."""
+
+    def __init__(self, numpy_client):
+        self.numpy_client = numpy_client
+
+    def _decode(self, ins, evaluate=False):
+        cid = self.numpy_client.cid
+        stage = 'evaluate' if evaluate else 'fit'
+        BYTES_RECEIVED.inc(sum(len(t) for t in ins.parameters.tensors),
+                           component='client', client=cid, stage=stage)
+        if not self.numpy_client.needs_parameters(ins.config, evaluate=evaluate):
+            PARAMETER_CACHE.inc(client=cid, result='hit')
+            return None
+        PARAMETER_CACHE.inc(client=cid, result='miss')
+        return ParameterVector.from_parameters(ins.parameters).to_ndarrays()
+
+    def get_properties(self, ins):
+        # Server kéo chunks của update, hoặc các bước key exchange / unmask của secure aggregation
+        if is_transfer_request(ins):
+            return handle_transfer(self.numpy_client.cid, ins)
+        return handle_properties(self.numpy_client.cid, ins)
+
+    def get_parameters(self, ins):
+        parameters = self.numpy_client.get_parameters(ins.config)
+        return fl.common.GetParametersRes(
+            status=fl.common.Status(code=fl.common.Code.OK, message="Success"),
+            parameters=fl.common.ndarrays_to_parameters(parameters)
+        )
+
+    def fit(self, ins):
+        parameters, num_examples, metrics = self.numpy_client.fit(self._decode(ins), ins.config)
+        # Update lớn: chỉ gửi manifest, server kéo từng chunk sau
+        manifest = publish_update(self.numpy_client.cid, parameters, ins.config)
+        if manifest is not None:
+            metrics = {**metrics, **manifest}
+            parameters = empty_parameters()
+        else:
+            parameters = fl.common.ndarrays_to_parameters(parameters)
+            BYTES_SENT.inc(sum(len(t) for t in parameters.tensors),
+                           component='client', client=self.numpy_client.cid, stage='fit')
+        return fl.common.FitRes(
+            status=fl.common.Status(code=fl.common.Code.OK, message="Success"),
+            parameters=parameters,
+            num_examples=num_examples,
+            metrics=metrics
+        )
+
+    def evaluate(self, ins):
+        loss, num_examples, metrics = self.numpy_client.evaluate(
+            self._decode(ins, evaluate=True), ins.config
+        )
+        return fl.common.EvaluateRes(
+            status=fl.common.Status(code=fl.common.Code.OK, message="Success"),
+            loss=float(loss),
+            num_examples=num_examples,
+            metrics=metrics
+        )
+
+def accuracy_confidence_interval(accuracy, sample_size, population_size, confidence):
+    """Khoảng tin cậy (xấp xỉ chuẩn, có hiệu chỉnh quần thể hữu hạn) cho accuracy trên mẫu con."""
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    fpc = np.sqrt((population_size - sample_size) / max(1, population_size - 1))
+    half_width = z * np.sqrt(accuracy * (1 - accuracy) / sample_size) * fpc
+    return float(max(0.0, accuracy - half_width)), float(min(1.0, accuracy + half_width))
+
+# Predictions gọn cho test report: 4 bytes mỗi mẫu
+PREDICTION_DTYPE = np.dtype([('label', np.uint8), ('prediction', np.uint8), ('confidence', np.float16)])
+
+def evaluate_streaming(model, x, y, batch_size=None, num_classes=None, keep_predictions=False):
+    """Đánh giá `model` trong một lượt duy nhất qua (x, y) theo từng batch float32.
+
+    Cộng dồn loss (sparse categorical cross-entropy), accuracy và confusion matrix
+    (`np.bincount`), từ đó tính precision/recall/F1 theo từng lớp. `x` có thể là
+    array memory-mapped: mỗi lần chỉ một batch được đọc vào bộ nhớ. Với
+    `keep_predictions=True` trả thêm mảng predictions gọn (label, prediction,
+    confidence) để so sánh hoặc lưu ra .npy.
+    """
+    batch_size = batch_size or TEST_CONFIG['batch_size']
+    num_classes = num_classes or MODEL_CONFIG['num_classes']
+    num_samples = len(x)
+    confusion = np.zeros(num_classes * num_classes, dtype=np.int64)
+    total_loss = 0.0
+    predictions = np.empty(num_samples, dtype=PREDICTION_DTYPE) if keep_predictions else None
+
+    for start in range(0, num_samples, batch_size):
+        stop = min(start + batch_size, num_samples)
+        x_batch = np.asarray(x[start:stop], dtype=np.float32)
+        y_batch = np.asarray(y[start:stop], dtype=np.int64)
+        probabilities = np.asarray(model.predict_on_batch(x_batch))
+
+        predicted = probabilities.argmax(axis=1)
+        true_probability = probabilities[np.arange(stop - start), y_batch]
+        total_loss -= np.log(np.clip(true_probability, 1e-7, 1.0), dtype=np.float64).sum()
+        confusion += np.bincount(y_batch * num_classes + predicted, minlength=num_classes * num_classes)
+        if predictions is not None:
+            predictions['label'][start:stop] = y_batch
+            predictions['prediction'][start:stop] = predicted
+            predictions['confidence'][start:stop] = probabilities[np.arange(stop - start), predicted]
+
+    confusion = confusion.reshape(num_classes, num_classes)
+    true_positive = np.diag(confusion).astype(np.float64)
+    predicted_count = confusion.sum(axis=0)
+    actual_count = confusion.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted_count > 0, true_positive / predicted_count, 0.0)
+        recall = np.where(actual_count > 0, true_positive / actual_count, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    report = {
+        'num_samples': int(num_samples),
+        'loss': float(total_loss / num_samples) if num_samples else 0.0,
+        'accuracy': float(true_positive.sum() / num_samples) if num_samples else 0.0,
+        'precision': {str(k): float(v) for k, v in enumerate(precision)},
+        'recall': {str(k): float(v) for k, v in enumerate(recall)},
+        'f1': {str(k): float(v) for k, v in enumerate(f1)},
+        # Trung bình macro chỉ trên các lớp có trong dữ liệu
+        'macro': {
+            name: float(values[actual_count > 0].mean()) if (actual_count > 0).any() else 0.0
+            for name, values in (('precision', precision), ('recall', recall), ('f1', f1))
+        },
+    }
+    if TEST_CONFIG['confusion_matrix']:
+        report['confusion_matrix'] = confusion.tolist()
+    return report, predictions
 
 class TestOnlyClient:
     def __init__(self):
@@ -134,177 +325,143 @@ class TestOnlyClient:
         self.initial_model = self._load_initial_model()
         self.current_model = self._load_latest_model()
         self._load_test_data()
+        self.reports = {}
+        self.predictions = {}
         print("\nTest-Only Client initialized:")
         print(f"Initial model: {INITIAL_MODEL_PATH}")
         print(f"Current model: {self.current_model_path}")
 
     def _load_initial_model(self):
         """Load model ban đầu."""
-        if not os.path.exists(INITIAL_MODEL_PATH):
+        if not model_exists('initial_model'):
             raise ValueError("Initial model not found")
-        return tf.keras.models.load_model(INITIAL_MODEL_PATH)
+        return load_model('initial_model')
 
     def _load_latest_model(self):
-        """Load model mới nhất từ thư mục models."""
-        models = [f for f in os.listdir(MODEL_DIR) if f.endswith('.keras')]
+        """Load model mới nhất (theo model index, không quét thư mục)."""
+        models = [m for m in list_models() if m['name'] != 'initial_model.keras']
         if not models:
             print("No additional models found, using initial model")
             self.current_model_path = INITIAL_MODEL_PATH
+            self.current_model_name = 'initial_model.keras'
             return self.initial_model
         
-        models.sort(key=lambda x: os.path.getmtime(os.path.join(MODEL_DIR, x)))
-        self.current_model_path = os.path.join(MODEL_DIR, models[-1])
-        return tf.keras.models.load_model(self.current_model_path)
+        latest = max(models, key=lambda m: m['modified'])
+        self.current_model_path = latest['path']
+        self.current_model_name = latest['name']
+        return load_model(latest['name'])
 
     def _load_test_data(self):
-        """Load dữ liệu test."""
-        _, (self.x_test, self.y_test) = tf.keras.datasets.mnist.load_data()
-        self.x_test = self.x_test.reshape(-1, 28, 28, 1) / 255.0
+        """Load dữ liệu test (float32 memory-mapped, không tạo bản copy)."""
+        _, _, self.x_test, self.y_test = load_dataset()
+
+    def _models(self):
+        return {'initial_model': self.initial_model, 'current_model': self.current_model}
+
+    def _evaluate(self):
+        """Một lượt đánh giá duy nhất cho mỗi model (kết quả được giữ lại)."""
+        if not self.reports:
+            for key, model in self._models().items():
+                if key == 'current_model' and model is self.initial_model:
+                    # Không có model mới: dùng lại kết quả của model ban đầu
+                    self.reports[key], self.predictions[key] = (
+                        self.reports['initial_model'], self.predictions['initial_model']
+                    )
+                    continue
+                self.reports[key], self.predictions[key] = evaluate_streaming(
+                    model, self.x_test, self.y_test, keep_predictions=True
+                )
+        return self.reports
 
     def compare_predictions(self, data=None):
         """So sánh dự đoán giữa model ban đầu và model hiện tại."""
         if data is None:
-            # Sử dụng test data nếu không có data được cung cấp
-            data = self.x_test
-            actual = self.y_test
-        else:
-            data = np.array(data).reshape(-1, 28, 28, 1) / 255.0
-            actual = None
-
-        # Dự đoán với cả hai model
-        initial_pred = self.initial_model.predict(data)
-        current_pred = self.current_model.predict(data)
-
-        # Tính toán metrics
-        results = {
-            'initial_model': {
-                'predictions': np.argmax(initial_pred, axis=1).tolist(),
-                'confidence': np.max(initial_pred, axis=1).tolist(),
-            },
-            'current_model': {
-                'predictions': np.argmax(current_pred, axis=1).tolist(),
-                'confidence': np.max(current_pred, axis=1).tolist(),
+            # Dùng predictions của lượt đánh giá trên test set (không predict lại)
+            self._evaluate()
+            initial, current = self.predictions['initial_model'], self.predictions['current_model']
+            return {
+                'initial_model': {
+                    'predictions': initial['prediction'].tolist(),
+                    'confidence': initial['confidence'].astype(float).tolist(),
+                },
+                'current_model': {
+                    'predictions': current['prediction'].tolist(),
+                    'confidence': current['confidence'].astype(float).tolist(),
+                },
+                'actual': initial['label'].tolist(),
+                'initial_accuracy': self.reports['initial_model']['accuracy'],
+                'current_accuracy': self.reports['current_model']['accuracy'],
+                'agreement': float(np.mean(initial['prediction'] == current['prediction'])),
             }
-        }
-
-        # Thêm actual values và accuracy nếu có
-        if actual is not None:
-            initial_accuracy = np.mean(np.argmax(initial_pred, axis=1) == actual)
-            current_accuracy = np.mean(np.argmax(current_pred, axis=1) == actual)
-            results.update({
-                'actual': actual.tolist(),
-                'initial_accuracy': float(initial_accuracy),
-                'current_accuracy': float(current_accuracy),
-            })
 
+        data = np.asarray(data, dtype=np.float32).reshape(-1, 28, 28, 1) / np.float32(255.0)
+        results = {}
+        for key, model in self._models().items():
+            prediction = np.asarray(model.predict_on_batch(data))
+            results[key] = {
+                'predictions': np.argmax(prediction, axis=1).tolist(),
+                'confidence': np.max(prediction, axis=1).tolist(),
+            }
         return results
 
     def evaluate_models(self):
         """Đánh giá chi tiết cả hai models trên tập test."""
-        # Đánh giá model ban đầu
-        initial_loss, initial_accuracy = self.initial_model.evaluate(
-            self.x_test, self.y_test,
-            batch_size=TEST_CONFIG['batch_size'],
-            verbose=0
-        )
-
-        # Đánh giá model hiện tại
-        current_loss, current_accuracy = self.current_model.evaluate(
-            self.x_test, self.y_test,
-            batch_size=TEST_CONFIG['batch_size'],
-            verbose=0
-        )
-
-        evaluation = {
-            'initial_model': {
-                'loss': float(initial_loss),
-                'accuracy': float(initial_accuracy),
-            },
-            'current_model': {
-                'loss': float(current_loss),
-                'accuracy': float(current_accuracy),
-            },
+        reports = self._evaluate()
+        initial, current = reports['initial_model'], reports['current_model']
+        return {
+            'initial_model': initial,
+            'current_model': current,
             'improvement': {
-                'accuracy': float(current_accuracy - initial_accuracy),
-                'loss': float(initial_loss - current_loss),
+                'accuracy': current['accuracy'] - initial['accuracy'],
+                'loss': initial['loss'] - current['loss'],
+                'macro_f1': current['macro']['f1'] - initial['macro']['f1'],
             }
         }
 
+    def report(self):
+        """Đánh giá, in tóm tắt và lưu report (JSON + predictions .npy) vào results dir."""
+        start = time.perf_counter()
+        evaluation = self.evaluate_models()
+        evaluation['models'] = {
+            'initial_model': 'initial_model.keras',
+            'current_model': self.current_model_name,
+        }
+        evaluation['agreement'] = float(np.mean(
+            self.predictions['initial_model']['prediction'] == self.predictions['current_model']['prediction']
+        ))
+        evaluation['evaluation_time'] = time.perf_counter() - start
+        evaluation['timestamp'] = time.strftime('%Y-%m-%d %H:%M:%S')
+
+        results_dir = RESULTS_CONFIG['save_dir']
+        os.makedirs(results_dir, exist_ok=True)
+        if TEST_CONFIG['save_predictions']:
+            evaluation['predictions_files'] = {}
+            for key, predictions in self.predictions.items():
+                path = os.path.join(results_dir, f'test_predictions_{key}.npy')
+                np.save(path, predictions)
+                evaluation['predictions_files'][key] = path
+        report_path = os.path.join(results_dir, 'test_report.json')
+        with open(report_path, 'w') as f:
+            json.dump(evaluation, f, indent=4)
+
+        print("\nTest Report:")
+        print("=" * 50)
+        for key in ('initial_model', 'current_model'):
+            result = evaluation[key]
+            print(f"{evaluation['models'][key]}: loss {result['loss']:.4f}, "
+                  f"accuracy {result['accuracy']:.4f}, macro F1 {result['macro']['f1']:.4f}")
+        print(f"Accuracy improvement: {evaluation['improvement']['accuracy']:+.4f}")
+        print(f"Prediction agreement: {evaluation['agreement']:.2%}")
+        print(f"Evaluation time: {evaluation['evaluation_time']:.2f}s")
+        print("=" * 50)
+        print(f"Report saved to: {report_path}")
         return evaluation
 
-def load_data(cid):
-    """Tải và phân tích dữ liệu MNIST cho client."""
-    (x_train, y_train), (x_test, y_test) = tf.keras.datasets.mnist.load_data()
-    x_train = x_train.reshape(-1, 28, 28, 1) / 255.0
-    x_test = x_test.reshape(-1, 28, 28, 1) / 255.0
-    
-    # Kiểm tra client ID có hợp lệ không
-    str_cid = str(cid)
-    if str_cid not in DATA_RANGES_INFO['client_ranges']:
-        raise ValueError(f"Invalid client ID: {cid}")
-    
-    num_clients = DATA_CONFIG["num_clients"]["initial"] + DATA_CONFIG["num_clients"]["additional"]
-    shard_size = len(x_train)//num_clients
-    if (cid <= DATA_CONFIG["num_clients"]["initial"]):
-        shard_size = 10000
-    start = (cid-1) * shard_size
-    end = start + shard_size
-    x_train = x_train[start:end]
-    y_train = y_train[start:end]
-    shard_size = int(shard_size*0.2)
-    start = (cid-1) * shard_size
-    end = start + shard_size
-    x_test = x_test[start:end]
-    y_test = y_test[start:end]
-
-    # Lấy thông tin range và labels cho client
-    client_info = DATA_RANGES_INFO['client_ranges'][str_cid]
-    allowed_labels = client_info['labels']
-
-    # Lọc dữ liệu train theo labels được chỉ định
-    train_mask = np.isin(y_train, allowed_labels)
-    x_train_filtered = x_train[train_mask]
-    y_train_filtered = y_train[train_mask]
-
-    # Lọc dữ liệu test theo labels được chỉ định
-    test_mask = np.isin(y_test, allowed_labels)
-    x_test_filtered = x_test[test_mask]
-    y_test_filtered = y_test[test_mask]
-
-    # Tính phân bố chi tiết cho tập train
-    train_labels, train_counts = np.unique(y_train_filtered, return_counts=True)
-    train_distribution = {
-        int(label): int(count) for label, count in zip(train_labels, train_counts)
-    }
-
-    # Tính phân bố chi tiết cho tập test
-    test_labels, test_counts = np.unique(y_test_filtered, return_counts=True)
-    test_distribution = {
-        int(label): int(count) for label, count in zip(test_labels, test_counts)
-    }
-
-    # Tạo summary chi tiết về dữ liệu
-    data_summary = {
-        'client_id': cid,
-        'train': {
-            'total_samples': len(y_train_filtered),
-            'samples_per_label': train_distribution,
-            'labels_distribution': {
-                str(label): f"{(count/len(y_train_filtered)*100):.2f}%"
-                for label, count in train_distribution.items()
-            }
-        },
-        'test': {
-            'total_samples': len(y_test_filtered),
-            'samples_per_label': test_distribution,
-            'labels_distribution': {
-                str(label): f"{(count/len(y_test_filtered)*100):.2f}%"
-                for label, count in test_distribution.items()
-            }
-        },
-        'allowed_labels': allowed_labels,
-        'description': client_info['description']
-    }
+def load_data(cid, synthetic=None):
+    """Tải dữ liệu của client từ partition dùng chung (xem `backend.data.partition`)."""
+    partition = get_partition(synthetic=synthetic)
+    x_train, y_train, x_test, y_test = partition.client_data(cid)
+    data_summary = partition.summary(cid)
 
     # Lưu summary
     summary_path = DATA_SUMMARY_TEMPLATE.format(f"client_{cid}")
@@ -315,24 +472,19 @@ def load_data(cid):
     # In thông tin chi tiết
     print(f"\nClient {cid} Dataset Summary:")
     print("=" * 50)
-    print(f"Description: {client_info['description']}")
-    print(f"Allowed labels: {allowed_labels}")
-    print("\nTraining Data:")
-    print(f"Total samples: {len(y_train_filtered)}")
-    print("Distribution by label:")
-    for label, count in sorted(train_distribution.items()):
-        percentage = (count/len(y_train_filtered)*100)
-        print(f"  Label {label}: {count} samples ({percentage:.2f}%)")
-
-    print("\nTest Data:")
-    print(f"Total samples: {len(y_test_filtered)}")
-    print("Distribution by label:")
-    for label, count in sorted(test_distribution.items()):
-        percentage = (count/len(y_test_filtered)*100)
-        print(f"  Label {label}: {count} samples ({percentage:.2f}%)")
+    print(f"Description: {data_summary['description']}")
+    print(f"Allowed labels: {data_summary['allowed_labels']}")
+    for split, title in (('train', 'Training Data'), ('test', 'Test Data')):
+        info = data_summary[split]
+        print(f"\n{title}:")
+        print(f"Total samples: {info['total_samples']}")
+        print("Distribution by label:")
+        for label, count in sorted(info['samples_per_label'].items()):
+            percentage = (count/info['total_samples']*100)
+            print(f"  Label {label}: {count} samples ({percentage:.2f}%)")
     print("=" * 50)
 
-    return x_train_filtered, y_train_filtered, x_test_filtered, y_test_filtered
+    return x_train, y_train, x_test, y_test
 
 def create_client_parser():
     """Tạo parser với các mô tả chi tiết cho client."""
@@ -400,8 +552,48 @@ Note: Make sure the server is running before starting the client.
         help="Verbosity level for training (0: silent, 1: progress bar, 2: one line per epoch)"
     )
 
+    # CPU configuration
+    cpu_group = parser.add_argument_group('CPU Configuration')
+    cpu_group.add_argument(
+        "--threads",
+        type=parse_threads,
+        default=CPU_CONFIG['client_threads'],
+        help="TensorFlow intra-op threads: a number, 'auto' (split host cores across "
+             "co-located clients of the phase) or 'default' "
+             f"(default: {CPU_CONFIG['client_threads']})"
+    )
+
+    cpu_group.add_argument(
+        "--inter_op_threads",
+        type=int,
+        default=CPU_CONFIG['inter_op_threads'],
+        help=f"TensorFlow inter-op threads (default: {CPU_CONFIG['inter_op_threads']})"
+    )
+
+    cpu_group.add_argument(
+        "--pin_cores",
+        action="store_true",
+        default=CPU_CONFIG['pin_cores'],
+        help="Pin the client process to its own set of cores (Linux only)"
+    )
+
     return parser
 
+def configure_client_cpu(cid, threads, inter_op_threads=None, pin_cores=False):
+    """Áp dụng thread budget cho client; các clients cùng phase được chia cores riêng."""
+    phase = DATA_RANGES_INFO['client_ranges'].get(str(cid), {}).get('phase', 'initial')
+    settings = configure_cpu(
+        threads=threads,
+        inter_op_threads=inter_op_threads,
+        pin_cores=pin_cores,
+        slot=int(cid) - 1,
+        mode=phase
+    )
+    print(f"CPU: {settings['intra_op_threads'] or 'default'} intra-op threads "
+          f"of {settings['available_cores']} cores"
+          + (f", pinned to {settings['pinned_cores']}" if settings['pinned_cores'] else ""))
+    return settings
+
 def print_client_config(args):
     """In ra cấu hình hiện tại của client."""
     print("\nClient Configuration:")
@@ -418,27 +610,33 @@ def print_client_config(args):
 def start_client(args):
     """Khởi động client dựa trên mode."""
     if args.mode == 'test-only':
-        return TestOnlyClient()
+        client = TestOnlyClient()
+        client.report()
+        return client
         
-    # Load data cho client theo mode
-    x_train, y_train, x_test, y_test = load_data(args.cid, args.mode)
-    
     # Cập nhật DATA_CONFIG với các giá trị từ command line
     DATA_CONFIG.update({
         'batch_size': args.batch_size,
-        'local_epochs': args.local_epochs,
-        'validation_split': args.validation_split
+        'local_epochs': getattr(args, 'local_epochs', DATA_CONFIG['local_epochs']),
+        'validation_split': getattr(args, 'validation_split', DATA_CONFIG['validation_split'])
     })
+
+    # Thread budget phải được đặt trước khi tạo model
+    configure_client_cpu(
+        args.cid,
+        getattr(args, 'threads', CPU_CONFIG['client_threads']),
+        getattr(args, 'inter_op_threads', None),
+        getattr(args, 'pin_cores', CPU_CONFIG['pin_cores'])
+    )
     
     # Tạo client
-    client = MnistClient(args.cid, args.mode, x_train, y_train, x_test, y_test)
+    client = MnistClient(args.cid)
+    start_metrics(f'client_{args.cid}')
     
     # Start Flower client
-    print(f"\nConnecting to server at {args.server_address}...")
-    fl.client.start_client(
-        server_address=args.server_address,
-        client=client.to_client()
-    )
+    server_address = getattr(args, 'server_address', "127.0.0.1:8080")
+    print(f"\nConnecting to server at {server_address}...")
+    connect(server_address, client.to_client())
 
 def main():
     # Parse arguments
@@ -455,14 +653,15 @@ def main():
     print("=" * 50)
 
     try:
+        # Thread budget phải được đặt trước khi tạo model
+        configure_client_cpu(args.cid, args.threads, args.inter_op_threads, args.pin_cores)
+
         # Create and start client - chỉ truyền cid
         client = MnistClient(args.cid)
+        start_metrics(f'client_{args.cid}')
 
         print(f"\nConnecting to server at {args.server_address}...")
-        fl.client.start_client(
-            server_address=args.server_address,
-            client=client.to_client()
-        )
+        connect(args.server_address, client.to_client())
 
     except Exception as e:
         print(f"\nError: {e}")
@@ -1,15 +1,51 @@
 import flwr as fl
-import tensorflow as tf
-from .model import create_model
+from .model import create_model, compile_model, load_model, model_exists, store_model
 from ..utils.config import (
     FL_CONFIG, MODEL_DIR, DATA_SUMMARY_TEMPLATE,
-    MODEL_TEMPLATES, DATA_RANGES_INFO, SECURE_AGG_CONFIG
+    DATA_RANGES_INFO, SECURE_AGG_CONFIG, AGGREGATION_CONFIG, QUANTIZATION_CONFIG,
+    TRANSFER_CONFIG
 )
+from ..utils.parameters import ParameterVector, parallel_map, parameters_digest
+from ..utils.crypto import CryptoUtils
+from ..utils.results_log import ResultsLog
+from ..utils.profiling import profiled
+from ..utils.metrics import get_registry, start_metrics
+from ..data.partition import load_dataset
+from .secure_aggregation import SecureAggregationCoordinator
+from .aggregators import aggregate, finite_updates
+from .quantization import quantize_and_publish
+from .transfer import ChunkReceiver, ProxyFinder, release
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import os
+import time
 import json
 import numpy as np
 
+_metrics = get_registry()
+BYTES_SENT = _metrics.counter('fl_bytes_sent_total', 'Serialized parameter bytes sent')
+BYTES_RECEIVED = _metrics.counter('fl_bytes_received_total', 'Serialized parameter bytes received')
+ROUNDS = _metrics.counter('fl_rounds_total', 'Completed federated rounds')
+ROUND_FAILURES = _metrics.counter('fl_round_failures_total', 'Failed client results per round')
+ROUND_DURATION = _metrics.histogram('fl_round_duration_seconds', 'Round duration (configure_fit to saved)')
+ROUND_PARTICIPANTS = _metrics.gauge('fl_round_participants', 'Clients that returned results in the last round')
+
+def _parameters_nbytes(parameters):
+    return sum(len(tensor) for tensor in parameters.tensors)
+
+def _leaf_client_ids(metrics):
+    """IDs của các clients thật sau một kết quả fit (edge aggregator báo qua 'edge_clients')."""
+    if metrics.get('edge_clients'):
+        return metrics['edge_clients'].split(',')
+    return [str(metrics['client_id'])]
+
+def _result_order(result):
+    """Khoá sắp xếp kết quả fit theo client ID (số trước, rồi tới proxy cid)."""
+    client_proxy, fit_res = result
+    client_id = str(fit_res.metrics.get('client_id', ''))
+    return (0, int(client_id), '') if client_id.isdigit() else (1, 0, client_id or client_proxy.cid)
+
 class FederatedServer(fl.server.strategy.FedAvg):
     def __init__(self, mode='initial', *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -19,39 +55,85 @@ class FederatedServer(fl.server.strategy.FedAvg):
         self.best_accuracy = 0.0
         self.active_clients = set()
         self.client_id_map = {}  # Theo dõi clients đang tham gia
-
-        # Store client public keys
-        self.client_pubkeys = {}
+        self.round_start_time = None
+        self.results_log = None
+        self._pipeline = None
+        self._pending_rounds = deque()
+        self._client_manager = None
+        self.secure_aggregation = SecureAggregationCoordinator()
         
         # Khởi tạo hoặc load model dựa trên mode
-        if mode == 'initial':
-            self.model = create_model()
-            self.model.compile(
-                optimizer='adam',
-                loss='sparse_categorical_crossentropy',
-                metrics=['accuracy']
-            )
-            # Lưu model ban đầu
-            model_path = MODEL_TEMPLATES['initial']
-            os.makedirs(os.path.dirname(model_path), exist_ok=True)
-            self.model.save(model_path)
-        else:
-            initial_path = MODEL_TEMPLATES['initial']
-            if not os.path.exists(initial_path):
-                raise ValueError("Initial model not found. Please run initial training first.")
-            self.model = tf.keras.models.load_model(initial_path)
+        self.model = self._create_global_model(mode)
         
         print(f"\nInitializing server in {mode} mode")
+        if self.robust_aggregation:
+            print(f"Robust aggregation '{AGGREGATION_CONFIG['method']}' needs individual updates: "
+                  f"secure aggregation is disabled")
 
-    def _load_client_pubkeys(self):
-        """Load all available client public keys"""
-        key_dir = SECURE_AGG_CONFIG['key_storage']
-        for filename in os.listdir(key_dir):
-            if filename.startswith('client_') and filename.endswith('_pub.pem'):
-                client_id = filename.split('_')[1]
-                with open(os.path.join(key_dir, filename), 'rb') as f:
-                    self.client_pubkeys[client_id] = f.read()
+    @property
+    def robust_aggregation(self):
+        """Phương pháp tổng hợp khác FedAvg (không dùng được với masks của secure aggregation)."""
+        return AGGREGATION_CONFIG['method'] != 'fedavg'
 
+    def _create_global_model(self, mode):
+        """Khởi tạo (mode initial) hoặc load model toàn cục từ initial model."""
+        if mode == 'initial':
+            model = compile_model(create_model())
+            # Lưu model ban đầu
+            store_model(model, 'initial_model', {'mode': mode, 'round': 0})
+            return model
+
+        if not model_exists('initial_model'):
+            raise ValueError("Initial model not found. Please run initial training first.")
+        return load_model('initial_model')
+
+    def initialize_parameters(self, client_manager):
+        """Gửi weights của server cho round đầu tiên.
+
+        Clients không load model từ disk nữa nên server luôn là nguồn weights
+        duy nhất (tránh việc Flower lấy weights ngẫu nhiên từ một client).
+        """
+        initial_parameters = super().initialize_parameters(client_manager)
+        if initial_parameters is not None:
+            return initial_parameters
+        return ParameterVector.from_ndarrays(self.model.get_weights()).to_parameters()
+
+    def configure_fit(self, server_round, parameters, client_manager):
+        """Key exchange của secure aggregation cho các clients được chọn, rồi gắn digest
+        của parameters để clients bỏ qua set_weights khi đã giữ đúng weights."""
+        self.round_start_time = time.perf_counter()
+        self._client_manager = client_manager
+        instructions = super().configure_fit(server_round, parameters, client_manager)
+        if not self.robust_aggregation:
+            instructions = self.secure_aggregation.setup(server_round, instructions)
+        digest = parameters_digest(parameters)
+        for _, fit_ins in instructions:
+            fit_ins.config['params_digest'] = digest
+            if not self.robust_aggregation:
+                fit_ins.config['secagg_round'] = server_round
+            if TRANSFER_CONFIG['enabled']:
+                # Updates lớn hơn một chunk được server kéo về theo chunks
+                fit_ins.config['transfer_chunk_bytes'] = TRANSFER_CONFIG['chunk_bytes']
+        BYTES_SENT.inc(_parameters_nbytes(parameters) * len(instructions),
+                       component='server', stage='fit')
+        return instructions
+
+    def configure_evaluate(self, server_round, parameters, client_manager):
+        """Gắn digest và cấu hình đánh giá mẫu con (round cuối luôn đánh giá toàn bộ)."""
+        instructions = super().configure_evaluate(server_round, parameters, client_manager)
+        final_round = server_round >= getattr(self, 'num_rounds', server_round)
+        config = {
+            'params_digest': parameters_digest(parameters),
+            'sample_fraction': 1.0 if final_round else FL_CONFIG['evaluate_sample_fraction'],
+            'confidence': FL_CONFIG['evaluate_confidence'],
+        }
+        for _, evaluate_ins in instructions:
+            evaluate_ins.config.update(config)
+        BYTES_SENT.inc(_parameters_nbytes(parameters) * len(instructions),
+                       component='server', stage='evaluate')
+        return instructions
+
+    @profiled('aggregate_fit', lambda self, server_round, results, failures: f'round{server_round}')
     def aggregate_fit(self, server_round, results, failures):
         """Aggregate masked model updates từ các clients."""
         self.current_round = server_round
@@ -60,136 +142,340 @@ class FederatedServer(fl.server.strategy.FedAvg):
         print(f"Active clients: {len(results)}")
         print(f"Failures: {len(failures)}")
 
-        # Load client public keys 
-        self._load_client_pubkeys()
-
         # Kiểm tra số lượng clients tối thiểu
         if len(results) < SECURE_AGG_CONFIG['min_clients_for_unmasking']:
             print(f"Insufficient clients for unmasking. Need at least {SECURE_AGG_CONFIG['min_clients_for_unmasking']}")
+            self.secure_aggregation.discard(server_round)
             return None, {}
 
-        # Cập nhật danh sách clients đang hoạt động
+        # Cập nhật danh sách clients đang hoạt động. `active_client_ids` là các bên gửi
+        # update trực tiếp (clients hoặc edge aggregators), `leaf_client_ids` là các
+        # clients thật phía sau chúng.
         active_client_ids = set()
+        leaf_client_ids = set()
         for client_proxy, fit_res in results:
             numeric_cid = fit_res.metrics.get('client_id')
             if numeric_cid:
                 self.client_id_map[client_proxy.cid] = str(numeric_cid)
-                self.active_clients.add(str(numeric_cid))
                 active_client_ids.add(str(numeric_cid))
-                
+                leaf_client_ids.update(_leaf_client_ids(fit_res.metrics))
+        self.active_clients.update(leaf_client_ids)
+
         # Kiểm tra client dropouts
-        dropout_rate = 1 - (len(active_client_ids) / len(self.active_clients))
+        dropout_rate = 1 - (len(leaf_client_ids) / len(self.active_clients))
         if dropout_rate > SECURE_AGG_CONFIG['dropout_threshold']:
             print(f"High dropout rate detected: {dropout_rate:.2%}")
             if not SECURE_AGG_CONFIG['enable_dropout_recovery']:
+                self.secure_aggregation.discard(server_round)
                 return None, {}
 
         # Validate yêu cầu của phase
-        phase_reqs = DATA_RANGES_INFO['phase_requirements'][self.mode]
-        if len(active_client_ids) < phase_reqs['min_clients']:
-            raise ValueError(
-                f"Phase {self.mode} requires minimum {phase_reqs['min_clients']} clients, "
-                f"but only {len(active_client_ids)} are active"
-            )
-        if len(active_client_ids) > phase_reqs['max_clients']:
-            raise ValueError(
-                f"Phase {self.mode} allows maximum {phase_reqs['max_clients']} clients, "
-                f"but {len(active_client_ids)} are active"
-            )
+        self._validate_phase(leaf_client_ids)
 
         if not results:
             return None, {}
 
-        # Thu thập masked updates
-        weights = []
-        num_examples = []
-        metrics = []
-        masked_updates = {}
+        aggregation_start = time.perf_counter()
+        aggregated, metrics = self.aggregate_updates(server_round, results, active_client_ids)
+        if aggregated is None:
+            return None, {}
 
-        for client_proxy, fit_res in results:
-            client_id = self.client_id_map.get(client_proxy.cid, 'unknown')
-            
-            # Lưu masked update từ client
-            masked_update = fl.common.parameters_to_ndarrays(fit_res.parameters)
-            masked_updates[client_id] = masked_update
-            
-            weights.append(masked_update)
-            num_examples.append(fit_res.num_examples)
-            metrics.append(fit_res.metrics)
-            
-            print(f"Client {client_id} metrics: {fit_res.metrics}")
+        aggregation_time = time.perf_counter() - aggregation_start
 
-        # Tính tổng số examples
-        total_examples = sum(num_examples)
-        if total_examples == 0:
-            return None, {}
+        round_metrics = {
+            'round': server_round,
+            'mode': self.mode,
+            'num_clients': len(results),
+            'client_metrics': metrics,
+            'active_clients': list(leaf_client_ids),
+            'dropout_rate': dropout_rate,
+            'timings': {
+                'aggregation_time': aggregation_time,
+            }
+        }
+        ROUND_FAILURES.inc(len(failures), mode=self.mode)
+        ROUND_PARTICIPANTS.set(len(results), mode=self.mode)
+
+        # Đánh giá, lưu models và ghi results trên snapshot `aggregated` (không bị sửa
+        # sau khi trả về); clients nhận weights mới ngay mà không đợi phần này
+        if FL_CONFIG['pipeline_rounds']:
+            wait_start = time.perf_counter()
+            self._wait_pipeline(FL_CONFIG['pipeline_depth'] - 1)
+            round_metrics['timings']['pipeline_wait'] = time.perf_counter() - wait_start
+            if self.round_start_time is not None:
+                # Thời gian tới khi weights mới sẵn sàng gửi cho round sau
+                round_metrics['timings']['dispatch_time'] = time.perf_counter() - self.round_start_time
+            self._pending_rounds.append(self._pipeline_executor().submit(
+                self._finish_round, server_round, aggregated, round_metrics, self.round_start_time
+            ))
+        else:
+            self._finish_round(server_round, aggregated, round_metrics, self.round_start_time)
 
-        # Tổng hợp masked updates sử dụng weighted average
-        aggregated_weights = [
-            np.sum(
-                [w[i] * n for w, n in zip(weights, num_examples)], 
-                axis=0
-            ) / total_examples
-            for i in range(len(weights[0]))
-        ]
+        # Chuẩn bị config cho round tiếp theo
+        next_round_config = {
+            'round_id': server_round + 1,
+            'active_clients': list(leaf_client_ids),
+            'dropout_threshold': SECURE_AGG_CONFIG['dropout_threshold'],
+            'secure_aggregation': True
+        }
+
+        return aggregated.to_parameters(), next_round_config
 
+    def _finish_round(self, server_round, aggregated, round_metrics, round_start_time):
+        """Phần sau aggregation của một round: cập nhật model, đánh giá, lưu models,
+        theo dõi best model và ghi results. Chạy tuần tự theo thứ tự round (trên
+        thread của pipeline khi `FL_CONFIG['pipeline_rounds']`), chỉ thread này dùng
+        `self.model` sau khi server bắt đầu."""
         # Update model toàn cục
-        self.model.set_weights(aggregated_weights)
+        self.model.set_weights(aggregated.to_ndarrays())
 
         # Đánh giá model mới
+        evaluation_start = time.perf_counter()
         test_loss, test_accuracy = self._evaluate_global_model()
+        evaluation_time = time.perf_counter() - evaluation_start
         print(f"Round {server_round} results - Loss: {test_loss}, Accuracy: {test_accuracy}")
 
         # Lưu kết quả round
-        round_metrics = {
-            'round': server_round,
-            'mode': self.mode,
-            'loss': float(test_loss),
-            'accuracy': float(test_accuracy),
-            'num_clients': len(results),
-            'client_metrics': metrics,
-            'active_clients': list(active_client_ids),
-            'dropout_rate': dropout_rate
-        }
+        round_metrics['loss'] = float(test_loss)
+        round_metrics['accuracy'] = float(test_accuracy)
+        round_metrics['timings']['evaluation_time'] = evaluation_time
         self.round_results.append(round_metrics)
 
-        # Kiểm tra và lưu best model
-        if test_accuracy > self.best_accuracy:
+        # Kiểm tra best model
+        is_best = test_accuracy > self.best_accuracy
+        if is_best:
             self.best_accuracy = test_accuracy
-            best_model_path = MODEL_TEMPLATES['best'].format(self.mode)
-            self.model.save(best_model_path)
-            print(f"Saved best model with accuracy {test_accuracy:.4f}")
 
-        # Lưu model của round hiện tại
-        current_model_path = MODEL_TEMPLATES['global'].format(server_round)
-        self.model.save(current_model_path)
+        # Lưu best model và model của round hiện tại
+        save_start = time.perf_counter()
+        self._save_round_models(server_round, is_best)
+        round_metrics['timings']['save_time'] = time.perf_counter() - save_start
+        if round_start_time is not None:
+            round_metrics['timings']['round_time'] = time.perf_counter() - round_start_time
+            ROUND_DURATION.observe(round_metrics['timings']['round_time'], mode=self.mode)
+        ROUNDS.inc(mode=self.mode)
+
+        # Ghi ngay kết quả round vào results log
+        self._log_round(round_metrics)
 
         # Kiểm tra nếu là round cuối
         if server_round == self.num_rounds:
             self._save_final_results()
 
-        # Key rotation check
-        need_key_rotation = (
-            SECURE_AGG_CONFIG['enable_key_rotation'] and 
-            server_round % SECURE_AGG_CONFIG['rotation_frequency'] == 0
-        )
+    def _pipeline_executor(self):
+        """Một worker duy nhất: các rounds được hoàn tất đúng thứ tự."""
+        if self._pipeline is None:
+            self._pipeline = ThreadPoolExecutor(max_workers=1, thread_name_prefix='round-pipeline')
+        return self._pipeline
+
+    def _wait_pipeline(self, max_pending=0):
+        """Đợi tới khi còn tối đa `max_pending` rounds đang chờ hoàn tất.
+
+        Lỗi của một round (vd. không lưu được model) được raise lại ở đây như khi
+        chạy tuần tự.
+        """
+        while len(self._pending_rounds) > max(0, max_pending):
+            self._pending_rounds.popleft().result()
+
+    def drain_pipeline(self):
+        """Đợi mọi rounds hoàn tất (gọi khi training kết thúc)."""
+        try:
+            self._wait_pipeline()
+        finally:
+            if self._pipeline is not None:
+                self._pipeline.shutdown(wait=True)
+                self._pipeline = None
+
+    def aggregate_updates(self, server_round, results, active_client_ids):
+        """Decode và tổng hợp updates của một round.
+
+        Trả về (ParameterVector weighted average, metrics của các clients), hoặc
+        (None, metrics) nếu không tổng hợp được.
+        """
+        # Thứ tự cộng cố định theo client ID (không theo thứ tự kết quả về tới server)
+        # để kết quả float giống hệt nhau giữa các lần chạy
+        results = sorted(results, key=_result_order)
+
+        # Thu thập masked updates (fixed point uint32 nếu round có secure aggregation)
+        secure = self.secure_aggregation.is_secure(server_round)
+        dtype = np.uint32 if secure else np.float32
+
+        # Updates gửi theo chunks: kéo về thẳng buffer phẳng; các updates khác decode
+        # thẳng vào buffer phẳng, song song theo client. Client không gửi đủ hoặc update
+        # không decode được coi như bị drop (secure aggregation khôi phục masks của nó
+        # như các dropout khác)
+        updates = self._fetch_transfers(server_round, results, dtype)
+        updates.update(self._decode_updates(
+            [(proxy, fit_res) for proxy, fit_res in results if proxy.cid not in updates], dtype
+        ))
+        failed = {cid for cid, vector in updates.items() if vector is None}
+        if failed:
+            results = [r for r in results if r[0].cid not in failed]
+            active_client_ids = active_client_ids - {self.client_id_map.get(cid) for cid in failed}
+            if not results:
+                return None, []
 
-        # Chuẩn bị config cho round tiếp theo
-        next_round_config = {
-            'round_id': server_round + 1,
-            'peer_pubkeys': self.client_pubkeys,
-            'need_key_rotation': need_key_rotation,
-            'active_clients': list(active_client_ids),
-            'dropout_threshold': SECURE_AGG_CONFIG['dropout_threshold'],
-            'secure_aggregation': True
+        num_examples = []
+        metrics = []
+        for client_proxy, fit_res in results:
+            client_id = self.client_id_map.get(client_proxy.cid, 'unknown')
+            BYTES_RECEIVED.inc(_parameters_nbytes(fit_res.parameters), component='server', stage='fit')
+            num_examples.append(fit_res.num_examples)
+            # Manifest của transfer (checksums dạng bytes) không đi vào results
+            metrics.append({k: v for k, v in fit_res.metrics.items() if not k.startswith('transfer_')})
+
+            print(f"Client {client_id} metrics: {metrics[-1]}")
+
+        vectors = [updates[proxy.cid] for proxy, _ in results]
+
+        # Tính tổng số examples
+        total_examples = sum(num_examples)
+        if total_examples == 0:
+            return None, metrics
+
+        if secure:
+            # Clients gửi num_examples * update + masks: tổng trong vành (đã trừ masks
+            # của các clients bị drop) chia cho tổng số examples là weighted average
+            return self._unmask_sum(server_round, vectors, active_client_ids, total_examples), metrics
+        # Một update NaN/Inf (client lỗi) làm hỏng cả model: bỏ qua trước khi tổng hợp
+        finite = finite_updates(vectors)
+        if not all(finite):
+            ignored = [m.get('client_id', 'unknown') for m, ok in zip(metrics, finite) if not ok]
+            print(f"Ignoring non-finite updates from clients: {ignored}")
+            vectors = [v for v, ok in zip(vectors, finite) if ok]
+            num_examples = [n for n, ok in zip(num_examples, finite) if ok]
+            if not vectors:
+                return None, metrics
+
+        # Weighted average (hoặc phương pháp robust) trên buffer phẳng
+        try:
+            aggregated, used = aggregate(vectors, num_examples)
+        except ValueError as e:
+            print(f"Aggregation failed: {e}")
+            return None, metrics
+        if len(used) < len(vectors):
+            print(f"{AGGREGATION_CONFIG['method']} selected {len(used)} of {len(vectors)} updates")
+        return aggregated, metrics
+
+    def _decode_updates(self, results, dtype):
+        """Decode updates gửi nguyên trong FitRes, song song theo client.
+
+        Trả về {proxy.cid: ParameterVector, hoặc None nếu không decode được}.
+        """
+        def decode(result):
+            proxy, fit_res = result
+            try:
+                return ParameterVector.from_parameters(fit_res.parameters, dtype=dtype)
+            except ValueError as e:
+                client_id = self.client_id_map.get(proxy.cid, fit_res.metrics.get('client_id', proxy.cid))
+                print(f"Ignoring update from client {client_id}: {e}")
+                return None
+
+        return {proxy.cid: vector for (proxy, _), vector in zip(results, parallel_map(decode, results))}
+
+    def _fetch_transfers(self, server_round, results, dtype):
+        """Kéo các updates được gửi theo chunks, song song theo client.
+
+        Trả về {proxy.cid: ParameterVector, hoặc None nếu không nhận đủ}.
+        """
+        pending = [(proxy, fit_res) for proxy, fit_res in results if 'transfer_id' in fit_res.metrics]
+        if not pending:
+            return {}
+        finder = ProxyFinder(self._client_manager, {proxy.cid for proxy, _ in results}) \
+            if self._client_manager is not None else None
+
+        def fetch(item):
+            proxy, fit_res = item
+            transfer_id = fit_res.metrics['transfer_id']
+            receiver = vector = None
+            try:
+                receiver = ChunkReceiver(fit_res.metrics, dtype)
+                current = receiver.fetch(
+                    proxy, server_round,
+                    reconnect=(lambda: finder.find(transfer_id, server_round)) if finder else None
+                )
+            except ValueError as e:
+                print(f"Transfer from client {self.client_id_map.get(proxy.cid, proxy.cid)} failed: {e}")
+            else:
+                release(current, transfer_id, server_round)
+                vector = receiver.vector
+            if receiver is not None:
+                BYTES_RECEIVED.inc(receiver.bytes_received, component='server', stage='fit')
+            return proxy.cid, vector
+
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            return dict(executor.map(fetch, pending))
+
+    def _unmask_sum(self, server_round, vectors, survivors, total_examples):
+        """Cộng các masked updates trong vành Z_2^32, trừ masks còn lại của các clients
+        bị drop rồi dequantize một lần."""
+        if not CryptoUtils.ring_capacity(total_examples):
+            print(f"Warning: {total_examples} examples may overflow the fixed-point ring; "
+                  f"lower SECURE_AGG_CONFIG['fixed_point_scale'] or 'clip_value'")
+        total = ParameterVector.ring_sum(vectors).buffer
+
+        if not SECURE_AGG_CONFIG['enable_dropout_recovery'] and (
+                self.secure_aggregation.rounds[server_round].client_ids - set(survivors)):
+            print("Clients dropped after key exchange and dropout recovery is disabled")
+            self.secure_aggregation.discard(server_round)
+            return None
+        try:
+            correction, dropped = self.secure_aggregation.unmask_correction(
+                server_round, sorted(survivors, key=int), total.size
+            )
+        except ValueError as e:
+            print(f"Dropout recovery failed: {e}")
+            return None
+        if dropped:
+            print(f"Recovered masks of {len(dropped)} dropped clients")
+            total -= correction
+        return ParameterVector(CryptoUtils.dequantize(total, total_examples), vectors[0].shapes)
+
+    def _validate_phase(self, active_client_ids):
+        """Kiểm tra số clients hoạt động theo yêu cầu của phase."""
+        phase_reqs = DATA_RANGES_INFO['phase_requirements'][self.mode]
+        if len(active_client_ids) < phase_reqs['min_clients']:
+            raise ValueError(
+                f"Phase {self.mode} requires minimum {phase_reqs['min_clients']} clients, "
+                f"but only {len(active_client_ids)} are active"
+            )
+        if len(active_client_ids) > phase_reqs['max_clients']:
+            raise ValueError(
+                f"Phase {self.mode} allows maximum {phase_reqs['max_clients']} clients, "
+                f"but {len(active_client_ids)} are active"
+            )
+
+    def _save_round_models(self, server_round, is_best):
+        """Lưu model của round hiện tại và best model nếu round này tốt nhất.
+
+        Weights store lưu theo content hash nên best model trùng với model của
+        round chỉ tốn thêm một manifest.
+        """
+        latest = self.round_results[-1]
+        metadata = {
+            'mode': self.mode,
+            'round': server_round,
+            'accuracy': latest['accuracy'],
+            'loss': latest['loss'],
         }
+        store_model(self.model, f'global_model_round_{server_round}', metadata)
+        if is_best:
+            store_model(self.model, f'best_{self.mode}_model', metadata)
+            print(f"Saved best model with accuracy {self.best_accuracy:.4f}")
+
+    def _results_log_path(self):
+        return os.path.join(MODEL_DIR, 'results', f'best_{self.mode}_model.jsonl')
 
-        return fl.common.ndarrays_to_parameters(aggregated_weights), next_round_config
+    def _log_round(self, round_metrics):
+        """Append record của round vào results log (bắt đầu log mới ở round đầu tiên)."""
+        if self.results_log is None:
+            self.results_log = ResultsLog(self._results_log_path())
+            self.results_log.start(mode=self.mode, num_rounds=getattr(self, 'num_rounds', None))
+        self.results_log.append('round', round_metrics)
 
     def _evaluate_global_model(self):
-        """Evaluate model on test data."""
-        _, (x_test, y_test) = tf.keras.datasets.mnist.load_data()
-        x_test = x_test.reshape(-1, 28, 28, 1) / 255.0
+        """Evaluate model on test data (test set memory-mapped dùng chung, không load lại MNIST)."""
+        _, _, x_test, y_test = load_dataset()
         return self.model.evaluate(x_test, y_test, verbose=0)
 
     def _save_final_results(self):
@@ -283,6 +569,15 @@ class FederatedServer(fl.server.strategy.FedAvg):
         with open(results_path, 'w') as f:
             json.dump(final_results, f, indent=4)
 
+        # Đóng results log bằng summary (lịch sử các round đã có trong log)
+        if self.results_log is not None:
+            summary = {k: v for k, v in final_results.items() if k != 'training_info'}
+            summary['training_info'] = {
+                k: v for k, v in final_results['training_info'].items()
+                if k != 'training_history'
+            }
+            self.results_log.append('summary', summary)
+
         # In tổng kết
         print(f"\nTraining Summary ({self.mode} mode):")
         print("=" * 50)
@@ -307,10 +602,11 @@ class FederatedServer(fl.server.strategy.FedAvg):
         print("=" * 50)
         print(f"Results saved to: {results_path}")
     def get_model_parameters(self):
-        """Get current model parameters."""
+        """Get current model parameters (của round cuối cùng đã hoàn tất)."""
         return self.model.get_weights()
 
-def start_server(mode, num_rounds=None, min_fit_clients=None, min_evaluate_clients=None):
+def start_server(mode, num_rounds=None, min_fit_clients=None, min_evaluate_clients=None,
+                 min_available_clients=None):
     """Start Flower server with specified configuration."""
     if num_rounds is None:
         num_rounds = FL_CONFIG['num_rounds'].get(mode, 3)
@@ -321,6 +617,9 @@ def start_server(mode, num_rounds=None, min_fit_clients=None, min_evaluate_clien
     if min_evaluate_clients is None:
         min_evaluate_clients = FL_CONFIG['min_evaluate_clients'].get(mode, 2)
 
+    if min_available_clients is None:
+        min_available_clients = FL_CONFIG['min_available_clients'].get(mode, min_fit_clients)
+
     # Print server configuration
     print("\nServer Configuration:")
     print("=" * 50)
@@ -337,14 +636,24 @@ def start_server(mode, num_rounds=None, min_fit_clients=None, min_evaluate_clien
         fraction_evaluate=FL_CONFIG['fraction_evaluate'],
         min_fit_clients=min_fit_clients,
         min_evaluate_clients=min_evaluate_clients,
-        min_available_clients=FL_CONFIG['min_available_clients'].get(mode, min_fit_clients)
+        min_available_clients=min_available_clients
     )
 
     strategy.num_rounds = num_rounds
+    start_metrics('server')
 
     # Start server
     fl.server.start_server(
         server_address="127.0.0.1:8080",
         config=fl.server.ServerConfig(num_rounds=num_rounds),
         strategy=strategy
-    )
\ No newline at end of file
+    )
+    strategy.drain_pipeline()
+
+    # Quantize best model để API serve bản int8 (chỉ publish nếu qua accuracy gate)
+    best_model = f'best_{mode}_model'
+    if QUANTIZATION_CONFIG['after_training'] and model_exists(best_model):
+        try:
+            quantize_and_publish(best_model)
+        except Exception as e:
+            print(f"Warning: quantization of {best_model} failed: {e}")
\ No newline at end of file
@@ -1,6 +1,9 @@
 import tensorflow as tf
 import os
-from ..utils.config import MODEL_CONFIG, MODEL_DIR, INITIAL_MODEL_PATH
+from ..utils.config import MODEL_CONFIG, MODEL_DIR, INITIAL_MODEL_PATH, WEIGHTS_STORE_CONFIG
+from ..utils.parameters import ParameterVector
+from ..utils.weights_store import get_weights_store, model_key
+from ..utils.model_index import get_model_index
 
 def create_model():
     """Create and return CNN model for MNIST."""
@@ -25,6 +28,48 @@ def compile_model(model):
     )
     return model
 
+def model_exists(name):
+    """Kiểm tra model có trong index (weights store hoặc file .keras cũ)."""
+    return name in get_model_index()
+
+def load_model(name):
+    """Load model theo tên qua weights store (fallback sang file .keras cũ).
+
+    Với weights store chỉ cần dựng kiến trúc từ `create_model()` và set weights
+    từ buffer memory-mapped, không phải giải nén và dựng lại Keras graph.
+    """
+    key = model_key(name)
+    store = get_weights_store()
+    if store.exists(key):
+        model = compile_model(create_model())
+        model.set_weights(store.get(key).to_ndarrays())
+        return model
+
+    path = os.path.join(MODEL_DIR, f'{key}.keras')
+    if os.path.exists(path):
+        return tf.keras.models.load_model(path)
+    raise ValueError(f"Model {name} does not exist")
+
+def store_model(model, name, metadata=None):
+    """Lưu weights của model vào weights store và cập nhật index, trả về content hash."""
+    vector = ParameterVector.from_ndarrays(model.get_weights())
+    store = get_weights_store()
+    digest = store.put(name, vector, metadata)
+    if WEIGHTS_STORE_CONFIG['export_keras']:
+        model.save(os.path.join(MODEL_DIR, f'{model_key(name)}.keras'))
+    get_model_index().record(
+        name, digest, vector.size, vector.nbytes, store.manifest_path(name), metadata
+    )
+    return digest
+
+def list_models():
+    """Danh sách models theo index (weights store và các file .keras cũ).
+
+    Mỗi phần tử là entry của index: `name` (dạng `<key>.keras` như API vẫn
+    dùng), `path`, `modified` (timestamp), round, mode, accuracy, loss, size, hash.
+    """
+    return [dict(entry, modified=entry['timestamp']) for entry in get_model_index().entries()]
+
 def load_model_for_mode(mode, round_number=None):
     """Load appropriate model based on training mode."""
     if mode == 'initial':
@@ -33,8 +78,8 @@ def load_model_for_mode(mode, round_number=None):
         model = compile_model(model)
     elif mode == 'additional':
         # For additional training, load initial model
-        if os.path.exists(INITIAL_MODEL_PATH):
-            model = tf.keras.models.load_model(INITIAL_MODEL_PATH)
+        if model_exists('initial_model'):
+            model = load_model('initial_model')
         else:
             raise ValueError("Initial model not found. Please run initial training first.")
     elif mode == 'test-only':
@@ -45,28 +90,28 @@ def load_model_for_mode(mode, round_number=None):
     
     return model
 
+def get_latest_model_name():
+    """Tên model được lưu gần nhất (đọc thẳng từ index)."""
+    latest = get_model_index().latest()
+    if latest is None:
+        raise ValueError("No models found in models directory")
+    return latest['name']
+
 def load_latest_model():
     """Load the latest available model from models directory."""
-    models = [f for f in os.listdir(MODEL_DIR) if f.endswith('.keras')]
-    if not models:
-        raise ValueError("No models found in models directory")
-    
-    # Sort models by creation time
-    models.sort(key=lambda x: os.path.getmtime(os.path.join(MODEL_DIR, x)))
-    latest_model = os.path.join(MODEL_DIR, models[-1])
-    return tf.keras.models.load_model(latest_model)
+    return load_model(get_latest_model_name())
 
 def save_model(model, mode, round_number=None):
     """Save model with appropriate naming based on mode."""
     if mode == 'initial':
-        path = INITIAL_MODEL_PATH
+        name = 'initial_model'
     elif mode == 'additional':
-        path = os.path.join(MODEL_DIR, f'additional_model_round_{round_number}.keras')
+        name = f'additional_model_round_{round_number}'
     elif mode == 'test-only':
-        path = os.path.join(MODEL_DIR, 'test_model.keras')
+        name = 'test_model'
     else:
         raise ValueError(f"Unknown mode: {mode}")
 
-    model.save(path)
-    print(f"Model saved to: {path}")
-    return path
\ No newline at end of file
+    digest = store_model(model, name, {'mode': mode, 'round': round_number})
+    print(f"Model saved to weights store: {name} ({digest[:12]})")
+    return name
@@ -0,0 +1,266 @@
+"""Post-training int8 quantization (TFLite) cho model được serve, có accuracy gate.
+
+`quantize_and_publish(name)` chuyển model sang các scheme trong
+`QUANTIZATION_CONFIG['schemes']` ('int8' full-integer với calibration set lấy từ
+train data của các client partitions, 'dynamic' dynamic-range), đo accuracy và
+latency trên test set so với model float32, rồi publish scheme đầu tiên đạt
+`max_accuracy_drop` vào `QUANTIZATION_CONFIG['dir']`:
+
+    <key>.tflite   artifact được serve
+    <key>.json     report (float, từng scheme, scheme được publish, hash của model gốc)
+
+API serve artifact thay cho model float khi `source_hash` khớp với model hiện tại
+trong index. Chạy tự động sau khi server train xong, hoặc theo yêu cầu:
+
+    python -m backend.federated_learning.quantization --model best_initial_model
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from ..utils.config import QUANTIZATION_CONFIG, RANDOM_SEED
+from ..utils.model_index import get_model_index
+from ..utils.weights_store import model_key
+from ..data.partition import get_partition, load_dataset
+
+SCHEMES = ('int8', 'dynamic')
+
+
+class TFLiteModel:
+    """Model TFLite với `predict`/`predict_on_batch` như Keras: ảnh float32 vào, xác suất ra.
+
+    Input/output int8 được quantize/dequantize theo tham số của tensor. Interpreter
+    không thread-safe nên mỗi lần gọi giữ lock của model.
+    """
+
+    def __init__(self, content, scheme=None, num_threads=None):
+        import tensorflow as tf
+
+        self.scheme = scheme
+        self.nbytes = len(content)
+        self.interpreter = tf.lite.Interpreter(
+            model_content=content,
+            num_threads=num_threads or QUANTIZATION_CONFIG['num_threads']
+        )
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        self._lock = threading.Lock()
+
+    def predict_on_batch(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        with self._lock:
+            if len(x) != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input['index'], list(x.shape))
+                self.interpreter.allocate_tensors()
+                self._batch_size = len(x)
+            self.interpreter.set_tensor(self._input['index'], _to_tensor(x, self._input))
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output['index'])
+        return _from_tensor(output, self._output)
+
+    def predict(self, x, batch_size=None, verbose=None):
+        return self.predict_on_batch(x)
+
+
+def _to_tensor(x, details):
+    if details['dtype'] == np.float32:
+        return x
+    scale, zero_point = details['quantization']
+    info = np.iinfo(details['dtype'])
+    return np.clip(np.rint(x / scale + zero_point), info.min, info.max).astype(details['dtype'])
+
+
+def _from_tensor(output, details):
+    if details['dtype'] == np.float32:
+        return output
+    scale, zero_point = details['quantization']
+    return (output.astype(np.float32) - zero_point) * np.float32(scale)
+
+
+def calibration_set(num_samples=None, seed=RANDOM_SEED):
+    """Mẫu ngẫu nhiên (float32) từ train data của tất cả client partitions."""
+    num_samples = num_samples or QUANTIZATION_CONFIG['calibration_samples']
+    partition = get_partition()
+    indices = np.unique(np.concatenate([
+        partition.indices['train'][cid] for cid in partition.client_ids
+    ]))
+    rng = np.random.default_rng(seed)
+    chosen = np.sort(rng.choice(indices, size=min(num_samples, len(indices)), replace=False))
+    x_train = load_dataset(partition.synthetic)[0]
+    return np.asarray(x_train[chosen], dtype=np.float32)
+
+
+def convert(model, scheme, calibration=None):
+    """Bytes TFLite của `model` theo `scheme` ('int8' cần calibration set)."""
+    import tensorflow as tf
+
+    if scheme not in SCHEMES:
+        raise ValueError(f"Unknown quantization scheme: {scheme} (expected one of {', '.join(SCHEMES)})")
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if scheme == 'int8':
+        if calibration is None:
+            calibration = calibration_set()
+        converter.representative_dataset = lambda: ([calibration[i:i + 1]] for i in range(len(calibration)))
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    return converter.convert()
+
+
+def measure(model, x, y):
+    """Accuracy/loss trên (x, y) và latency batch 1 (ms) của model Keras hoặc TFLite."""
+    from .flwr_client import evaluate_streaming
+
+    start = time.perf_counter()
+    report, _ = evaluate_streaming(model, x, y, batch_size=QUANTIZATION_CONFIG['eval_batch_size'])
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    for i in range(min(QUANTIZATION_CONFIG['latency_samples'], len(x))):
+        sample = np.asarray(x[i:i + 1], dtype=np.float32)
+        begin = time.perf_counter()
+        model.predict_on_batch(sample)
+        latencies.append((time.perf_counter() - begin) * 1000)
+    return {
+        'accuracy': report['accuracy'],
+        'loss': report['loss'],
+        'throughput': len(x) / elapsed if elapsed else None,
+        'latency_ms_p50': float(np.median(latencies)) if latencies else None,
+        'latency_ms_p95': float(np.percentile(latencies, 95)) if latencies else None,
+    }
+
+
+def _paths(model_name):
+    base = os.path.join(QUANTIZATION_CONFIG['dir'], model_key(model_name))
+    return f'{base}.tflite', f'{base}.json'
+
+
+def _write_atomic(path, data, mode='wb'):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def quantize_and_publish(model_name, schemes=None, max_accuracy_drop=None):
+    """Quantize model, so sánh với float32 và publish scheme đầu tiên qua accuracy gate.
+
+    Trả về report (cũng được ghi ra `<key>.json`); `report['published']` là None nếu
+    không scheme nào đạt (artifact cũ của model, nếu có, bị gỡ).
+    """
+    from .model import load_model
+
+    schemes = schemes or QUANTIZATION_CONFIG['schemes']
+    if max_accuracy_drop is None:
+        max_accuracy_drop = QUANTIZATION_CONFIG['max_accuracy_drop']
+    entry = get_model_index().get(model_name)
+    if entry is None:
+        raise ValueError(f"Model {model_name} does not exist")
+
+    model = load_model(model_name)
+    _, _, x_test, y_test = load_dataset()
+    float_result = measure(model, x_test, y_test)
+    float_result['size_bytes'] = entry.get('nbytes')
+
+    calibration = calibration_set() if 'int8' in schemes else None
+    results, artifacts = {}, {}
+    for scheme in schemes:
+        content = convert(model, scheme, calibration)
+        result = measure(TFLiteModel(content, scheme), x_test, y_test)
+        result['size_bytes'] = len(content)
+        result['accuracy_drop'] = float_result['accuracy'] - result['accuracy']
+        result['passed'] = result['accuracy_drop'] <= max_accuracy_drop
+        results[scheme] = result
+        artifacts[scheme] = content
+
+    published = next((scheme for scheme in schemes if results[scheme]['passed']), None)
+    report = {
+        'model': entry['name'],
+        'source_hash': entry['hash'],
+        'max_accuracy_drop': max_accuracy_drop,
+        'calibration_samples': 0 if calibration is None else len(calibration),
+        'float': float_result,
+        'schemes': results,
+        'published': published,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+    artifact_path, report_path = _paths(model_name)
+    os.makedirs(QUANTIZATION_CONFIG['dir'], exist_ok=True)
+    if published:
+        _write_atomic(artifact_path, artifacts[published])
+    elif os.path.exists(artifact_path):
+        os.remove(artifact_path)
+    _write_atomic(report_path, json.dumps(report, indent=4), mode='w')
+
+    print(f"\nQuantization of {entry['name']} (max accuracy drop {max_accuracy_drop:.2%}):")
+    print("=" * 50)
+    print(f"{'float32':>8}: accuracy {float_result['accuracy']:.4f}, "
+          f"p50 {float_result['latency_ms_p50']:.3f} ms")
+    for scheme, result in results.items():
+        print(f"{scheme:>8}: accuracy {result['accuracy']:.4f} ({-result['accuracy_drop']:+.4f}), "
+              f"p50 {result['latency_ms_p50']:.3f} ms, {result['size_bytes'] / 1024:.0f} KB, "
+              f"{'passed' if result['passed'] else 'rejected'}")
+    print(f"Published: {published or 'none (accuracy gate failed)'}")
+    print("=" * 50)
+    return report
+
+
+def published_version(model_name):
+    """mtime của report đã publish của model (None nếu chưa có), để cache biết khi nào load lại."""
+    _, report_path = _paths(model_name)
+    try:
+        return os.path.getmtime(report_path)
+    except OSError:
+        return None
+
+
+def load_published(model_name):
+    """TFLiteModel đã publish cho model, hoặc None nếu chưa có hoặc đã cũ (hash khác)."""
+    artifact_path, report_path = _paths(model_name)
+    entry = get_model_index().get(model_name)
+    if entry is None or not entry['hash'] or not os.path.exists(artifact_path):
+        return None
+    try:
+        with open(report_path, 'r') as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not report.get('published') or report.get('source_hash') != entry['hash']:
+        return None
+    with open(artifact_path, 'rb') as f:
+        return TFLiteModel(f.read(), report['published'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", type=str, default='best_initial_model',
+                        help="Model name in the index (default: best_initial_model)")
+    parser.add_argument("--schemes", nargs="+", choices=SCHEMES,
+                        default=QUANTIZATION_CONFIG['schemes'], help="Schemes in order of preference")
+    parser.add_argument("--max_accuracy_drop", type=float,
+                        default=QUANTIZATION_CONFIG['max_accuracy_drop'],
+                        help="Largest accepted accuracy drop versus the float32 model")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="Use random data with MNIST shapes instead of MNIST (offline)")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        from ..utils.config import DATA_CONFIG
+        DATA_CONFIG['synthetic'] = True
+    report = quantize_and_publish(args.model, args.schemes, args.max_accuracy_drop)
+    if report['published'] is None:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""Secure aggregation chịu được dropout: pairwise masks + Shamir secret sharing.
+
+Mỗi round gồm các bước (message nhỏ qua `get_properties` của Flower):
+
+1. advertise: mỗi client được chọn sinh key pair X25519 mới cho round và gửi public key.
+2. share: server gửi danh sách public keys; client chia private key của round thành
+   shares (ngưỡng t), mã hoá từng share cho một peer (AES-GCM, key từ X25519) và gửi
+   lại. Server chỉ giữ và chuyển tiếp, không đọc được shares.
+3. fit: client gửi `num_examples * update + Σ ±mask(u, v)` dưới dạng fixed point trong
+   vành Z_2^32 (uint32); masks triệt tiêu chính xác khi server cộng trong vành.
+4. unmask (chỉ khi có client bị drop sau bước 2): survivors giải mã và gửi shares
+   private key của các clients bị drop; server khôi phục key, sinh lại masks của các
+   cặp (drop, survivor) và trừ khỏi tổng thay vì bỏ cả round.
+
+Key chỉ dùng cho một round nên khôi phục key của client bị drop không làm lộ round
+khác. Giả định server honest-but-curious (kết quả đến muộn không được aggregate).
+"""
+import json
+import math
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from flwr.common import Code, GetPropertiesIns, GetPropertiesRes, Status
+
+from ..utils.config import SECURE_AGG_CONFIG
+from ..utils.crypto import CryptoUtils, PRIVATE_KEY_BYTES
+
+SHARE_INFO = b'secagg-share'
+
+
+def _share_context(server_round, owner, holder):
+    return f'{server_round}:{owner}:{holder}'.encode()
+
+
+def _mask_sign(cid, peer_id):
+    """Client có ID nhỏ hơn cộng mask của cặp, client còn lại trừ."""
+    return 1.0 if int(peer_id) > int(cid) else -1.0
+
+
+def share_threshold(num_clients):
+    threshold = math.ceil(num_clients * (1 - SECURE_AGG_CONFIG['dropout_threshold']))
+    return min(num_clients, max(SECURE_AGG_CONFIG['min_clients_for_unmasking'], threshold))
+
+
+# ---- Phía client ----
+
+class ClientKeyring:
+    """Keys theo (cid, round) của các clients trong process.
+
+    Giữ theo cid chứ không theo instance `MnistClient` vì simulation dùng lại một
+    client cho nhiều virtual clients.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rounds = {}
+
+    def _get(self, cid, server_round):
+        with self._lock:
+            keys = self._rounds.get((cid, server_round))
+        if keys is None:
+            raise ValueError(f"No secure aggregation keys for client {cid} in round {server_round}")
+        return keys
+
+    def advertise(self, cid, server_round):
+        private_key, public_key = CryptoUtils.generate_keypair()
+        with self._lock:
+            # Round mới: bỏ keys của các round cũ của client này
+            for key in [k for k in self._rounds if k[0] == cid and k[1] < server_round]:
+                del self._rounds[key]
+            self._rounds[(cid, server_round)] = {'private_key': private_key, 'peers': {}}
+        return {'client_id': cid, 'public_key': CryptoUtils.serialize_public_key(public_key)}
+
+    def share(self, cid, server_round, peers, threshold):
+        """Lưu public keys của peers và trả về shares (đã mã hoá) của private key."""
+        keys = self._get(cid, server_round)
+        keys['peers'] = {
+            peer_id: CryptoUtils.deserialize_public_key(pem.encode())
+            for peer_id, pem in peers.items()
+        }
+        order = sorted(keys['peers'], key=int)
+        secret = CryptoUtils.serialize_private_key(keys['private_key'])
+        shares = CryptoUtils.split_secret(secret, len(order), threshold)
+        encrypted = {}
+        for holder, share in zip(order, shares):
+            shared_key = CryptoUtils.generate_shared_key(
+                keys['private_key'], keys['peers'][holder], SHARE_INFO
+            )
+            encrypted[holder] = CryptoUtils.encrypt_share(
+                shared_key, share, _share_context(server_round, cid, holder)
+            ).hex()
+        return {'shares': json.dumps(encrypted)}
+
+    def unmask(self, cid, server_round, shares):
+        """Giải mã shares mà các clients bị drop đã gửi cho client này."""
+        keys = self._get(cid, server_round)
+        revealed = {}
+        for owner, ciphertext in shares.items():
+            shared_key = CryptoUtils.generate_shared_key(
+                keys['private_key'], keys['peers'][owner], SHARE_INFO
+            )
+            x, y = CryptoUtils.decrypt_share(
+                shared_key, bytes.fromhex(ciphertext), _share_context(server_round, owner, cid)
+            )
+            revealed[owner] = [x, format(y, 'x')]
+        return {'shares': json.dumps(revealed)}
+
+    def mask(self, cid, server_round, size):
+        """Tổng (trong vành uint32) các pairwise masks của client cho round."""
+        keys = self._get(cid, server_round)
+        total_mask = np.zeros(size, dtype=np.uint32)
+        for peer_id, peer_pubkey in keys['peers'].items():
+            if peer_id == cid:
+                continue
+            shared_key = CryptoUtils.generate_shared_key(keys['private_key'], peer_pubkey)
+            mask = CryptoUtils.generate_mask(shared_key, server_round, size)
+            if _mask_sign(cid, peer_id) > 0:
+                total_mask += mask
+            else:
+                total_mask -= mask
+        return total_mask
+
+    def discard(self, cid, server_round):
+        with self._lock:
+            self._rounds.pop((cid, server_round), None)
+
+
+_keyring = ClientKeyring()
+
+
+def get_keyring():
+    return _keyring
+
+
+def handle_properties(cid, ins):
+    """Xử lý một bước của protocol (`config['secagg_phase']`) cho client `cid`."""
+    config = ins.config
+    phase = config.get('secagg_phase')
+    server_round = int(config.get('secagg_round', 0))
+    try:
+        if phase == 'advertise':
+            properties = _keyring.advertise(cid, server_round)
+        elif phase == 'share':
+            properties = _keyring.share(
+                cid, server_round, json.loads(config['peers']), int(config['threshold'])
+            )
+        elif phase == 'unmask':
+            properties = _keyring.unmask(cid, server_round, json.loads(config['shares']))
+        else:
+            properties = {}
+    except Exception as e:
+        # Flower không có mã lỗi riêng cho get_properties; server coi như client không trả lời
+        # (và in message), traceback chỉ có ở đây nên in ra trước khi trả lỗi
+        print(f"Secure aggregation: {phase} failed for client {cid} in round {server_round}")
+        traceback.print_exc()
+        return GetPropertiesRes(
+            status=Status(code=Code.GET_PROPERTIES_NOT_IMPLEMENTED,
+                          message=f"{phase} failed: {type(e).__name__}: {e}"),
+            properties={}
+        )
+    return GetPropertiesRes(status=Status(code=Code.OK, message="Success"), properties=properties)
+
+
+# ---- Phía server ----
+
+class RoundSetup:
+    """Trạng thái secure aggregation của một round trên server."""
+
+    def __init__(self, server_round, public_keys, proxies, threshold):
+        self.round = server_round
+        self.public_keys = public_keys  # client_id -> PEM
+        self.proxies = proxies  # client_id -> ClientProxy
+        self.client_ids_by_proxy = {proxy.cid: client_id for client_id, proxy in proxies.items()}
+        self.threshold = threshold
+        self.shares = {}  # owner -> {holder: ciphertext hex}
+
+    @property
+    def client_ids(self):
+        return set(self.public_keys)
+
+
+class SecureAggregationCoordinator:
+    """Điều phối các bước advertise/share trước fit và unmask khi có dropout."""
+
+    def __init__(self):
+        self.rounds = {}
+
+    def _exchange(self, proxies, config, timeout, group_id):
+        """Gửi `config` cho các clients song song; trả về {proxy.cid: properties} của các client trả lời."""
+        def call(proxy):
+            try:
+                res = proxy.get_properties(
+                    GetPropertiesIns(config=config(proxy)), timeout=timeout, group_id=group_id
+                )
+            except Exception as e:
+                print(f"Secure aggregation: client {proxy.cid} failed ({e})")
+                return proxy.cid, None
+            if res.status.code != Code.OK:
+                print(f"Secure aggregation: client {proxy.cid} failed ({res.status.message})")
+                return proxy.cid, None
+            return proxy.cid, res.properties
+
+        with ThreadPoolExecutor(max_workers=max(1, len(proxies))) as executor:
+            replies = executor.map(call, proxies)
+            return {cid: properties for cid, properties in replies if properties is not None}
+
+    def setup(self, server_round, instructions):
+        """Advertise + share keys cho các clients được chọn.
+
+        Trả về các instructions của clients hoàn tất setup (rỗng nếu không đủ clients).
+        """
+        # Bỏ setup của các round trước (đã aggregate hoặc bị huỷ)
+        for stale in [r for r in self.rounds if r < server_round]:
+            del self.rounds[stale]
+        timeout = SECURE_AGG_CONFIG['key_exchange_timeout']
+        min_clients = SECURE_AGG_CONFIG['min_clients_for_unmasking']
+
+        proxies = [proxy for proxy, _ in instructions]
+        advertised = self._exchange(
+            proxies,
+            lambda proxy: {'secagg_phase': 'advertise', 'secagg_round': server_round},
+            timeout, server_round
+        )
+        by_cid = {proxy.cid: proxy for proxy in proxies}
+        public_keys, committed = {}, {}
+        for proxy_cid, properties in advertised.items():
+            client_id = str(properties['client_id'])
+            public_keys[client_id] = properties['public_key'].decode()
+            committed[client_id] = by_cid[proxy_cid]
+        if len(public_keys) < min_clients:
+            print(f"Secure aggregation: only {len(public_keys)} clients advertised keys, "
+                  f"need at least {min_clients}")
+            return []
+
+        while True:
+            setup = RoundSetup(server_round, public_keys, committed, share_threshold(len(public_keys)))
+            peers = json.dumps(public_keys)
+            shared = self._exchange(
+                list(committed.values()),
+                lambda proxy: {
+                    'secagg_phase': 'share', 'secagg_round': server_round,
+                    'peers': peers, 'threshold': setup.threshold,
+                },
+                timeout, server_round
+            )
+            for proxy_cid, properties in shared.items():
+                setup.shares[setup.client_ids_by_proxy[proxy_cid]] = json.loads(properties['shares'])
+            if len(setup.shares) == len(public_keys):
+                break
+            # Không ai giữ shares của client không trả lời: chia lại trên tập còn lại
+            public_keys = {cid: public_keys[cid] for cid in setup.shares}
+            committed = {cid: committed[cid] for cid in setup.shares}
+            if len(public_keys) < min_clients:
+                print(f"Secure aggregation: only {len(public_keys)} clients shared keys, "
+                      f"need at least {min_clients}")
+                return []
+
+        self.rounds[server_round] = setup
+        print(f"Secure aggregation round {server_round}: {len(public_keys)} clients, "
+              f"threshold {setup.threshold}")
+        return [(proxy, ins) for proxy, ins in instructions if proxy.cid in setup.client_ids_by_proxy]
+
+    def unmask_correction(self, server_round, survivors, size):
+        """Tổng masks còn lại trong aggregate do các clients trong `dropped` không gửi update.
+
+        `survivors` là các client_id có update trong aggregate. Trả về (correction, dropped);
+        aggregate đúng = tổng masked updates - correction.
+        """
+        setup = self.rounds.pop(server_round)
+        dropped = sorted(setup.client_ids - set(survivors), key=int)
+        correction = np.zeros(size, dtype=np.uint32)
+        if not dropped:
+            return correction, dropped
+
+        print(f"Recovering masks of dropped clients {dropped} from {len(survivors)} survivors")
+        replies = self._exchange(
+            [setup.proxies[client_id] for client_id in survivors],
+            lambda proxy: {
+                'secagg_phase': 'unmask', 'secagg_round': server_round,
+                'shares': json.dumps({
+                    owner: setup.shares[owner][setup.client_ids_by_proxy[proxy.cid]]
+                    for owner in dropped
+                }),
+            },
+            SECURE_AGG_CONFIG['masking_timeout'], server_round
+        )
+        collected = {owner: [] for owner in dropped}
+        for properties in replies.values():
+            for owner, (x, y) in json.loads(properties['shares']).items():
+                collected[owner].append((int(x), int(y, 16)))
+
+        for owner in dropped:
+            shares = collected[owner]
+            if len(shares) < setup.threshold:
+                raise ValueError(
+                    f"Cannot recover client {owner}: {len(shares)} shares, "
+                    f"threshold {setup.threshold}"
+                )
+            private_key = CryptoUtils.deserialize_private_key(
+                CryptoUtils.combine_shares(shares[:setup.threshold], PRIVATE_KEY_BYTES)
+            )
+            expected = CryptoUtils.serialize_public_key(private_key.public_key()).decode()
+            if expected != setup.public_keys[owner]:
+                raise ValueError(f"Recovered key of client {owner} does not match its public key")
+
+            # Mỗi survivor đã cộng (hoặc trừ) mask của cặp với client bị drop
+            for survivor in survivors:
+                peer_pubkey = CryptoUtils.deserialize_public_key(setup.public_keys[survivor].encode())
+                mask = CryptoUtils.generate_mask(
+                    CryptoUtils.generate_shared_key(private_key, peer_pubkey), server_round, size
+                )
+                if _mask_sign(survivor, owner) > 0:
+                    correction += mask
+                else:
+                    correction -= mask
+        return correction, dropped
+
+    def is_secure(self, server_round):
+        return server_round in self.rounds
+
+    def discard(self, server_round):
+        self.rounds.pop(server_round, None)
@@ -0,0 +1,314 @@
+import os
+import json
+import functools
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import flwr as fl
+import numpy as np
+from flwr.common import DisconnectRes
+from flwr.server.client_proxy import ClientProxy
+
+from .flwr_client import MnistClient
+from .flwr_server import FederatedServer
+from .secure_aggregation import handle_properties
+from .transfer import handle_transfer, is_transfer_request
+from .model import create_model, compile_model
+from ..utils.config import FL_CONFIG, SECURE_AGG_CONFIG, SIMULATION_CONFIG, TEST_CONFIG
+from ..data.partition import get_partition, load_dataset
+
+
+def load_shared_dataset(synthetic=False):
+    """Dataset memory-mapped dùng chung cho mọi virtual client (xem `load_dataset`).
+
+    Dữ liệu chỉ nằm một lần trong page cache dù có hàng trăm clients.
+    """
+    return load_dataset(synthetic)
+
+
+def partition_dataset(dataset, num_clients, synthetic=False):
+    """Chia dataset cho `num_clients` clients bằng partitioner dùng chung.
+
+    Chỉ giữ index arrays; dữ liệu của một client được gom khi client đó chạy.
+    """
+    partition = get_partition(
+        scheme=SIMULATION_CONFIG['partition'], num_clients=num_clients, synthetic=synthetic
+    )
+    return {
+        cid: functools.partial(partition.client_data, cid, dataset)
+        for cid in partition.client_ids
+    }
+
+
+class ClientPool:
+    """Pool các `MnistClient` được tái sử dụng bởi các virtual clients.
+
+    Mỗi client trong pool giữ một Keras model đã compile; số client thực sự được
+    tạo chỉ bằng số worker chạy đồng thời, không phải số virtual clients.
+    """
+
+    def __init__(self):
+        self._idle = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self.size = 0
+
+    @contextmanager
+    def acquire(self, cid, partition):
+        try:
+            client = self._idle.get_nowait()
+            client.cid = str(cid)
+            client.set_data(*partition())
+        except queue.Empty:
+            # Tạo Keras model từ nhiều thread cùng lúc không an toàn
+            with self._lock:
+                client = MnistClient(cid, data=partition())
+                self.size += 1
+        try:
+            yield client
+        finally:
+            self._idle.put(client)
+
+
+class VirtualClientProxy(ClientProxy):
+    """ClientProxy chạy `MnistClient` in-process, có thể thêm latency (fit và evaluate)
+    và dropout (chỉ fit)."""
+
+    def __init__(self, cid, partition, pool, latency=0.0, latency_jitter=0.0,
+                 dropout_rate=0.0, seed=None):
+        super().__init__(cid)
+        self.partition = partition
+        self.pool = pool
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.dropout_rate = dropout_rate
+        self.rng = random.Random(seed)
+
+    def _inject_faults(self, dropout):
+        delay = self.latency + self.rng.uniform(0, self.latency_jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if dropout and self.rng.random() < self.dropout_rate:
+            raise ConnectionError(f"Injected dropout for client {self.cid}")
+
+    def get_properties(self, ins, timeout, group_id):
+        # Chunks của update, key exchange / unmask: không cần model hay dữ liệu của client
+        if is_transfer_request(ins):
+            return handle_transfer(self.cid, ins)
+        return handle_properties(self.cid, ins)
+
+    def get_parameters(self, ins, timeout, group_id):
+        with self.pool.acquire(self.cid, self.partition) as client:
+            return client.to_client().get_parameters(ins)
+
+    def fit(self, ins, timeout, group_id):
+        self._inject_faults(dropout=True)
+        with self.pool.acquire(self.cid, self.partition) as client:
+            return client.to_client().fit(ins)
+
+    def evaluate(self, ins, timeout, group_id):
+        self._inject_faults(dropout=False)
+        with self.pool.acquire(self.cid, self.partition) as client:
+            return client.to_client().evaluate(ins)
+
+    def reconnect(self, ins, timeout, group_id):
+        return DisconnectRes(reason='')
+
+
+class SimulationServer(FederatedServer):
+    """FederatedServer cho simulation: không ghi model ra `MODEL_DIR`,
+    đánh giá trên test set dùng chung và ghi lại thời gian từng round."""
+
+    def __init__(self, x_test, y_test, *args, **kwargs):
+        self.x_test = x_test
+        self.y_test = y_test
+        self.round_started = []
+        self.round_stats = []
+        super().__init__(*args, **kwargs)
+
+    def _create_global_model(self, mode):
+        return compile_model(create_model())
+
+    def _validate_phase(self, active_client_ids):
+        # Simulation không bị giới hạn bởi số clients của các phase
+        pass
+
+    def _save_round_models(self, server_round, is_best):
+        pass
+
+    def _save_final_results(self):
+        pass
+
+    def _log_round(self, round_metrics):
+        pass
+
+    def _evaluate_global_model(self):
+        return self.model.evaluate(
+            self.x_test, self.y_test,
+            batch_size=TEST_CONFIG['batch_size'],
+            verbose=0
+        )
+
+    def configure_fit(self, server_round, parameters, client_manager):
+        self.round_started.append(time.perf_counter())
+        return super().configure_fit(server_round, parameters, client_manager)
+
+    def aggregate_fit(self, server_round, results, failures):
+        start = time.perf_counter()
+        aggregated = super().aggregate_fit(server_round, results, failures)
+        self.round_stats.append({
+            'round': server_round,
+            'results': len(results),
+            'failures': len(failures),
+            'num_examples': sum(fit_res.num_examples for _, fit_res in results),
+            'aggregation_time': time.perf_counter() - start,
+        })
+        return aggregated
+
+
+def _summarize(strategy, end_time, target_accuracy):
+    """Tính round latency, throughput và time-to-accuracy từ các mốc thời gian."""
+    starts = strategy.round_started
+    ends = starts[1:] + [end_time]
+    accuracy_by_round = {r['round']: r for r in strategy.round_results}
+
+    rounds = []
+    time_to_accuracy = None
+    for stats, start, end in zip(strategy.round_stats, starts, ends):
+        result = accuracy_by_round.get(stats['round'], {})
+        accuracy = result.get('accuracy')
+        rounds.append({
+            **stats,
+            'latency': end - start,
+            'elapsed': end - starts[0],
+            'accuracy': accuracy,
+            'loss': result.get('loss'),
+        })
+        if time_to_accuracy is None and accuracy is not None and accuracy >= target_accuracy:
+            time_to_accuracy = end - starts[0]
+
+    total_time = end_time - starts[0] if starts else 0.0
+    latencies = np.array([r['latency'] for r in rounds]) if rounds else np.zeros(1)
+    total_updates = sum(r['results'] for r in rounds)
+    total_examples = sum(r['num_examples'] for r in rounds)
+    return {
+        'total_time': total_time,
+        'throughput': {
+            'client_updates_per_sec': total_updates / total_time if total_time else 0.0,
+            'examples_per_sec': total_examples / total_time if total_time else 0.0,
+        },
+        'round_latency': {
+            'mean': float(latencies.mean()),
+            'p50': float(np.percentile(latencies, 50)),
+            'p95': float(np.percentile(latencies, 95)),
+            'max': float(latencies.max()),
+        },
+        'target_accuracy': target_accuracy,
+        'time_to_accuracy': time_to_accuracy,
+        'final_accuracy': rounds[-1]['accuracy'] if rounds else None,
+        'rounds': rounds,
+    }
+
+
+def run_simulation(num_clients=None, num_rounds=None, max_workers=None, latency=None,
+                   latency_jitter=None, dropout_rate=None, target_accuracy=None,
+                   synthetic=False):
+    """Chạy FederatedServer và N virtual clients trong cùng một process."""
+    cfg = SIMULATION_CONFIG
+    num_clients = num_clients or cfg['num_clients']
+    num_rounds = num_rounds or cfg['num_rounds']
+    max_workers = max_workers or cfg['max_workers'] or os.cpu_count() or 1
+    latency = cfg['latency'] if latency is None else latency
+    latency_jitter = cfg['latency_jitter'] if latency_jitter is None else latency_jitter
+    dropout_rate = cfg['dropout_rate'] if dropout_rate is None else dropout_rate
+    target_accuracy = cfg['target_accuracy'] if target_accuracy is None else target_accuracy
+
+    if num_clients < SECURE_AGG_CONFIG['min_clients_for_unmasking']:
+        raise ValueError(
+            f"Simulation needs at least {SECURE_AGG_CONFIG['min_clients_for_unmasking']} clients"
+        )
+
+    print("\nSimulation Configuration:")
+    print("=" * 50)
+    print(f"Virtual clients: {num_clients}")
+    print(f"Number of rounds: {num_rounds}")
+    print(f"Workers: {max_workers}")
+    print(f"Injected latency: {latency}s (+ up to {latency_jitter}s jitter)")
+    print(f"Dropout rate: {dropout_rate}")
+    print(f"Data: {'synthetic' if synthetic else 'MNIST'}")
+    print("=" * 50)
+
+    dataset = load_shared_dataset(synthetic=synthetic)
+    partitions = partition_dataset(dataset, num_clients, synthetic=synthetic)
+
+    min_clients = min(num_clients, FL_CONFIG['min_fit_clients']['initial'])
+    strategy = SimulationServer(
+        dataset[2], dataset[3],
+        mode='initial',
+        fraction_fit=FL_CONFIG['fraction_fit'],
+        fraction_evaluate=FL_CONFIG['fraction_evaluate'],
+        min_fit_clients=min_clients,
+        min_evaluate_clients=min_clients,
+        min_available_clients=num_clients,
+        on_fit_config_fn=lambda server_round: {'round_id': server_round, 'verbose': 0},
+        on_evaluate_config_fn=lambda server_round: {'verbose': 0},
+    )
+    strategy.num_rounds = num_rounds
+
+    pool = ClientPool()
+    client_manager = fl.server.SimpleClientManager()
+    for cid, partition in partitions.items():
+        client_manager.register(VirtualClientProxy(
+            cid, partition, pool,
+            latency=latency,
+            latency_jitter=latency_jitter,
+            dropout_rate=dropout_rate,
+            seed=cfg['seed'] + int(cid),
+        ))
+
+    server = fl.server.Server(client_manager=client_manager, strategy=strategy)
+    server.set_max_workers(max_workers)
+    server.fit(num_rounds=num_rounds, timeout=None)
+    strategy.drain_pipeline()
+    end_time = time.perf_counter()
+
+    report = {
+        'num_clients': num_clients,
+        'num_rounds': num_rounds,
+        'max_workers': max_workers,
+        'pooled_models': pool.size,
+        'latency': latency,
+        'latency_jitter': latency_jitter,
+        'dropout_rate': dropout_rate,
+        'synthetic': synthetic,
+        **_summarize(strategy, end_time, target_accuracy),
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+    os.makedirs(cfg['results_dir'], exist_ok=True)
+    report_path = os.path.join(
+        cfg['results_dir'],
+        f"simulation_{num_clients}c_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=4)
+
+    print("\nSimulation Summary:")
+    print("=" * 50)
+    print(f"Total time: {report['total_time']:.2f}s")
+    print(f"Throughput: {report['throughput']['client_updates_per_sec']:.2f} updates/s, "
+          f"{report['throughput']['examples_per_sec']:.0f} examples/s")
+    print(f"Round latency: mean {report['round_latency']['mean']:.2f}s, "
+          f"p95 {report['round_latency']['p95']:.2f}s")
+    if report['time_to_accuracy'] is not None:
+        print(f"Time to {target_accuracy:.2%} accuracy: {report['time_to_accuracy']:.2f}s")
+    else:
+        print(f"Target accuracy {target_accuracy:.2%} not reached")
+    print(f"Final accuracy: {report['final_accuracy']}")
+    print("=" * 50)
+    print(f"Report saved to: {report_path}")
+
+    return report
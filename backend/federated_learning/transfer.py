@@ -0,0 +1,327 @@
+"""Truyền updates lớn theo chunks có checksum, tiếp tục được sau khi mất kết nối.
+
+Flower gửi cả update trong một FitRes: mất kết nối giữa chừng là mất cả round của
+client, và model lớn chạm giới hạn kích thước message của gRPC. Khi server bật
+(config `transfer_chunk_bytes` trong fit) và update lớn hơn một chunk:
+
+1. client giữ update trong process (`UploadStore`) và FitRes chỉ mang manifest trong
+   metrics: `transfer_id`, `transfer_nbytes`, `transfer_chunk_bytes`, `transfer_dtype`,
+   `transfer_shapes` (JSON) và `transfer_checksums` (blake2b 8 bytes mỗi chunk).
+2. server kéo từng chunk qua `get_properties` (như các bước của secure aggregation),
+   kiểm tra checksum theo manifest và ghi thẳng vào buffer của `ParameterVector` sẽ
+   được tổng hợp. Chunk đã ghi là đã xác nhận; chunk hỏng hoặc timeout được hỏi lại.
+3. client mất kết nối thì tự kết nối lại (`connect`) và vẫn giữ update; server tìm
+   proxy mới có `transfer_id` đó và chỉ kéo các chunks còn thiếu.
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+import grpc
+import numpy as np
+import flwr as fl
+from flwr.common import Code, GetPropertiesIns, GetPropertiesRes, Parameters, Status
+
+from ..utils.config import TRANSFER_CONFIG
+from ..utils.metrics import get_registry
+from ..utils.parameters import ParameterVector
+
+CHECKSUM_BYTES = 8
+
+_metrics = get_registry()
+CHUNKS = _metrics.counter('fl_transfer_chunks_total', 'Update chunks requested by the server')
+
+
+def chunk_checksum(data):
+    return hashlib.blake2b(data, digest_size=CHECKSUM_BYTES).digest()
+
+
+def _num_chunks(nbytes, chunk_bytes):
+    return max(1, -(-nbytes // chunk_bytes))
+
+
+# ---- Phía client ----
+
+class Upload:
+    def __init__(self, cid, payload, chunk_bytes):
+        self.cid = cid
+        self.payload = payload
+        self.chunk_bytes = chunk_bytes
+
+    def chunk(self, index):
+        if not 0 <= index < _num_chunks(len(self.payload), self.chunk_bytes):
+            raise ValueError(f"Chunk {index} out of range")
+        start = index * self.chunk_bytes
+        return self.payload[start:start + self.chunk_bytes]
+
+
+class UploadStore:
+    """Updates đang chờ server kéo, theo transfer ID, của các clients trong process.
+
+    Giữ theo cid (như keyring của secure aggregation) nên không mất khi client kết nối
+    lại; mỗi cid giữ tối đa `TRANSFER_CONFIG['keep_uploads']` updates gần nhất.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._uploads = {}
+
+    def publish(self, cid, arrays, chunk_bytes):
+        """Giữ update (list ndarray cùng dtype) và trả về manifest cho metrics của FitRes."""
+        # Copy một lần: buffer của client được dùng lại ở round sau (view uint8 phẳng
+        # thay cho memoryview.cast, vốn không nhận layer rỗng)
+        payload = b''.join(np.ascontiguousarray(a).reshape(-1).view(np.uint8) for a in arrays)
+        view = memoryview(payload)
+        checksums = b''.join(
+            chunk_checksum(view[start:start + chunk_bytes])
+            for start in range(0, max(1, len(payload)), chunk_bytes)
+        )
+        transfer_id = f'{cid}-{uuid.uuid4().hex[:12]}'
+        with self._lock:
+            self._uploads[transfer_id] = Upload(cid, payload, chunk_bytes)
+            own = [tid for tid, upload in self._uploads.items() if upload.cid == cid]
+            for stale in own[:-TRANSFER_CONFIG['keep_uploads']]:
+                del self._uploads[stale]
+        return {
+            'transfer_id': transfer_id,
+            'transfer_nbytes': len(payload),
+            'transfer_chunk_bytes': chunk_bytes,
+            'transfer_dtype': np.dtype(arrays[0].dtype).str,
+            'transfer_shapes': json.dumps([list(a.shape) for a in arrays]),
+            'transfer_checksums': checksums,
+        }
+
+    def get(self, cid, transfer_id):
+        with self._lock:
+            upload = self._uploads.get(transfer_id)
+        if upload is None or upload.cid != cid:
+            return None
+        return upload
+
+    def release(self, cid, transfer_id):
+        with self._lock:
+            upload = self._uploads.get(transfer_id)
+            if upload is not None and upload.cid == cid:
+                del self._uploads[transfer_id]
+
+
+_store = UploadStore()
+
+
+def get_upload_store():
+    return _store
+
+
+def publish_update(cid, arrays, config):
+    """Manifest nếu update được gửi theo chunks (server bật và update lớn hơn một
+    chunk), None nếu gửi nguyên trong FitRes như bình thường."""
+    chunk_bytes = int(config.get('transfer_chunk_bytes', 0))
+    if not chunk_bytes or sum(a.nbytes for a in arrays) <= chunk_bytes:
+        return None
+    return _store.publish(cid, arrays, chunk_bytes)
+
+
+def empty_parameters():
+    """Parameters của FitRes khi update được gửi theo chunks."""
+    return Parameters(tensors=[], tensor_type=ParameterVector.TENSOR_TYPE)
+
+
+def is_transfer_request(ins):
+    return 'transfer_id' in ins.config
+
+
+def handle_transfer(cid, ins):
+    """Trả lời request của server: một chunk, kiểm tra còn giữ update, hoặc giải phóng."""
+    config = ins.config
+    transfer_id = config['transfer_id']
+    try:
+        if 'transfer_chunk' in config:
+            upload = _store.get(cid, transfer_id)
+            if upload is None:
+                raise ValueError(f"Unknown transfer {transfer_id}")
+            properties = {'data': upload.chunk(int(config['transfer_chunk']))}
+        elif config.get('transfer_done'):
+            _store.release(cid, transfer_id)
+            properties = {}
+        else:
+            properties = {'client_id': cid, 'available': _store.get(cid, transfer_id) is not None}
+    except Exception as e:
+        return GetPropertiesRes(
+            status=Status(code=Code.GET_PROPERTIES_NOT_IMPLEMENTED, message=f"transfer failed: {e}"),
+            properties={}
+        )
+    return GetPropertiesRes(status=Status(code=Code.OK, message="Success"), properties=properties)
+
+
+def connect(server_address, client):
+    """`fl.client.start_client`, kết nối lại khi mất kết nối để server kéo tiếp update
+    client đang giữ (tối đa `TRANSFER_CONFIG['client_reconnects']` lần liên tiếp)."""
+    attempts = 0
+    while True:
+        started = time.monotonic()
+        try:
+            fl.client.start_client(server_address=server_address, client=client)
+            return
+        except grpc.RpcError as e:
+            # Kết nối đã chạy một lúc rồi mới mất: bắt đầu đếm lại
+            if time.monotonic() - started > TRANSFER_CONFIG['reconnect_timeout']:
+                attempts = 0
+            attempts += 1
+            if attempts > TRANSFER_CONFIG['client_reconnects']:
+                raise
+            print(f"Connection to {server_address} lost ({e.code()}), reconnecting "
+                  f"({attempts}/{TRANSFER_CONFIG['client_reconnects']})...")
+            time.sleep(TRANSFER_CONFIG['client_reconnect_delay'])
+
+
+# ---- Phía server ----
+
+class ChunkReceiver:
+    """Nhận một update theo chunks thẳng vào buffer của `vector`.
+
+    `received` đánh dấu các chunks đã kiểm tra checksum và ghi xong; mỗi lần `fetch`
+    chỉ kéo các chunks còn thiếu. `bytes_received` tính cả chunks hỏng bị bỏ.
+    """
+
+    def __init__(self, manifest, dtype=None):
+        self.transfer_id = manifest['transfer_id']
+        self.nbytes = int(manifest['transfer_nbytes'])
+        self.chunk_bytes = int(manifest['transfer_chunk_bytes'])
+        self.checksums = manifest['transfer_checksums']
+        manifest_dtype = np.dtype(manifest['transfer_dtype'])
+        if dtype is not None and manifest_dtype != np.dtype(dtype):
+            raise ValueError(f"Transfer {self.transfer_id} has dtype {manifest_dtype}, expected {np.dtype(dtype)}")
+
+        self.vector = ParameterVector.zeros(json.loads(manifest['transfer_shapes']), manifest_dtype)
+        if self.vector.nbytes != self.nbytes:
+            raise ValueError(f"Transfer {self.transfer_id}: {self.nbytes} bytes do not match the layer shapes")
+        self.num_chunks = _num_chunks(self.nbytes, self.chunk_bytes)
+        if len(self.checksums) != self.num_chunks * CHECKSUM_BYTES:
+            raise ValueError(f"Transfer {self.transfer_id}: expected {self.num_chunks} checksums")
+        self._bytes = self.vector.buffer.view(np.uint8)
+        self.received = np.zeros(self.num_chunks, dtype=bool)
+        self.bytes_received = 0
+
+    @property
+    def missing(self):
+        return np.flatnonzero(~self.received)
+
+    @property
+    def complete(self):
+        return bool(self.received.all())
+
+    def accept(self, index, data):
+        """Ghi chunk nếu đúng kích thước và checksum; False nếu chunk hỏng."""
+        self.bytes_received += len(data)
+        start = index * self.chunk_bytes
+        stop = min(start + self.chunk_bytes, self.nbytes)
+        expected = self.checksums[index * CHECKSUM_BYTES:(index + 1) * CHECKSUM_BYTES]
+        if len(data) != stop - start or chunk_checksum(data) != expected:
+            return False
+        self._bytes[start:stop] = np.frombuffer(data, dtype=np.uint8)
+        self.received[index] = True
+        return True
+
+    def _request(self, proxy, index, group_id):
+        try:
+            res = proxy.get_properties(
+                GetPropertiesIns(config={'transfer_id': self.transfer_id, 'transfer_chunk': int(index)}),
+                timeout=TRANSFER_CONFIG['chunk_timeout'], group_id=group_id
+            )
+        except Exception:
+            return False
+        return res.status.code == Code.OK and self.accept(index, res.properties.get('data', b''))
+
+    def fetch(self, proxy, group_id=None, reconnect=None):
+        """Kéo các chunks còn thiếu từ `proxy`, trả về proxy cuối cùng đã dùng.
+
+        Sau `max_retries` lần lỗi liên tiếp, `reconnect()` được gọi để lấy proxy mới
+        của cùng client (None = bỏ cuộc). Raise ValueError nếu không nhận đủ.
+        """
+        failures = reconnects = 0
+        while not self.complete:
+            index = int(self.missing[0])
+            if self._request(proxy, index, group_id):
+                CHUNKS.inc(result='ok')
+                failures = 0
+                continue
+            CHUNKS.inc(result='retry')
+            failures += 1
+            if failures <= TRANSFER_CONFIG['max_retries']:
+                time.sleep(TRANSFER_CONFIG['retry_backoff'] * failures)
+                continue
+            new_proxy = reconnect() if reconnect and reconnects < TRANSFER_CONFIG['max_reconnects'] else None
+            if new_proxy is None:
+                raise ValueError(
+                    f"Transfer {self.transfer_id} failed with {len(self.missing)} of "
+                    f"{self.num_chunks} chunks missing"
+                )
+            print(f"Transfer {self.transfer_id}: resuming from a new connection, "
+                  f"{len(self.missing)} of {self.num_chunks} chunks missing")
+            proxy, failures, reconnects = new_proxy, 0, reconnects + 1
+        return proxy
+
+
+def release(proxy, transfer_id, group_id=None):
+    """Báo client giải phóng update đã nhận đủ (không bắt buộc thành công)."""
+    try:
+        proxy.get_properties(
+            GetPropertiesIns(config={'transfer_id': transfer_id, 'transfer_done': True}),
+            timeout=TRANSFER_CONFIG['chunk_timeout'], group_id=group_id
+        )
+    except Exception:
+        pass
+
+
+class ProxyFinder:
+    """Tìm proxy mới của một client đã kết nối lại (proxy có update `transfer_id`).
+
+    Chỉ hỏi các proxies không được dùng trong round (`busy`), mỗi proxy một lần cho
+    mỗi transfer. Lock chỉ giữ khi chọn proxy để hỏi, không giữ trong lúc chờ trả
+    lời; proxy đang được hỏi cho transfer khác thì để lượt sau (một proxy gRPC chỉ
+    xử lý một request một lúc).
+    """
+
+    def __init__(self, client_manager, busy):
+        self.client_manager = client_manager
+        self.busy = set(busy)
+        self._probed = {}  # transfer_id -> cids đã hỏi
+        self._probing = set()  # cids đang được hỏi
+        self._lock = threading.Lock()
+
+    def _claim(self, transfer_id):
+        """(cid, proxy) tiếp theo cần hỏi cho transfer (đánh dấu đang hỏi), hoặc (None, None)."""
+        with self._lock:
+            probed = self._probed.setdefault(transfer_id, set())
+            for cid, proxy in self.client_manager.all().items():
+                if cid in self.busy or cid in probed or cid in self._probing:
+                    continue
+                probed.add(cid)
+                self._probing.add(cid)
+                return cid, proxy
+        return None, None
+
+    def find(self, transfer_id, group_id=None):
+        deadline = time.monotonic() + TRANSFER_CONFIG['reconnect_timeout']
+        while time.monotonic() < deadline:
+            cid, proxy = self._claim(transfer_id)
+            if proxy is None:
+                time.sleep(1.0)
+                continue
+            try:
+                res = proxy.get_properties(
+                    GetPropertiesIns(config={'transfer_id': transfer_id}),
+                    timeout=TRANSFER_CONFIG['chunk_timeout'], group_id=group_id
+                )
+                available = res.status.code == Code.OK and bool(res.properties.get('available'))
+            except Exception:
+                available = False
+            with self._lock:
+                self._probing.discard(cid)
+                if available:
+                    self.busy.add(cid)
+            if available:
+                return proxy
+        return None
@@ -1,14 +1,38 @@
 import argparse
+import importlib
 from .utils.config import (
-    FL_CONFIG, API_CONFIG, SECURE_AGG_CONFIG, 
-    MODEL_DIR, INITIAL_MODEL_PATH
+    FL_CONFIG, API_CONFIG, SECURE_AGG_CONFIG, SIMULATION_CONFIG, CPU_CONFIG, TEST_CONFIG,
+    DATA_CONFIG, EDGE_CONFIG, AGGREGATION_CONFIG, MODEL_DIR, INITIAL_MODEL_PATH
 )
-from .federated_learning.flwr_server import start_server
-from .federated_learning.flwr_client import start_client
-from .api.server import app
+from .utils.cpu import configure_cpu, parse_threads
 import os
 import sys
 
+# Module cần cho từng vai trò. Chỉ import khi dispatch để `--help`, lỗi tham số
+# hay một client không phải load TensorFlow/Flower/Flask/rembg không dùng tới.
+MODE_MODULES = {
+    'api': '.api.server',
+    'simulate': '.federated_learning.simulation',
+    'server': '.federated_learning.flwr_server',
+    'client': '.federated_learning.flwr_client',
+    'edge': '.federated_learning.edge_aggregator',
+    'test': '.federated_learning.flwr_client',
+}
+
+def get_role(args):
+    """Vai trò cần chạy: 'api', 'simulate', 'test', 'server', 'edge' hoặc 'client'."""
+    if args.mode in ('api', 'simulate'):
+        return args.mode
+    if args.mode == 'test-only':
+        return 'test'
+    if args.edge:
+        return 'edge'
+    return 'server' if args.server else 'client'
+
+def import_mode_module(role):
+    """Import module của vai trò `role` (chỉ gọi khi thực sự chạy vai trò đó)."""
+    return importlib.import_module(MODE_MODULES[role], __package__)
+
 # Add the project root directory to Python path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, project_root)
@@ -32,20 +56,34 @@ This program supports multiple modes:
    - Requires initial model from first phase
 
 3. Test Only (--mode test-only):
-   - For inference and model comparison
+   - Evaluates the initial and the latest model on the test set
+   - Reports loss, accuracy, per-class precision/recall/F1 and confusion matrix
    - Requires at least one trained model
 
 4. API Server (--mode api):
    - Serves trained models via REST API
    - Uses the best available model
 
+5. Simulation (--mode simulate):
+   - Runs the server and N virtual clients in one process
+   - Reports throughput, round latency and time-to-accuracy
+
+6. Hierarchical aggregation (--edge):
+   - An edge aggregator serves a group of clients and sends one
+     aggregated update per round to the root server
+
 Example usage:
   Start initial training server:     python main.py --mode initial --server
   Start additional training server:  python main.py --mode additional --server
   Start client:                     python main.py --mode initial --client --cid 0
+  Evaluate trained models:          python main.py --mode test-only
   Start API server:                 python main.py --mode api
+  Simulate 100 clients:             python main.py --mode simulate --num_clients 100
+  Root server for 2 edges:          python main.py --mode initial --server --edges 2
+  Start edge aggregator:            python main.py --mode initial --edge --cid 101 --listen_address 127.0.0.1:8081
+  Start client behind an edge:      python main.py --mode initial --client --cid 1 --server_address 127.0.0.1:8081
 
-Note: For client mode, --cid is required.
+Note: For client and edge mode, --cid is required.
         """,
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
@@ -53,7 +91,7 @@ Note: For client mode, --cid is required.
     # Required arguments
     parser.add_argument(
         "--mode",
-        choices=['initial', 'additional', 'test-only', 'api'],
+        choices=['initial', 'additional', 'test-only', 'api', 'simulate'],
         required=True,
         help="Operation mode"
     )
@@ -70,12 +108,23 @@ Note: For client mode, --cid is required.
         action="store_true",
         help="Run as client"
     )
+    group.add_argument(
+        "--edge",
+        action="store_true",
+        help="Run as edge aggregator (server for a group of clients, client of the root server)"
+    )
 
     # Client specific arguments
     parser.add_argument(
         "--cid",
         type=int,
-        help="Client ID (required for client mode)"
+        help="Client ID (required for client and edge mode)"
+    )
+    parser.add_argument(
+        "--server_address",
+        type=str,
+        default=EDGE_CONFIG['root_address'],
+        help=f"Server (or edge aggregator) to connect to (default: {EDGE_CONFIG['root_address']})"
     )
 
     # Optional configuration
@@ -92,23 +141,143 @@ Note: For client mode, --cid is required.
         help="Batch size for training"
     )
 
+    parser.add_argument(
+        "--synthetic",
+        action="store_true",
+        help="Use random data with MNIST shapes instead of MNIST (offline)"
+    )
+
+    parser.add_argument(
+        "--aggregator",
+        choices=['fedavg', 'median', 'trimmed_mean', 'krum'],
+        default=AGGREGATION_CONFIG['method'],
+        help="How the server combines client updates. Robust methods (median, trimmed_mean, "
+             f"krum) disable secure aggregation (default: {AGGREGATION_CONFIG['method']})"
+    )
+
+    # Hierarchical aggregation arguments
+    edge_group = parser.add_argument_group('Hierarchical aggregation')
+    edge_group.add_argument(
+        "--edges",
+        type=int,
+        help="Root server: number of edge aggregators to wait for (replaces the client minimums)"
+    )
+    edge_group.add_argument(
+        "--listen_address",
+        type=str,
+        default=EDGE_CONFIG['listen_address'],
+        help=f"Edge: address the group's clients connect to (default: {EDGE_CONFIG['listen_address']})"
+    )
+    edge_group.add_argument(
+        "--group_size",
+        type=int,
+        default=EDGE_CONFIG['group_size'],
+        help=f"Edge: number of clients in the group (default: {EDGE_CONFIG['group_size']})"
+    )
+
+    # CPU arguments (client and server)
+    cpu_group = parser.add_argument_group('CPU')
+    cpu_group.add_argument(
+        "--threads",
+        type=str,
+        help="TensorFlow intra-op threads: a number, 'auto' (split host cores across "
+             "co-located clients) or 'default'. "
+             f"Defaults: client={CPU_CONFIG['client_threads']}, server={CPU_CONFIG['server_threads']}"
+    )
+    cpu_group.add_argument(
+        "--inter_op_threads",
+        type=int,
+        default=CPU_CONFIG['inter_op_threads'],
+        help=f"TensorFlow inter-op threads (default: {CPU_CONFIG['inter_op_threads']})"
+    )
+    cpu_group.add_argument(
+        "--pin_cores",
+        action="store_true",
+        default=CPU_CONFIG['pin_cores'],
+        help="Pin the process to its own set of cores (Linux only)"
+    )
+
+    # Simulation arguments
+    sim_group = parser.add_argument_group('Simulation (--mode simulate)')
+    sim_group.add_argument(
+        "--num_clients",
+        type=int,
+        default=SIMULATION_CONFIG['num_clients'],
+        help=f"Number of virtual clients (default: {SIMULATION_CONFIG['num_clients']})"
+    )
+    sim_group.add_argument(
+        "--workers",
+        type=int,
+        help="Number of concurrent client workers (default: number of CPU cores)"
+    )
+    sim_group.add_argument(
+        "--latency",
+        type=float,
+        default=SIMULATION_CONFIG['latency'],
+        help="Injected latency in seconds per client call"
+    )
+    sim_group.add_argument(
+        "--latency_jitter",
+        type=float,
+        default=SIMULATION_CONFIG['latency_jitter'],
+        help="Random extra latency in seconds, uniform in [0, jitter]"
+    )
+    sim_group.add_argument(
+        "--dropout",
+        type=float,
+        default=SIMULATION_CONFIG['dropout_rate'],
+        help="Probability that a client drops out of a fit round"
+    )
+    sim_group.add_argument(
+        "--target_accuracy",
+        type=float,
+        default=SIMULATION_CONFIG['target_accuracy'],
+        help="Accuracy threshold used for time-to-accuracy"
+    )
+
     return parser
 
 def validate_args(args):
     """Validate command line arguments."""
-    if args.mode == 'api':
-        if args.server or args.client:
-            raise ValueError("API mode doesn't require --server or --client flag")
+    if args.mode in ('api', 'simulate'):
+        if args.server or args.client or args.edge:
+            raise ValueError(f"{args.mode} mode doesn't require --server, --client or --edge flag")
+        if args.mode == 'simulate' and args.num_clients < 2:
+            raise ValueError("Simulation requires at least 2 clients")
         return
 
-    if not (args.server or args.client):
-        raise ValueError("Must specify either --server or --client")
+    if args.mode == 'test-only':
+        if args.server or args.edge:
+            raise ValueError("test-only mode runs locally and doesn't use --server or --edge")
+        args.threads = parse_threads(args.threads) if args.threads is not None else CPU_CONFIG['server_threads']
+        return
+
+    if not (args.server or args.client or args.edge):
+        raise ValueError("Must specify either --server, --client or --edge")
 
     if args.client and args.cid is None:
         raise ValueError("Client mode requires --cid")
 
+    if args.edge:
+        if args.cid is None:
+            raise ValueError("Edge mode requires --cid")
+        if args.group_size < SECURE_AGG_CONFIG['min_clients_for_unmasking']:
+            raise ValueError(
+                f"Edge group needs at least {SECURE_AGG_CONFIG['min_clients_for_unmasking']} clients"
+            )
+
+    if args.edges is not None and not args.server:
+        raise ValueError("--edges is only used by the root server")
+
+    # Giá trị mặc định của --threads phụ thuộc vào vai trò
+    if args.threads is None:
+        args.threads = CPU_CONFIG['client_threads' if args.client else 'server_threads']
+    else:
+        args.threads = parse_threads(args.threads)
+
     if args.mode == 'additional':
-        if not os.path.exists(INITIAL_MODEL_PATH):
+        from .federated_learning.model import model_exists
+        if not model_exists('initial_model'):
             raise ValueError("Initial model not found. Please run initial training first.")
 
 def print_configuration(args):
@@ -116,14 +285,32 @@ def print_configuration(args):
     print("\nCurrent Configuration:")
     print("=" * 50)
     print(f"Mode: {args.mode}")
-    print(f"Running as: {'Server' if args.server else 'Client' if args.client else 'API'}")
+    print(f"Running as: {'Test' if args.mode == 'test-only' else 'Server' if args.server else 'Client' if args.client else 'Edge aggregator' if args.edge else 'Simulation' if args.mode == 'simulate' else 'API'}")
     
-    if args.server:
+    if args.mode == 'test-only':
+        print(f"Batch size: {TEST_CONFIG['batch_size']}")
+        print(f"Threads: {args.threads or 'default'}")
+    elif args.mode == 'simulate':
+        print(f"Virtual clients: {args.num_clients}")
+        print(f"Number of rounds: {args.num_rounds or SIMULATION_CONFIG['num_rounds']}")
+    elif args.server:
         print(f"Number of rounds: {args.num_rounds or FL_CONFIG['num_rounds'][args.mode]}")
-        print(f"Minimum clients: {FL_CONFIG['min_fit_clients'][args.mode]}")
+        if args.edges:
+            print(f"Edge aggregators: {args.edges}")
+        else:
+            print(f"Minimum clients: {FL_CONFIG['min_fit_clients'][args.mode]}")
+        print(f"Threads: {args.threads or 'default'}")
+        print(f"Aggregator: {args.aggregator}")
     elif args.client:
         print(f"Client ID: {args.cid}")
+        print(f"Server address: {args.server_address}")
         print(f"Batch size: {args.batch_size}")
+        print(f"Threads: {args.threads or 'default'}")
+    elif args.edge:
+        print(f"Edge ID: {args.cid}")
+        print(f"Root server: {args.server_address}")
+        print(f"Listen address: {args.listen_address}")
+        print(f"Group size: {args.group_size}")
     else:  # API mode
         print(f"Host: {API_CONFIG['host']}")
         print(f"Port: {API_CONFIG['port']}")
@@ -135,7 +322,6 @@ def initialize_directories():
     directories = [
         MODEL_DIR,
         os.path.join(MODEL_DIR, 'results'),
-        SECURE_AGG_CONFIG['key_storage']  # Thêm key storage
     ]
     
     for directory in directories:
@@ -148,6 +334,8 @@ def main():
     try:
         # Validate arguments
         validate_args(args)
+        DATA_CONFIG['synthetic'] = args.synthetic
+        AGGREGATION_CONFIG['method'] = args.aggregator
 
         # Create necessary directories
         initialize_directories()
@@ -156,13 +344,28 @@ def main():
         print_configuration(args)
 
         # Execute based on mode and role
-        if args.mode == 'api':
-            app.run(
+        role = get_role(args)
+        if role == 'api':
+            api_server = import_mode_module('api')
+            # Load model trước khi nhận request đầu tiên
+            api_server.get_default_model()
+            api_server.app.run(
                 host=API_CONFIG['host'],
                 port=API_CONFIG['port'],
                 debug=API_CONFIG['debug']
             )
-        elif args.server:
+        elif role == 'simulate':
+            import_mode_module('simulate').run_simulation(
+                num_clients=args.num_clients,
+                num_rounds=args.num_rounds,
+                max_workers=args.workers,
+                latency=args.latency,
+                latency_jitter=args.latency_jitter,
+                dropout_rate=args.dropout,
+                target_accuracy=args.target_accuracy,
+                synthetic=args.synthetic
+            )
+        elif role == 'server':
             # Initialize secure aggregation config
             secure_config = {
                 'min_available_clients': FL_CONFIG['min_available_clients'][args.mode],
@@ -178,22 +381,45 @@ def main():
             print(f"Minimum clients for unmasking: {SECURE_AGG_CONFIG['min_clients_for_unmasking']}")
             print(f"Key exchange timeout: {SECURE_AGG_CONFIG['key_exchange_timeout']}s")
             print(f"Masking timeout: {SECURE_AGG_CONFIG['masking_timeout']}s")
-            print(f"Key rotation frequency: {SECURE_AGG_CONFIG['rotation_frequency']} rounds")
             print("=" * 50)
 
-            start_server(
+            # Thread budget cho evaluation của server (trước khi tạo model)
+            configure_cpu(
+                threads=args.threads,
+                inter_op_threads=args.inter_op_threads,
+                pin_cores=args.pin_cores,
+                mode=args.mode
+            )
+
+            # Với --edges, mỗi edge aggregator là một "client" của server gốc
+            import_mode_module('server').start_server(
                 mode=args.mode,
                 num_rounds=args.num_rounds,
-                min_fit_clients=FL_CONFIG['min_fit_clients'][args.mode],
-                min_evaluate_clients=FL_CONFIG['min_evaluate_clients'][args.mode]
+                min_fit_clients=args.edges or FL_CONFIG['min_fit_clients'][args.mode],
+                min_evaluate_clients=args.edges or FL_CONFIG['min_evaluate_clients'][args.mode],
+                min_available_clients=args.edges
+            )
+        elif role == 'test':
+            configure_cpu(
+                threads=args.threads,
+                inter_op_threads=args.inter_op_threads,
+                pin_cores=args.pin_cores
+            )
+            import_mode_module('test').start_client(args)
+        elif role == 'edge':
+            import_mode_module('edge').start_edge(
+                mode=args.mode,
+                edge_id=args.cid,
+                group_size=args.group_size,
+                listen_address=args.listen_address,
+                root_address=args.server_address
             )
         else:  # client mode
             # Initialize client with secure aggregation
             try:
                 print("\nInitializing secure client...")
-                print(f"Key storage location: {SECURE_AGG_CONFIG['key_storage']}")
                 
-                start_client(args)
+                import_mode_module('client').start_client(args)
                 
                 print("Secure client initialization successful!")
                 
@@ -0,0 +1,27 @@
+import pytest
+
+from backend.utils import parameters
+from backend.utils.config import CPU_CONFIG
+
+
+@pytest.fixture
+def aggregation_threads(monkeypatch):
+    """Đặt số threads aggregation (chunk nhỏ để có nhiều chunk) trong một test.
+
+    Thread pool của `parameters` được tạo lại theo số threads mới; các pool tạo
+    trong test được tắt khi test xong.
+    """
+    original = parameters._executor
+
+    def shutdown_created():
+        if parameters._executor not in (None, original):
+            parameters._executor.shutdown()
+
+    def configure(threads, chunk_size=1000):
+        shutdown_created()
+        monkeypatch.setitem(CPU_CONFIG, 'aggregation_threads', threads)
+        monkeypatch.setitem(CPU_CONFIG, 'aggregation_chunk_size', chunk_size)
+        monkeypatch.setattr(parameters, '_executor', None)
+
+    yield configure
+    shutdown_created()
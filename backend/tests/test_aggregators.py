@@ -0,0 +1,165 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from flwr.common import Code, FitRes, Status, ndarrays_to_parameters
+
+from backend.utils.config import AGGREGATION_CONFIG
+from backend.utils.parameters import ParameterVector
+from backend.federated_learning import aggregators
+from backend.federated_learning.flwr_server import FederatedServer
+
+SHAPES = [(50, 3), (1,), (12,)]
+SIZE = 163
+
+
+def make_vectors(num_clients, seed=0):
+    rng = np.random.default_rng(seed)
+    return [ParameterVector(rng.standard_normal(SIZE, dtype=np.float32), SHAPES)
+            for _ in range(num_clients)]
+
+
+def stacked(vectors):
+    return np.stack([vector.buffer for vector in vectors])
+
+
+@pytest.fixture(params=['single', 'multi'])
+def chunk_bytes(request, monkeypatch):
+    """Một chunk cho cả ma trận, hoặc chunk vài cột (không chia hết kích thước)."""
+    if request.param == 'multi':
+        monkeypatch.setitem(AGGREGATION_CONFIG, 'chunk_bytes', 4 * 7 * 9)
+    return request.param
+
+
+@pytest.mark.parametrize('num_clients', [1, 4, 5])
+def test_coordinate_median(chunk_bytes, num_clients):
+    vectors = make_vectors(num_clients)
+    result = aggregators.coordinate_median(vectors)
+    assert result.shapes == SHAPES
+    np.testing.assert_allclose(result.buffer, np.median(stacked(vectors), axis=0), rtol=1e-6)
+
+
+@pytest.mark.parametrize('num_clients, trim_ratio', [(4, 0.0), (5, 0.2), (10, 0.25), (7, 0.49)])
+def test_trimmed_mean(chunk_bytes, num_clients, trim_ratio):
+    vectors = make_vectors(num_clients)
+    trim = int(trim_ratio * num_clients)
+    expected = np.sort(stacked(vectors), axis=0)[trim:num_clients - trim].mean(axis=0)
+    result = aggregators.trimmed_mean(vectors, trim_ratio)
+    np.testing.assert_allclose(result.buffer, expected, rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize('num_clients, trim_ratio', [(4, 0.5), (5, 0.6), (1, 0.9), (4, -0.1)])
+def test_trimmed_mean_rejects_invalid_trim_ratio(num_clients, trim_ratio):
+    with pytest.raises(ValueError, match='trim_ratio must be in'):
+        aggregators.trimmed_mean(make_vectors(num_clients), trim_ratio)
+
+
+def test_pairwise_distances(chunk_bytes):
+    vectors = make_vectors(6)
+    matrix = stacked(vectors).astype(np.float64)
+    expected = ((matrix[:, None, :] - matrix[None, :, :]) ** 2).sum(axis=2)
+    np.testing.assert_allclose(aggregators.pairwise_distances(vectors), expected, rtol=1e-5, atol=1e-6)
+
+
+def test_krum_rejects_outlier(chunk_bytes):
+    rng = np.random.default_rng(2)
+    honest = rng.standard_normal(SIZE, dtype=np.float32)
+    vectors = [ParameterVector(honest + 0.01 * rng.standard_normal(SIZE, dtype=np.float32), SHAPES)
+               for _ in range(6)]
+    vectors.insert(3, ParameterVector(honest + 50, SHAPES))
+    weights = [100] * len(vectors)
+
+    scores = aggregators.krum_scores(vectors, num_byzantine=1)
+    assert np.argmax(scores) == 3
+    _, selected = aggregators.krum(vectors, weights, num_byzantine=1, num_selected=4)
+    assert len(selected) == 4 and 3 not in selected
+
+    with pytest.raises(ValueError, match='needs at least'):
+        aggregators.krum_scores(vectors[:3], num_byzantine=1)
+
+
+def test_aggregate_methods():
+    vectors = make_vectors(5)
+    weights = [1, 2, 3, 4, 5]
+    average, used = aggregators.aggregate(vectors, weights, 'fedavg')
+    np.testing.assert_array_equal(average.buffer, ParameterVector.weighted_average(vectors, weights).buffer)
+    assert used == [0, 1, 2, 3, 4]
+    for method in ('median', 'trimmed_mean', 'krum'):
+        result, used = aggregators.aggregate(vectors, weights, method)
+        assert result.shapes == SHAPES and used
+    with pytest.raises(ValueError, match='Unknown aggregation method'):
+        aggregators.aggregate(vectors, weights, 'mean')
+
+
+def test_robust_aggregators_independent_of_threads(aggregation_threads, monkeypatch):
+    monkeypatch.setitem(AGGREGATION_CONFIG, 'chunk_bytes', 4 * 7 * 9)
+    vectors = make_vectors(7)
+
+    def run(threads):
+        aggregation_threads(threads)
+        return (aggregators.coordinate_median(vectors).buffer,
+                aggregators.trimmed_mean(vectors, 0.2).buffer,
+                aggregators.pairwise_distances(vectors))
+
+    for serial, parallel in zip(run(1), run(4)):
+        np.testing.assert_array_equal(serial, parallel)
+
+
+def test_finite_updates():
+    vectors = make_vectors(4)
+    vectors[1].buffer[5] = np.nan
+    vectors[3].buffer[-1] = np.inf
+    assert aggregators.finite_updates(vectors) == [True, False, True, False]
+
+
+class AggregationServer(FederatedServer):
+    """FederatedServer không có model: chỉ dùng phần tổng hợp updates."""
+
+    def _create_global_model(self, mode):
+        return None
+
+
+def fit_result(client_id, vector, num_examples):
+    return (
+        SimpleNamespace(cid=f'proxy-{client_id}'),
+        FitRes(status=Status(code=Code.OK, message=''), parameters=vector.to_parameters(),
+               num_examples=num_examples, metrics={'client_id': client_id}),
+    )
+
+
+@pytest.mark.parametrize('method', ['fedavg', 'median'])
+def test_aggregate_updates_ignores_non_finite(monkeypatch, method):
+    monkeypatch.setitem(AGGREGATION_CONFIG, 'method', method)
+    server = AggregationServer()
+    vectors = make_vectors(4)
+    vectors[2].buffer[0] = np.nan
+    num_examples = [10, 20, 30, 40]
+    results = [fit_result(str(i + 1), vector, n) for i, (vector, n) in enumerate(zip(vectors, num_examples))]
+
+    aggregated, metrics = server.aggregate_updates(1, results, {'1', '2', '3', '4'})
+
+    finite = [0, 1, 3]
+    expected, _ = aggregators.aggregate([vectors[i] for i in finite], [num_examples[i] for i in finite], method)
+    assert len(metrics) == 4
+    np.testing.assert_array_equal(aggregated.buffer, expected.buffer)
+
+    vectors[0].buffer[0] = vectors[1].buffer[0] = vectors[3].buffer[0] = np.inf
+    results = [fit_result(str(i + 1), vector, n) for i, (vector, n) in enumerate(zip(vectors, num_examples))]
+    assert server.aggregate_updates(2, results, {'1', '2', '3', '4'})[0] is None
+
+
+def test_aggregate_updates_drops_undecodable_update():
+    server = AggregationServer()
+    vectors = make_vectors(3)
+    num_examples = [10, 20, 30]
+    results = [fit_result(str(i + 1), vector, n) for i, (vector, n) in enumerate(zip(vectors, num_examples))]
+    # complex -> float32 không phải cast same_kind
+    results[1][1].parameters = ndarrays_to_parameters(
+        [layer.astype(np.complex64) for layer in vectors[1].to_ndarrays()]
+    )
+
+    aggregated, metrics = server.aggregate_updates(1, results, {'1', '2', '3'})
+
+    expected, _ = aggregators.aggregate([vectors[0], vectors[2]], [10, 30], 'fedavg')
+    assert [m['client_id'] for m in metrics] == ['1', '3']
+    np.testing.assert_array_equal(aggregated.buffer, expected.buffer)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from backend.api import server
+from backend.federated_learning.model import compile_model, create_model, store_model
+from backend.utils import model_index, weights_store
+from backend.utils.config import API_CONFIG, QUANTIZATION_CONFIG, WEIGHTS_STORE_CONFIG
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """Test client của API với weights store, index và cache models riêng."""
+    store = weights_store.WeightsStore(root=str(tmp_path / 'weights'))
+    index = model_index.ModelIndex(path=str(tmp_path / 'index.json'), model_dir=str(tmp_path), store=store)
+    monkeypatch.setattr(weights_store, '_default_store', store)
+    monkeypatch.setattr(model_index, '_default_index', index)
+    monkeypatch.setitem(WEIGHTS_STORE_CONFIG, 'export_keras', False)
+    monkeypatch.setitem(QUANTIZATION_CONFIG, 'dir', str(tmp_path / 'quantized'))
+    monkeypatch.setitem(API_CONFIG, 'model_cache_size', 2)
+    monkeypatch.setattr(server, '_model_cache', server.ModelCache(2))
+    yield server.app.test_client()
+    index.stop()
+
+
+def store_round(model, round_number, digit):
+    """Lưu model luôn đoán `digit` (mọi weight bằng 0, chỉ bias của lớp cuối) thành round mới."""
+    weights = [np.zeros_like(w) for w in model.get_weights()]
+    weights[-1][digit] = 10.0
+    model.set_weights(weights)
+    store_model(model, f'global_model_round_{round_number}', {'round': round_number})
+
+
+def recognize(client):
+    pixels = np.random.default_rng(0).integers(0, 256, 784, dtype=np.uint8).tobytes()
+    response = client.post('/recognize', data=pixels, content_type='application/octet-stream')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_default_recognize_follows_latest_round(client):
+    model = compile_model(create_model())
+    store_round(model, 1, digit=3)
+    first = recognize(client)
+    assert first['digit'] == 3
+    assert first['model_info']['name'] == 'global_model_round_1.keras'
+
+    store_round(model, 2, digit=7)
+    second = recognize(client)
+    assert second['digit'] == 7
+    assert second['model_info']['name'] == 'global_model_round_2.keras'
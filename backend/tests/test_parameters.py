@@ -0,0 +1,144 @@
+import numpy as np
+import pytest
+from flwr.common import ndarrays_to_parameters, parameters_to_ndarrays
+
+from backend.utils.parameters import ParameterVector
+
+SHAPES = [(3, 4), (), (0,), (2, 0, 3), (5,), (2, 3, 4)]
+
+
+def make_arrays(dtype, shapes=SHAPES, seed=0):
+    rng = np.random.default_rng(seed)
+    return [(rng.standard_normal(shape) * 100).astype(dtype) for shape in shapes]
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64, np.uint32, np.int32])
+def test_round_trip_with_flower(dtype):
+    arrays = make_arrays(dtype)
+    vector = ParameterVector.from_parameters(ndarrays_to_parameters(arrays), dtype=dtype)
+
+    assert vector.shapes == SHAPES
+    assert vector.dtype == dtype
+    for decoded, array in zip(parameters_to_ndarrays(vector.to_parameters()), arrays):
+        assert decoded.dtype == dtype
+        assert decoded.shape == array.shape
+        np.testing.assert_array_equal(decoded, array)
+
+
+def test_to_parameters_matches_flower_serialization():
+    arrays = make_arrays(np.float32)
+    parameters = ParameterVector.from_ndarrays(arrays).to_parameters()
+    expected = ndarrays_to_parameters(arrays)
+
+    assert parameters.tensor_type == expected.tensor_type
+    assert parameters.tensors == expected.tensors
+
+
+def test_from_parameters_casts_and_reads_fortran_order():
+    arrays = [np.asfortranarray(a) for a in make_arrays(np.float64, [(3, 4), (2, 3, 4)])]
+    vector = ParameterVector.from_parameters(ndarrays_to_parameters(arrays))
+
+    assert vector.dtype == np.float32
+    for layer, array in zip(vector.to_ndarrays(), arrays):
+        np.testing.assert_array_equal(layer, array.astype(np.float32))
+
+
+def test_from_parameters_into_existing_vector():
+    arrays = make_arrays(np.float32)
+    out = ParameterVector.zeros(SHAPES)
+    buffer = out.buffer
+    assert ParameterVector.from_parameters(ndarrays_to_parameters(arrays), out=out) is out
+    assert out.buffer is buffer
+    np.testing.assert_array_equal(out.buffer, ParameterVector.from_ndarrays(arrays).buffer)
+
+    with pytest.raises(ValueError):
+        ParameterVector.from_parameters(ndarrays_to_parameters(arrays[:2]), out=out)
+
+
+def test_from_parameters_rejects_unsafe_dtype():
+    parameters = ndarrays_to_parameters(make_arrays(np.float32))
+    with pytest.raises(ValueError, match='cannot be decoded into'):
+        ParameterVector.from_parameters(parameters, dtype=np.uint32)
+
+
+def test_layers_are_views_of_buffer():
+    vector = ParameterVector.from_ndarrays(make_arrays(np.float32))
+    assert vector.size == sum(int(np.prod(shape)) for shape in SHAPES)
+    vector.layer(0)[...] = 7.0
+    np.testing.assert_array_equal(vector.buffer[:12], 7.0)
+    assert vector.layer(1).shape == ()
+
+    with pytest.raises(ValueError):
+        ParameterVector(np.zeros(vector.size + 1), SHAPES)
+
+
+def test_assign_and_like():
+    arrays = make_arrays(np.float32)
+    vector = ParameterVector.zeros(SHAPES)
+    buffer = vector.buffer
+    assert vector.assign(arrays) is vector
+    assert vector.buffer is buffer
+    for layer, array in zip(vector.to_ndarrays(), arrays):
+        np.testing.assert_array_equal(layer, array)
+
+    doubled = vector.like(vector.buffer * 2)
+    assert doubled.shapes == vector.shapes
+    assert doubled.dtype == vector.dtype
+    np.testing.assert_array_equal(doubled.layer(5), arrays[5] * 2)
+
+    copy = vector.copy()
+    copy.buffer[:] = 0
+    np.testing.assert_array_equal(vector.layer(0), arrays[0])
+
+    with pytest.raises(ValueError):
+        vector.assign(arrays[:-1])
+
+
+def test_weighted_average():
+    vectors = [ParameterVector.from_ndarrays(make_arrays(np.float32, seed=seed)) for seed in range(3)]
+    weights = [10, 30, 60]
+    result = ParameterVector.weighted_average(vectors, weights)
+
+    expected = np.average([v.buffer for v in vectors], axis=0, weights=weights)
+    assert result.shapes == SHAPES
+    assert result.dtype == np.float32
+    np.testing.assert_allclose(result.buffer, expected, rtol=1e-5, atol=1e-4)
+
+    with pytest.raises(ValueError):
+        ParameterVector.weighted_average(vectors, [0, 0, 0])
+    with pytest.raises(ValueError):
+        ParameterVector.weighted_average([vectors[0], ParameterVector.zeros([(2,)])], [1, 1])
+
+
+def test_ring_sum_wraps_around():
+    shapes = [(2, 2), (3,)]
+    high = ParameterVector(np.full(7, 2 ** 32 - 1, dtype=np.uint32), shapes, np.uint32)
+    low = ParameterVector(np.arange(7, dtype=np.uint32) + 2, shapes, np.uint32)
+    result = ParameterVector.ring_sum([high, low, high])
+
+    assert result.dtype == np.uint32
+    assert result.shapes == shapes
+    np.testing.assert_array_equal(result.buffer, np.arange(7, dtype=np.uint32))
+
+
+def test_aggregation_is_bit_identical_across_thread_counts(aggregation_threads):
+    rng = np.random.default_rng(1)
+    shapes = [(3000,), (70, 30), (1,)]
+    base = ParameterVector.zeros(shapes)
+    parameters = [base.like(rng.standard_normal(base.size, dtype=np.float32)).to_parameters()
+                  for _ in range(7)]
+    weights = [1000 + 37 * i for i in range(7)]
+    rings = [ParameterVector(rng.integers(0, 2 ** 32, base.size, dtype=np.uint32), shapes, np.uint32)
+             for _ in range(7)]
+
+    def run(threads):
+        aggregation_threads(threads)
+        vectors = ParameterVector.from_parameters_list(parameters)
+        return (ParameterVector.weighted_average(vectors, weights).buffer,
+                ParameterVector.ring_sum(rings).buffer)
+
+    serial_average, serial_ring = run(1)
+    for threads in (2, 4):
+        average, ring = run(threads)
+        np.testing.assert_array_equal(average.view(np.uint32), serial_average.view(np.uint32))
+        np.testing.assert_array_equal(ring, serial_ring)
@@ -0,0 +1,93 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from backend.data import partition
+from backend.data.partition import SCHEMES, SPLITS, DataPartition, get_partition
+from backend.utils.config import DATA_CONFIG, DATA_RANGES_INFO
+
+CLIENT_RANGES = {
+    '1': {'labels': [0, 1, 2, 3, 4], 'description': 'Digits 0-4'},
+    '2': {'labels': [3, 4, 5, 6, 7], 'description': 'Digits 3-7'},
+    '3': {'labels': [8], 'description': 'Digit 8'},
+}
+
+
+@pytest.fixture
+def labels(monkeypatch, tmp_path):
+    """Labels nhỏ thay cho dataset; partitions cache trong thư mục tạm."""
+    rng = np.random.default_rng(0)
+    y_train = rng.integers(0, 10, 3000, dtype=np.uint8)
+    y_test = rng.integers(0, 10, 700, dtype=np.uint8)
+    monkeypatch.setattr(partition, 'load_dataset', lambda synthetic=None: (None, y_train, None, y_test))
+    monkeypatch.setattr(partition, '_partitions', {})
+    monkeypatch.setitem(DATA_CONFIG, 'cache_dir', str(tmp_path))
+    monkeypatch.setitem(DATA_RANGES_INFO, 'client_ranges', CLIENT_RANGES)
+    return {'train': y_train, 'test': y_test}
+
+
+def compute(scheme, seed, num_clients=None):
+    """Partition tính lại từ đầu (không dùng cache trong process hay trên đĩa)."""
+    partition._partitions.clear()
+    for path in glob.glob(os.path.join(DATA_CONFIG['cache_dir'], 'partitions', '*.npz')):
+        os.remove(path)
+    return get_partition(scheme, alpha=0.5, seed=seed, num_clients=num_clients, synthetic=True)
+
+
+def assert_same(a, b):
+    for split in SPLITS:
+        assert list(a.indices[split]) == list(b.indices[split])
+        for cid in a.indices[split]:
+            np.testing.assert_array_equal(a.indices[split][cid], b.indices[split][cid])
+            np.testing.assert_array_equal(a.histograms[split][cid], b.histograms[split][cid])
+
+
+@pytest.mark.parametrize('scheme', SCHEMES)
+@pytest.mark.parametrize('num_clients', [None, 7])
+def test_deterministic_for_seed(labels, scheme, num_clients):
+    first = compute(scheme, 42, num_clients)
+    assert_same(first, compute(scheme, 42, num_clients))
+
+    other = compute(scheme, 43, num_clients)
+    assert any(not np.array_equal(first.indices['train'][cid], other.indices['train'][cid])
+               for cid in first.client_ids)
+
+
+@pytest.mark.parametrize('scheme', SCHEMES)
+@pytest.mark.parametrize('num_clients', [None, 7])
+def test_disjoint_and_complete(labels, scheme, num_clients):
+    result = compute(scheme, 1, num_clients)
+    if num_clients is None and scheme != 'iid':
+        ranges = CLIENT_RANGES
+    else:
+        ranges = {cid: {'labels': list(range(10))} for cid in result.client_ids}
+    held = sorted({label for info in ranges.values() for label in info['labels']})
+
+    for split in SPLITS:
+        y = labels[split]
+        parts = [result.indices[split][cid] for cid in result.client_ids]
+        merged = np.concatenate(parts)
+        assert len(merged) == len(np.unique(merged))
+        np.testing.assert_array_equal(np.sort(merged), np.flatnonzero(np.isin(y, held)))
+        for cid, idx in zip(result.client_ids, parts):
+            assert np.all(np.diff(idx) > 0)
+            assert set(np.unique(y[idx])) <= set(ranges[cid]['labels'])
+            np.testing.assert_array_equal(result.histogram(cid, split), np.bincount(y[idx], minlength=10))
+
+
+def test_save_load_round_trip(labels, tmp_path, monkeypatch):
+    result = compute('dirichlet', 3)
+    path = str(tmp_path / 'copy' / 'partition.npz')
+    result.save(path)
+    loaded = DataPartition.load(path, result.key, CLIENT_RANGES, synthetic=True)
+    assert_same(result, loaded)
+    for split in SPLITS:
+        for cid in CLIENT_RANGES:
+            assert loaded.histograms[split][cid].dtype == np.int64
+
+    # Lần gọi sau (process mới) đọc partition đã cache trên đĩa, không tính lại
+    partition._partitions.clear()
+    monkeypatch.setattr(partition, '_compute_partition', None)
+    assert_same(result, get_partition('dirichlet', alpha=0.5, seed=3, synthetic=True))
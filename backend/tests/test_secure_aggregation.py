@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+from flwr.common import Code, GetPropertiesIns
+
+from backend.utils.config import SECURE_AGG_CONFIG
+from backend.utils.crypto import CryptoUtils, PRIVATE_KEY_BYTES, SHARE_BYTES
+from backend.federated_learning.secure_aggregation import (
+    ClientKeyring, SecureAggregationCoordinator, get_keyring, handle_properties
+)
+
+SIZE = 1000
+
+
+class LocalProxy:
+    """ClientProxy giả gọi thẳng `handle_properties` của client trong process."""
+
+    def __init__(self, client_id):
+        self.cid = f'proxy-{client_id}'
+        self.client_id = client_id
+
+    def get_properties(self, ins, timeout, group_id):
+        return handle_properties(self.client_id, ins)
+
+
+@pytest.fixture(autouse=True)
+def secagg_config(monkeypatch):
+    monkeypatch.setitem(SECURE_AGG_CONFIG, 'min_clients_for_unmasking', 2)
+    monkeypatch.setitem(SECURE_AGG_CONFIG, 'dropout_threshold', 0.5)
+
+
+def run_round(server_round, num_clients, dropped=()):
+    """Setup + masked updates của các clients không bị drop; trả về (aggregate, expected)."""
+    coordinator = SecureAggregationCoordinator()
+    proxies = [LocalProxy(str(cid)) for cid in range(1, num_clients + 1)]
+    accepted = coordinator.setup(server_round, [(proxy, None) for proxy in proxies])
+    assert len(accepted) == num_clients
+
+    rng = np.random.default_rng(server_round)
+    survivors = [proxy.client_id for proxy in proxies if proxy.client_id not in dropped]
+    total = np.zeros(SIZE, dtype=np.uint32)
+    expected = np.zeros(SIZE, dtype=np.uint32)
+    for client_id in survivors:
+        update = CryptoUtils.quantize(rng.uniform(-1, 1, SIZE).astype(np.float32), int(client_id) * 10)
+        expected += update
+        total += update + get_keyring().mask(client_id, server_round, SIZE)
+    correction, recovered = coordinator.unmask_correction(server_round, survivors, SIZE)
+    assert recovered == sorted(dropped, key=int)
+    return total - correction, expected
+
+
+def test_shamir_round_trip():
+    secret = bytes(range(PRIVATE_KEY_BYTES))
+    shares = CryptoUtils.split_secret(secret, 5, 3)
+    assert CryptoUtils.combine_shares(shares[:3], PRIVATE_KEY_BYTES) == secret
+    assert CryptoUtils.combine_shares([shares[4], shares[1], shares[2]], PRIVATE_KEY_BYTES) == secret
+    assert CryptoUtils.combine_shares(shares, PRIVATE_KEY_BYTES) == secret
+
+
+def test_shamir_below_threshold():
+    secret = bytes(range(PRIVATE_KEY_BYTES))
+    shares = CryptoUtils.split_secret(secret, 5, 3)
+    # Thiếu share: nội suy ra một phần tử ngẫu nhiên của trường, không phải secret
+    padded = secret.rjust(SHARE_BYTES, b'\0')
+    for pair in [(0, 1), (2, 4), (1, 3)]:
+        assert CryptoUtils.combine_shares([shares[i] for i in pair], SHARE_BYTES) != padded
+    with pytest.raises(ValueError):
+        CryptoUtils.split_secret(secret, 3, 4)
+
+
+def test_pairwise_masks_cancel_in_ring():
+    keyring = ClientKeyring()
+    client_ids = ['1', '2', '3', '4']
+    public_keys = {cid: keyring.advertise(cid, 7)['public_key'].decode() for cid in client_ids}
+    for cid in client_ids:
+        keyring.share(cid, 7, public_keys, threshold=2)
+
+    masks = [keyring.mask(cid, 7, SIZE) for cid in client_ids]
+    assert all(mask.any() for mask in masks)
+    assert not np.sum(masks, axis=0, dtype=np.uint32).any()
+
+
+def test_aggregate_without_dropout():
+    aggregate, expected = run_round(1, 4)
+    np.testing.assert_array_equal(aggregate, expected)
+
+
+@pytest.mark.parametrize('dropped', [('2',), ('1', '4')])
+def test_unmask_recovers_dropped_clients(dropped):
+    aggregate, expected = run_round(2, 5, dropped)
+    np.testing.assert_array_equal(aggregate, expected)
+
+
+def test_unmask_fewer_shares_than_threshold():
+    # 5 clients, ngưỡng 3: chỉ còn 2 survivors
+    with pytest.raises(ValueError, match='Cannot recover client'):
+        run_round(3, 5, dropped=('3', '4', '5'))
+
+
+def test_unmask_recovered_key_mismatch():
+    coordinator = SecureAggregationCoordinator()
+    proxies = [LocalProxy(str(cid)) for cid in range(1, 4)]
+    coordinator.setup(4, [(proxy, None) for proxy in proxies])
+    _, other_public_key = CryptoUtils.generate_keypair()
+    coordinator.rounds[4].public_keys['3'] = CryptoUtils.serialize_public_key(other_public_key).decode()
+
+    with pytest.raises(ValueError, match='does not match its public key'):
+        coordinator.unmask_correction(4, ['1', '2'], SIZE)
+
+
+def test_handle_properties_reports_failure(capsys):
+    res = handle_properties('9', GetPropertiesIns(config={'secagg_phase': 'share', 'secagg_round': 99,
+                                                          'peers': '{}', 'threshold': 1}))
+    assert res.status.code == Code.GET_PROPERTIES_NOT_IMPLEMENTED
+    assert 'ValueError' in res.status.message
+    assert 'Traceback' in capsys.readouterr().err
@@ -0,0 +1,162 @@
+import random
+import threading
+import time
+
+import numpy as np
+import pytest
+from flwr.common import GetPropertiesIns
+
+from backend.utils.config import TRANSFER_CONFIG
+from backend.federated_learning import transfer
+
+CHUNK_BYTES = 256
+
+
+class FlakyProxy:
+    """ClientProxy giả gọi thẳng `handle_transfer` của client, có lỗi giả lập."""
+
+    def __init__(self, client_id, rng=None, failure_rate=0.0, corrupt_rate=0.0,
+                 disconnect_after=None, delay=0.0):
+        self.cid = f'proxy-{client_id}-{id(self)}'
+        self.client_id = client_id
+        self.rng = rng or random.Random(0)
+        self.failure_rate = failure_rate
+        self.corrupt_rate = corrupt_rate
+        self.disconnect_after = disconnect_after
+        self.delay = delay
+        self.requests = 0
+
+    def get_properties(self, ins, timeout, group_id):
+        self.requests += 1
+        time.sleep(self.delay)
+        if self.disconnect_after is not None and self.requests > self.disconnect_after:
+            raise ConnectionError("connection lost")
+        if 'transfer_chunk' in ins.config and self.rng.random() < self.failure_rate:
+            raise TimeoutError("request timed out")
+        res = transfer.handle_transfer(self.client_id, ins)
+        data = res.properties.get('data')
+        if data and self.rng.random() < self.corrupt_rate:
+            corrupted = bytearray(data)
+            corrupted[self.rng.randrange(len(corrupted))] ^= 0xFF
+            res.properties['data'] = bytes(corrupted)
+        return res
+
+
+class ClientManager:
+    def __init__(self, *proxies):
+        self.proxies = {proxy.cid: proxy for proxy in proxies}
+
+    def add(self, proxy):
+        self.proxies[proxy.cid] = proxy
+        return proxy
+
+    def all(self):
+        return dict(self.proxies)
+
+
+@pytest.fixture(autouse=True)
+def transfer_config(monkeypatch):
+    monkeypatch.setitem(TRANSFER_CONFIG, 'retry_backoff', 0.0)
+    monkeypatch.setitem(TRANSFER_CONFIG, 'max_retries', 3)
+    monkeypatch.setitem(TRANSFER_CONFIG, 'max_reconnects', 3)
+    monkeypatch.setitem(TRANSFER_CONFIG, 'reconnect_timeout', 2.0)
+
+
+def make_update(seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.standard_normal((40, 30), dtype=np.float32), np.zeros((0, 5), dtype=np.float32),
+            np.float32(rng.standard_normal()).reshape(()), rng.standard_normal(1000, dtype=np.float32)]
+
+
+def assert_received(receiver, arrays):
+    for layer, array in zip(receiver.vector.to_ndarrays(), arrays):
+        assert layer.shape == array.shape
+        np.testing.assert_array_equal(layer, array)
+
+
+def test_small_update_is_sent_whole():
+    arrays = make_update()
+    assert transfer.publish_update('1', arrays, {}) is None
+    assert transfer.publish_update('1', arrays, {'transfer_chunk_bytes': 1 << 20}) is None
+
+
+def test_flaky_connection_resumes_bit_identical():
+    rng = random.Random(0)
+    arrays = make_update()
+    manifest = transfer.publish_update('1', arrays, {'transfer_chunk_bytes': CHUNK_BYTES})
+    transfer_id = manifest['transfer_id']
+
+    first = FlakyProxy('1', rng, failure_rate=0.2, corrupt_rate=0.1, disconnect_after=8)
+    manager = ClientManager(first, FlakyProxy('2', rng))
+    finder = transfer.ProxyFinder(manager, busy={first.cid})
+
+    def reconnect():
+        # Client kết nối lại: proxy mới của cùng client
+        manager.add(FlakyProxy('1', rng, failure_rate=0.2, corrupt_rate=0.1))
+        return finder.find(transfer_id)
+
+    receiver = transfer.ChunkReceiver(manifest, np.float32)
+    proxy = receiver.fetch(first, reconnect=reconnect)
+
+    assert receiver.complete
+    assert proxy is not first and proxy.client_id == '1'
+    assert receiver.num_chunks == -(-manifest['transfer_nbytes'] // CHUNK_BYTES)
+    assert receiver.bytes_received > manifest['transfer_nbytes']  # Có chunks hỏi lại
+    assert_received(receiver, arrays)
+
+    transfer.release(proxy, transfer_id)
+    assert transfer.get_upload_store().get('1', transfer_id) is None
+
+
+def test_fetch_fails_without_reconnect():
+    manifest = transfer.publish_update('1', make_update(), {'transfer_chunk_bytes': CHUNK_BYTES})
+    receiver = transfer.ChunkReceiver(manifest, np.float32)
+    proxy = FlakyProxy('1', disconnect_after=3)
+
+    with pytest.raises(ValueError, match='chunks missing'):
+        receiver.fetch(proxy)
+    assert receiver.received.sum() == 3
+    transfer.get_upload_store().release('1', manifest['transfer_id'])
+
+
+def test_receiver_rejects_mismatched_manifest():
+    manifest = transfer.publish_update('1', make_update(), {'transfer_chunk_bytes': CHUNK_BYTES})
+    with pytest.raises(ValueError, match='dtype'):
+        transfer.ChunkReceiver(manifest, np.uint32)
+    with pytest.raises(ValueError, match='checksums'):
+        transfer.ChunkReceiver({**manifest, 'transfer_checksums': manifest['transfer_checksums'][:-1]})
+    transfer.get_upload_store().release('1', manifest['transfer_id'])
+
+
+def test_unknown_transfer_is_reported():
+    res = transfer.handle_transfer('1', GetPropertiesIns(config={'transfer_id': 'missing', 'transfer_chunk': 0}))
+    assert res.status.message.startswith('transfer failed')
+    res = transfer.handle_transfer('1', GetPropertiesIns(config={'transfer_id': 'missing'}))
+    assert res.properties == {'client_id': '1', 'available': False}
+
+
+def test_proxy_finder_does_not_block_on_slow_probe(monkeypatch):
+    monkeypatch.setitem(TRANSFER_CONFIG, 'reconnect_timeout', 1.2)
+    manifest = transfer.publish_update('2', make_update(), {'transfer_chunk_bytes': CHUNK_BYTES})
+    slow = FlakyProxy('1', delay=1.0)
+    target = FlakyProxy('2')
+    finder = transfer.ProxyFinder(ClientManager(slow, target), busy=set())
+
+    # Transfer khác đang hỏi proxy chậm: không được chặn việc tìm proxy của client 2
+    other = threading.Thread(target=finder.find, args=('1-unknown',))
+    other.start()
+    while not slow.requests:
+        time.sleep(0.01)
+    start = time.monotonic()
+    found = finder.find(manifest['transfer_id'])
+    elapsed = time.monotonic() - start
+    other.join()
+
+    assert found is target
+    assert elapsed < 0.5
+    assert slow.requests == 1  # Proxy chậm chỉ được hỏi cho transfer kia
+    # Đã tìm thấy (busy): không còn proxy nào để hỏi
+    monkeypatch.setitem(TRANSFER_CONFIG, 'reconnect_timeout', 0.1)
+    assert finder.find(manifest['transfer_id']) is None
+    assert target.requests == 1  # Đã busy: transfer kia không hỏi nữa
+    transfer.get_upload_store().release('2', manifest['transfer_id'])
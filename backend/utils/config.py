@@ -4,6 +4,9 @@ import os
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 INTERFACE_DIR = os.path.join(BASE_DIR, 'view')
 
+# Seed mặc định cho các thao tác ngẫu nhiên có thể tái lập (chia dữ liệu...)
+RANDOM_SEED = 42
+
 # Thư mục models và đường dẫn
 MODEL_DIR = os.path.join(BASE_DIR, 'models')
 os.makedirs(MODEL_DIR, exist_ok=True)
@@ -15,6 +18,34 @@ CLIENT_MODEL_TEMPLATE = os.path.join(MODEL_DIR, 'client_{}_model.keras')
 BEST_MODEL_PATH = os.path.join(MODEL_DIR, 'best_model.keras')   
 FINAL_MODEL_PATH = os.path.join(MODEL_DIR, 'final_model.keras')
 
+# Kho weights định danh theo nội dung (raw float32, load bằng mmap)
+WEIGHTS_STORE_CONFIG = {
+    'dir': os.path.join(MODEL_DIR, 'weights'),
+    # Ghi thêm file .keras đầy đủ cho mỗi model (cho công cụ ngoài cần Keras archive)
+    'export_keras': False,
+}
+
+# Index của tất cả models (round, mode, accuracy, loss, size, hash, timestamp)
+MODEL_INDEX_CONFIG = {
+    'path': os.path.join(MODEL_DIR, 'index.json'),
+    # Chu kỳ (giây) watcher của API kiểm tra index có thay đổi không
+    'watch_interval': 1.0,
+}
+
+# Post-training int8 quantization của model được serve (TFLite). Artifact chỉ được
+# publish nếu accuracy trên test set giảm không quá `max_accuracy_drop` so với float
+QUANTIZATION_CONFIG = {
+    'dir': os.path.join(MODEL_DIR, 'quantized'),
+    'after_training': True,  # Chạy cho best model khi server train xong
+    # 'int8' = full-integer (calibration), 'dynamic' = dynamic-range; thứ tự ưu tiên khi publish
+    'schemes': ['int8', 'dynamic'],
+    'calibration_samples': 500,  # Lấy từ train data của các client partitions
+    'max_accuracy_drop': 0.01,
+    'eval_batch_size': 256,
+    'latency_samples': 200,  # Số ảnh đo latency với batch 1
+    'num_threads': None,  # Threads của TFLite interpreter (None = mặc định)
+}
+
 DATA_SUMMARY_TEMPLATE = os.path.join(MODEL_DIR, '{}_data_summary.json')
 
 # Templates cho tên file models
@@ -59,6 +90,46 @@ FL_CONFIG = {
     # Tỷ lệ clients sử dụng cho training/evaluation
     'fraction_fit': 0.7,
     'fraction_evaluate': 0.7,
+
+    # Đánh giá trên mẫu con phân tầng ở các round trung gian
+    # (1.0 = luôn đánh giá toàn bộ; round cuối luôn đánh giá toàn bộ)
+    'evaluate_sample_fraction': 1.0,
+    'evaluate_confidence': 0.95,
+
+    # Đánh giá, lưu models và ghi results của một round chạy nền trên snapshot weights
+    # trong khi server gửi weights mới cho round sau (False = tuần tự như trước)
+    'pipeline_rounds': True,
+    # Số rounds tối đa đang chờ/chạy phần nền; vượt quá thì aggregate_fit đợi
+    'pipeline_depth': 1,
+}
+
+# Phương pháp tổng hợp updates của clients (--aggregator). Các phương pháp robust
+# cần thấy từng update riêng lẻ nên khi bật, secure aggregation (masks chỉ triệt
+# tiêu trong tổng) bị tắt và clients gửi updates không mask.
+AGGREGATION_CONFIG = {
+    'method': 'fedavg',  # 'fedavg', 'median', 'trimmed_mean' hoặc 'krum'
+    'trim_ratio': 0.1,  # trimmed_mean: tỷ lệ bỏ đi ở mỗi đầu của từng toạ độ
+    'krum_byzantine': 1,  # krum: số clients lỗi tối đa (f), cần ít nhất f + 3 clients
+    'krum_selected': 1,  # Multi-Krum: lấy trung bình m updates có điểm thấp nhất
+    # Bộ nhớ tối đa của ma trận clients × cột cho mỗi chunk (mỗi thread một chunk)
+    'chunk_bytes': 16 * 1024 * 1024,
+}
+
+# Updates lớn hơn một chunk không đi trong FitRes: client giữ update, server kéo từng
+# chunk có checksum qua get_properties và chỉ hỏi lại các chunks còn thiếu khi lỗi
+# hoặc sau khi client kết nối lại
+TRANSFER_CONFIG = {
+    'enabled': True,
+    'chunk_bytes': 1024 * 1024,
+    'chunk_timeout': 30.0,  # Giây cho mỗi request một chunk
+    'max_retries': 3,  # Số lần hỏi lại liên tiếp trước khi coi là mất kết nối
+    'retry_backoff': 0.5,  # Giây, tăng tuyến tính theo số lần thử
+    'reconnect_timeout': 60.0,  # Server đợi client kết nối lại tối đa (giây)
+    'max_reconnects': 3,  # Số lần chuyển sang proxy mới cho một update
+    'keep_uploads': 2,  # Số updates mỗi client giữ lại chờ server kéo
+    # Client tự kết nối lại khi mất kết nối (để server kéo tiếp update đang giữ)
+    'client_reconnects': 5,
+    'client_reconnect_delay': 2.0,
 }
 
 # Data và training configuration
@@ -78,6 +149,35 @@ DATA_CONFIG = {
         'initial': 3,
         'additional': 3,
     },
+
+    # Dataset MNIST dạng .npy float32 (memory-mapped) và các partition đã tính
+    'cache_dir': os.path.join(BASE_DIR, 'data', 'cache'),
+    # Dữ liệu ngẫu nhiên cùng shape với MNIST thay cho MNIST (chạy offline, --synthetic)
+    'synthetic': False,
+    # Chia dữ liệu cho clients trong DATA_RANGES_INFO:
+    # 'iid', 'label_range' (mỗi label chia đều cho các clients được phép giữ
+    # label đó) hoặc 'dirichlet' (tỉ lệ theo Dirichlet(alpha), alpha nhỏ = non-IID hơn)
+    'partition': {
+        'scheme': 'label_range',
+        'alpha': 0.5,
+        'seed': RANDOM_SEED,
+    },
+}
+
+# CPU configuration cho các process chạy chung một host
+CPU_CONFIG = {
+    # 'auto' = chia đều cores của host cho các clients cùng phase,
+    # None = giữ mặc định của TensorFlow (dùng toàn bộ cores)
+    'client_threads': 'auto',
+    'server_threads': None,
+    'inter_op_threads': 1,
+    'pin_cores': False,  # Gắn mỗi client vào một nhóm cores riêng (Linux)
+    # Decode/aggregate updates trên server bằng thread pool (NumPy nhả GIL):
+    # None = số cores khả dụng, 1 = chạy tuần tự
+    'aggregation_threads': None,
+    # Số phần tử mỗi chunk khi cộng dồn buffer phẳng (chia chunk cố định, không
+    # phụ thuộc số threads, nên kết quả giống hệt nhau từng bit)
+    'aggregation_chunk_size': 1 << 16,
 }
 
 # Model configuration
@@ -159,6 +259,17 @@ API_CONFIG = {
     },
     'max_request_size': 16 * 1024 * 1024,  # 16MB
     'allowed_extensions': ['png', 'jpg', 'jpeg'],
+    # Xoá nền ảnh bằng rembg trước khi nhận dạng (cần model u2net)
+    'remove_background': True,
+    # Số models giữ trong bộ nhớ cho /recognize?model= và /compare (LRU)
+    'model_cache_size': 8,
+    # Số results logs /model-stats giữ trạng thái tail trong bộ nhớ (LRU)
+    'model_stats_cache_size': 32,
+    # Giới hạn của một request /compare
+    'compare_max_models': 8,
+    'compare_max_images': 64,
+    # Serve bản int8 đã publish (nếu có và khớp hash của model) thay cho model float32
+    'serve_quantized': True,
 }
 
 # Logging configuration
@@ -208,6 +319,45 @@ MONITOR_CONFIG = {
     'metrics_interval': 5,  # seconds
     'save_system_metrics': True,
     'monitoring_dir': os.path.join(BASE_DIR, 'monitoring'),
+    # File metrics xoay vòng: kích thước tối đa mỗi file và số file cũ giữ lại
+    'max_file_bytes': 5 * 1024 * 1024,
+    'backup_count': 3,
+}
+
+# Profiling theo yêu cầu cho 'fit' (client), 'aggregate_fit' (server), 'recognize' (API).
+# Env ghi đè khi process khởi động: FL_PROFILE=fit,recognize (hoặc 'all'),
+# FL_PROFILE_SAMPLE_RATE=0.1, FL_PROFILE_TF=1. Tắt = không bọc hàm nào (zero overhead).
+PROFILING_CONFIG = {
+    'components': [],
+    'sample_rate': 1.0,  # tỉ lệ rounds/requests được profile
+    'tracemalloc': True,
+    'tracemalloc_top': 25,  # số dòng allocation lớn nhất được ghi
+    'cprofile_top': 40,  # số hàm (theo cumulative time) trong bản tóm tắt .txt
+    'tf_profiler': False,  # thêm trace của TF profiler (xem bằng TensorBoard)
+    'output_dir': os.path.join(MONITOR_CONFIG['monitoring_dir'], 'profiles'),
+}
+
+# Hierarchical aggregation (--edge): mỗi edge aggregator là Flower server cho một
+# nhóm clients và là một client của server gốc (gửi một update đã tổng hợp mỗi round)
+EDGE_CONFIG = {
+    'listen_address': '127.0.0.1:8081',  # Địa chỉ clients của nhóm kết nối tới
+    'root_address': '127.0.0.1:8080',  # Server gốc
+    'group_size': 2,  # Số clients của nhóm (đợi đủ trước mỗi round)
+    'round_timeout': None,  # Seconds cho fit/evaluate của nhóm (None = không giới hạn)
+}
+
+# Simulation configuration (--mode simulate)
+SIMULATION_CONFIG = {
+    'num_clients': 10,
+    'num_rounds': 5,
+    'max_workers': None,  # None = số CPU cores
+    'latency': 0.0,  # seconds thêm vào mỗi lần fit/evaluate của client
+    'latency_jitter': 0.0,  # seconds, ngẫu nhiên đều trong [0, jitter]
+    'dropout_rate': 0.0,  # xác suất một client bị drop trong một lần fit
+    'target_accuracy': 0.95,  # ngưỡng để đo time-to-accuracy
+    'seed': 42,
+    'partition': 'iid',  # 'iid' hoặc 'dirichlet' (alpha: DATA_CONFIG['partition']['alpha'])
+    'results_dir': os.path.join(MONITOR_CONFIG['monitoring_dir'], 'simulation'),
 }
 
 # Testing configuration
@@ -226,24 +376,21 @@ for directory in [MODEL_DIR, RESULTS_CONFIG['save_dir'], MONITOR_CONFIG['monitor
 SECURE_AGG_CONFIG = {
     # Security parameters
     'min_clients_for_unmasking': 2,  # Số clients tối thiểu để unmask
-    'key_size': 2048,  # RSA key size
-    'mask_scale': 0.1,  # Scale factor cho masks
+    # Masking trong vành Z_2^32: weights được clip về [-clip_value, clip_value] và lượng
+    # tử hoá fixed point với fixed_point_scale (độ phân giải 1/scale). Tổng có trọng số
+    # phải vừa int32: Σ num_examples * clip_value * fixed_point_scale < 2^31
+    'fixed_point_scale': 2 ** 14,
+    'clip_value': 1.0,
     
     # Timeouts
     'key_exchange_timeout': 30,  # Seconds
     'masking_timeout': 30,
     
-    # Paths
-    'key_storage': os.path.join(BASE_DIR, 'keys'),
-    
     # Thresholds
     'dropout_threshold': 0.5,  # Max allowed dropout rate
+    # Ngưỡng Shamir = ceil(n * (1 - dropout_threshold)) (tối thiểu min_clients_for_unmasking):
+    # đủ survivors theo ngưỡng dropout là khôi phục được masks của clients bị drop
     
     # Features
     'enable_dropout_recovery': True,
-    'enable_key_rotation': True,
-    'rotation_frequency': 10  # Rounds
-}
-
-# Create key storage directory
-os.makedirs(SECURE_AGG_CONFIG['key_storage'], exist_ok=True)
\ No newline at end of file
+}
\ No newline at end of file
@@ -0,0 +1,81 @@
+import os
+from .config import CPU_CONFIG, DATA_CONFIG
+
+
+def get_available_cores():
+    """Danh sách cores process được phép dùng (tôn trọng affinity/cgroup nếu có)."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def compute_thread_budget(colocated_clients, cores=None):
+    """Số threads cho mỗi process khi `colocated_clients` process chạy chung host."""
+    cores = cores if cores is not None else get_available_cores()
+    return max(1, len(cores) // max(1, colocated_clients))
+
+
+def assign_cores(slot, threads, cores=None):
+    """Chọn nhóm `threads` cores liên tiếp cho process thứ `slot`."""
+    cores = cores if cores is not None else get_available_cores()
+    start = (slot * threads) % len(cores)
+    return [cores[(start + i) % len(cores)] for i in range(min(threads, len(cores)))]
+
+
+def parse_threads(value):
+    """Argparse type cho số threads: số nguyên, 'auto' hoặc 'default' (giữ mặc định TF)."""
+    if value in ('auto', None):
+        return value
+    if value == 'default':
+        return None
+    threads = int(value)
+    if threads < 1:
+        raise ValueError("Number of threads must be at least 1")
+    return threads
+
+
+def configure_cpu(threads=None, inter_op_threads=None, pin_cores=False, slot=0,
+                  colocated_clients=None, mode='initial'):
+    """Giới hạn thread pools của TensorFlow và (tuỳ chọn) gắn process vào cores.
+
+    `threads` là số intra-op threads; 'auto' chia đều cores cho
+    `colocated_clients` process (mặc định `DATA_CONFIG['num_clients'][mode]`).
+    Phải gọi trước khi TensorFlow chạy op đầu tiên (trước khi tạo model).
+    """
+    cores = get_available_cores()
+    if colocated_clients is None:
+        colocated_clients = DATA_CONFIG['num_clients'].get(mode, 1)
+    if threads == 'auto':
+        threads = compute_thread_budget(colocated_clients, cores)
+    if inter_op_threads is None:
+        inter_op_threads = CPU_CONFIG['inter_op_threads']
+
+    settings = {
+        'available_cores': len(cores),
+        'intra_op_threads': threads,
+        'inter_op_threads': inter_op_threads if threads is not None else None,
+        'pinned_cores': None,
+    }
+    if threads is None:
+        return settings
+
+    # Import muộn: parse_threads/get_available_cores dùng được mà không cần load TF
+    import tensorflow as tf
+
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError as e:
+        # TF context đã được khởi tạo, không thể đổi thread pools nữa
+        print(f"Warning: could not apply TensorFlow thread settings: {e}")
+        settings['intra_op_threads'] = settings['inter_op_threads'] = None
+
+    if pin_cores:
+        if hasattr(os, 'sched_setaffinity'):
+            pinned = assign_cores(slot, threads, cores)
+            os.sched_setaffinity(0, pinned)
+            settings['pinned_cores'] = pinned
+        else:
+            print("Warning: CPU pinning is not supported on this platform")
+
+    return settings
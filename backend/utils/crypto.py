@@ -1,18 +1,24 @@
 import os
+import secrets
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import x25519
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives import serialization
 import numpy as np
+from .config import SECURE_AGG_CONFIG
+from .parameters import ParameterVector
+
+# Trường nguyên tố cho Shamir secret sharing (Mersenne prime 2^521 - 1 > mọi secret 64 bytes)
+SHARE_PRIME = 2 ** 521 - 1
+SHARE_BYTES = 66
+PRIVATE_KEY_BYTES = 32
 
 class CryptoUtils:
     @staticmethod
     def generate_keypair():
-        """Generate RSA key pair for client authentication"""
-        private_key = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=2048
-        )
+        """Generate X25519 key pair (key agreement cho pairwise masks)"""
+        private_key = x25519.X25519PrivateKey.generate()
         public_key = private_key.public_key()
         return private_key, public_key
 
@@ -30,14 +36,40 @@ class CryptoUtils:
         return serialization.load_pem_public_key(key_bytes)
 
     @staticmethod
-    def generate_shared_key(private_key, peer_public_key):
-        """Generate shared key using private key and peer's public key"""
-        shared_secret = os.urandom(32)  # In practice, use proper key agreement
-        return shared_secret
+    def serialize_private_key(private_key):
+        """Raw 32 bytes của X25519 private key (dùng làm secret để chia shares)"""
+        return private_key.private_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PrivateFormat.Raw,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+
+    @staticmethod
+    def deserialize_private_key(key_bytes):
+        return x25519.X25519PrivateKey.from_private_bytes(key_bytes)
+
+    @staticmethod
+    def generate_shared_key(private_key, peer_public_key, info=b'pairwise-mask'):
+        """Generate shared key using private key and peer's public key (X25519 + HKDF).
+
+        Hai phía của một cặp luôn nhận cùng key; `info` tách key cho từng mục đích
+        (mask, mã hoá shares).
+        """
+        return HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=info
+        ).derive(private_key.exchange(peer_public_key))
 
     @staticmethod
     def generate_mask(shared_key, round_id, shape):
-        """Generate deterministic mask for model updates"""
+        """Generate deterministic mask for model updates.
+
+        Mask là các phần tử ngẫu nhiên đều của vành Z_2^32 (uint32): cộng/trừ có
+        wrap-around nên masks của một cặp triệt tiêu chính xác. `shape` thường là
+        `ParameterVector.size` để sinh một mask phẳng duy nhất cho toàn bộ model.
+        """
         # Use shared key and round ID to seed PRNG
         seed = int.from_bytes(
             HKDF(
@@ -50,15 +82,89 @@ class CryptoUtils:
         )
         
         # Generate random mask with same shape as model update
-        rng = np.random.RandomState(seed)
-        return rng.normal(0, 0.1, size=shape).astype(np.float32)
+        # (Generator nhận seed 256-bit, RandomState chỉ nhận 32-bit)
+        rng = np.random.default_rng(seed)
+        return rng.integers(0, 2 ** 32, size=shape, dtype=np.uint32)
+
+    @staticmethod
+    def quantize(values, weight=1):
+        """Fixed point trong vành Z_2^32: `round(clip(x) * scale) * weight` (bù 2, uint32).
+
+        Tổng của các clients phải nằm trong int32: `Σ weight * clip_value *
+        fixed_point_scale < 2^31`.
+        """
+        clip = np.float32(SECURE_AGG_CONFIG['clip_value'])
+        fixed = np.clip(values, -clip, clip)
+        fixed *= np.float32(SECURE_AGG_CONFIG['fixed_point_scale'])
+        ring = np.rint(fixed).astype(np.int32).view(np.uint32)
+        ring *= np.uint32(weight)  # Nhân trong vành (wrap-around)
+        return ring
+
+    @staticmethod
+    def dequantize(ring, total_weight=1):
+        """Tổng trong vành -> float32, chia cho `fixed_point_scale * total_weight`."""
+        values = ring.view(np.int32).astype(np.float64)
+        values /= float(SECURE_AGG_CONFIG['fixed_point_scale']) * total_weight
+        return values.astype(np.float32)
+
+    @staticmethod
+    def ring_capacity(total_weight):
+        """True nếu tổng có trọng số `total_weight` chắc chắn không tràn int32."""
+        bound = total_weight * SECURE_AGG_CONFIG['clip_value'] * SECURE_AGG_CONFIG['fixed_point_scale']
+        return bound < 2 ** 31
 
     @staticmethod
     def apply_mask(weights, mask):
         """Apply mask to model weights"""
+        if isinstance(weights, ParameterVector):
+            return weights.like(weights.buffer + mask)
         return [w + m for w, m in zip(weights, mask)]
 
     @staticmethod
     def remove_mask(weights, mask):
         """Remove mask from model weights"""
-        return [w - m for w, m in zip(weights, mask)]
\ No newline at end of file
+        if isinstance(weights, ParameterVector):
+            return weights.like(weights.buffer - mask)
+        return [w - m for w, m in zip(weights, mask)]
+
+    @staticmethod
+    def split_secret(secret, num_shares, threshold):
+        """Shamir secret sharing: `num_shares` shares (x = 1..n), cần `threshold` để khôi phục."""
+        if not 1 <= threshold <= num_shares:
+            raise ValueError(f"Invalid threshold {threshold} for {num_shares} shares")
+        coefficients = [int.from_bytes(secret, 'big')] + [
+            secrets.randbelow(SHARE_PRIME) for _ in range(threshold - 1)
+        ]
+        shares = []
+        for x in range(1, num_shares + 1):
+            y = 0
+            for coefficient in reversed(coefficients):  # Horner
+                y = (y * x + coefficient) % SHARE_PRIME
+            shares.append((x, y))
+        return shares
+
+    @staticmethod
+    def combine_shares(shares, length):
+        """Khôi phục secret (`length` bytes) từ ít nhất `threshold` shares (Lagrange tại x = 0)."""
+        secret = 0
+        for i, (xi, yi) in enumerate(shares):
+            numerator, denominator = 1, 1
+            for j, (xj, _) in enumerate(shares):
+                if i != j:
+                    numerator = numerator * -xj % SHARE_PRIME
+                    denominator = denominator * (xi - xj) % SHARE_PRIME
+            secret = (secret + yi * numerator * pow(denominator, -1, SHARE_PRIME)) % SHARE_PRIME
+        return secret.to_bytes(length, 'big')
+
+    @staticmethod
+    def encrypt_share(shared_key, share, context):
+        """Mã hoá một share (AES-GCM) để server chỉ chuyển tiếp mà không đọc được."""
+        x, y = share
+        nonce = os.urandom(12)
+        plaintext = x.to_bytes(4, 'big') + y.to_bytes(SHARE_BYTES, 'big')
+        return nonce + AESGCM(shared_key).encrypt(nonce, plaintext, context)
+
+    @staticmethod
+    def decrypt_share(shared_key, ciphertext, context):
+        plaintext = AESGCM(shared_key).decrypt(ciphertext[:12], ciphertext[12:], context)
+        return int.from_bytes(plaintext[:4], 'big'), int.from_bytes(plaintext[4:], 'big')
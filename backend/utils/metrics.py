@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import bisect
+import resource
+import threading
+from datetime import datetime
+from .config import MONITOR_CONFIG
+
+# Buckets mặc định (giây) cho latency/duration
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, lock):
+        self.name = name
+        self.help = help_text
+        self._lock = lock
+        self._values = {}
+
+    def _render_header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        return self._render_header() + [
+            f'{self.name}{_format_labels(key)} {value}' for key, value in self._values.items()
+        ]
+
+    def snapshot(self):
+        return {_format_labels(key) or '': value for key, value in self._values.items()}
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, lock, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, lock)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        lines = self._render_header()
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{self.name}_bucket{_format_labels(key, [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {cumulative}')
+        return lines
+
+    def snapshot(self):
+        return {
+            _format_labels(key) or '': {'count': sum(counts), 'sum': total}
+            for key, (counts, total) in self._values.items()
+        }
+
+
+class MetricsRegistry:
+    """Tập metrics của một process; `render()` xuất theo Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, threading.Lock(), **kwargs)
+            return metric
+
+    def counter(self, name, help_text):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            with metric._lock:
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        result = {}
+        for metric in metrics:
+            with metric._lock:
+                result[metric.name] = metric.snapshot()
+        return result
+
+
+def read_process_stats():
+    """(cpu seconds, RSS bytes, số OS threads) của process hiện tại."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_seconds = usage.ru_utime + usage.ru_stime
+    rss, threads = usage.ru_maxrss * 1024, threading.active_count()
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith('Threads:'):
+                    threads = int(line.split()[1])
+    except OSError:
+        pass  # Không phải Linux: dùng peak RSS và số Python threads
+    return cpu_seconds, rss, threads
+
+
+class MetricsSampler(threading.Thread):
+    """Thread nền: cập nhật metrics của process mỗi `metrics_interval` giây và ghi
+    snapshot (JSON-lines) vào file xoay vòng `monitoring_dir/metrics/<component>_<pid>.jsonl`."""
+
+    def __init__(self, component, registry, interval=None):
+        super().__init__(name=f'metrics-sampler-{component}', daemon=True)
+        self.component = component
+        self.registry = registry
+        self.interval = interval or MONITOR_CONFIG['metrics_interval']
+        self.path = None
+        if MONITOR_CONFIG['save_system_metrics']:
+            metrics_dir = os.path.join(MONITOR_CONFIG['monitoring_dir'], 'metrics')
+            os.makedirs(metrics_dir, exist_ok=True)
+            self.path = os.path.join(metrics_dir, f'{component}_{os.getpid()}.jsonl')
+        self._stop_event = threading.Event()
+        self._cpu = registry.gauge('fl_process_cpu_percent', 'Process CPU usage over the last interval')
+        self._cpu_total = registry.gauge('fl_process_cpu_seconds_total', 'Total user and system CPU time')
+        self._rss = registry.gauge('fl_process_resident_memory_bytes', 'Resident set size')
+        self._threads = registry.gauge('fl_process_threads', 'Number of OS threads')
+
+    def sample(self, last=None):
+        cpu_seconds, rss, threads = read_process_stats()
+        now = time.perf_counter()
+        labels = {'component': self.component}
+        if last is not None:
+            elapsed = now - last[0]
+            self._cpu.set(100 * (cpu_seconds - last[1]) / elapsed if elapsed else 0.0, **labels)
+        self._cpu_total.set(cpu_seconds, **labels)
+        self._rss.set(rss, **labels)
+        self._threads.set(threads, **labels)
+        return now, cpu_seconds
+
+    def run(self):
+        last = self.sample()
+        while not self._stop_event.wait(self.interval):
+            last = self.sample(last)
+            if self.path is not None:
+                self._persist()
+
+    def _persist(self):
+        record = {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'component': self.component,
+            'metrics': self.registry.snapshot(),
+        }
+        try:
+            if (os.path.exists(self.path)
+                    and os.path.getsize(self.path) >= MONITOR_CONFIG['max_file_bytes']):
+                self._rotate()
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except OSError as e:
+            print(f"Warning: could not write metrics: {e}")
+
+    def _rotate(self):
+        """`x.jsonl` -> `x.1.jsonl` -> ... giữ tối đa `backup_count` file cũ."""
+        base = self.path[:-len('.jsonl')]
+        for i in range(MONITOR_CONFIG['backup_count'] - 1, 0, -1):
+            if os.path.exists(f'{base}.{i}.jsonl'):
+                os.replace(f'{base}.{i}.jsonl', f'{base}.{i + 1}.jsonl')
+        if MONITOR_CONFIG['backup_count'] > 0:
+            os.replace(self.path, f'{base}.1.jsonl')
+        else:
+            os.remove(self.path)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+_registry = MetricsRegistry()
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_registry():
+    return _registry
+
+
+def start_metrics(component):
+    """Bật sampler cho process (một lần); không làm gì nếu `MONITOR_CONFIG['enabled']` tắt."""
+    global _sampler
+    if not MONITOR_CONFIG['enabled'] or _sampler is not None:
+        return _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = MetricsSampler(component, _registry)
+            _sampler.start()
+        return _sampler
@@ -0,0 +1,231 @@
+import os
+import re
+import json
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from .config import MODEL_DIR, MODEL_INDEX_CONFIG
+from .weights_store import get_weights_store, model_key
+
+try:
+    import fcntl
+except ImportError:  # Windows: không có file lock, chỉ dựa vào os.replace
+    fcntl = None
+
+# 'global_model_round_12' -> series 'global_model', round 12
+ROUND_PATTERN = re.compile(r'^(?P<series>.+)_round_(?P<round>\d+)$')
+
+
+def _entry(key, path, timestamp, digest=None, size=None, nbytes=None, metadata=None):
+    """Một dòng trong index (`name` giữ dạng `<key>.keras` như API vẫn dùng)."""
+    metadata = metadata or {}
+    match = ROUND_PATTERN.match(key)
+    round_number = metadata.get('round')
+    if round_number is None and match:
+        round_number = int(match.group('round'))
+    return {
+        'name': f'{key}.keras',
+        'round': round_number,
+        'mode': metadata.get('mode'),
+        'accuracy': metadata.get('accuracy'),
+        'loss': metadata.get('loss'),
+        'size': size,
+        'nbytes': nbytes,
+        'hash': digest,
+        'timestamp': timestamp,
+        'last_modified': datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S'),
+        'path': path,
+    }
+
+
+class ModelIndex:
+    """Index `models/index.json` của mọi model đã lưu.
+
+    Mỗi lần lưu model, `record()` cập nhật index (read-modify-write dưới file
+    lock, ghi bằng `os.replace`). Index giữ sẵn model mới nhất và round mới
+    nhất của từng series (vd. `global_model`), nên reader không phải listdir,
+    stat từng file hay sort. Bản in-memory chỉ được đọc lại khi mtime của
+    index đổi; `watch()` chuyển việc kiểm tra đó sang một thread nền.
+    """
+
+    def __init__(self, path=None, model_dir=None, store=None):
+        self.path = path or MODEL_INDEX_CONFIG['path']
+        self.model_dir = model_dir or MODEL_DIR
+        self._store = store
+        self._lock = threading.Lock()
+        self._data = None
+        self._mtime = None
+        self._watcher = None
+        self._stop = threading.Event()
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_weights_store()
+        return self._store
+
+    # ---- Đọc ----
+
+    def snapshot(self):
+        """Dict index hiện tại (chỉ đọc). Khi watcher chạy, không tốn I/O nào."""
+        if self._watcher is None or self._data is None:
+            self.refresh()
+        return self._data
+
+    def refresh(self):
+        """Đọc lại index nếu file đã đổi (một lần stat); tạo index nếu chưa có."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self.rebuild()
+            return
+        if mtime != self._mtime:
+            with self._lock:
+                self._load()
+
+    def _load(self):
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        self._data, self._mtime = data, os.stat(self.path).st_mtime_ns
+
+    def get(self, name):
+        return self.snapshot()['models'].get(model_key(name))
+
+    def __contains__(self, name):
+        return model_key(name) in self.snapshot()['models']
+
+    def entries(self):
+        return list(self.snapshot()['models'].values())
+
+    def latest(self):
+        """Entry được lưu gần nhất, hoặc None."""
+        data = self.snapshot()
+        return data['models'].get(data['latest']) if data['latest'] else None
+
+    def latest_round(self, series='global_model'):
+        """Entry có round lớn nhất của series (vd. `global_model_round_N`), hoặc None."""
+        data = self.snapshot()
+        key = data['latest_round'].get(series)
+        return data['models'].get(key) if key else None
+
+    # ---- Ghi ----
+
+    def record(self, name, digest=None, size=None, nbytes=None, path=None, metadata=None):
+        """Thêm/cập nhật entry của `name` và ghi lại index (atomic)."""
+        key = model_key(name)
+        timestamp = datetime.now().timestamp()
+        entry = _entry(key, path or self.store.manifest_path(key), timestamp,
+                       digest, size, nbytes, metadata)
+        with self._locked() as data:
+            data['models'][key] = entry
+        return entry
+
+    def remove(self, name):
+        with self._locked() as data:
+            data['models'].pop(model_key(name), None)
+
+    def rebuild(self):
+        """Dựng lại index từ weights store và các file .keras cũ."""
+        with self._locked(scan=True):
+            pass
+
+    def _scan(self):
+        models = {}
+        for file in os.listdir(self.model_dir):
+            if file.endswith('.keras'):
+                path = os.path.join(self.model_dir, file)
+                models[model_key(file)] = _entry(
+                    model_key(file), path, os.path.getmtime(path),
+                    nbytes=os.path.getsize(path)
+                )
+        for key in self.store.names():
+            manifest = self.store.manifest(key)
+            path = self.store.manifest_path(key)
+            models[key] = _entry(
+                key, path, os.path.getmtime(path), manifest['hash'],
+                manifest['size'], manifest['nbytes'], manifest['metadata']
+            )
+        return models
+
+    @contextmanager
+    def _locked(self, scan=False):
+        """Read-modify-write index dưới file lock (giữa các process); ghi khi thoát."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f'{self.path}.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if scan or not os.path.exists(self.path):
+                    models = self._scan()
+                else:
+                    with open(self.path, 'r') as f:
+                        models = json.load(f)['models']
+                yield {'models': models}
+                self._write(models)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write(self, models):
+        latest = max(models, key=lambda k: models[k]['timestamp'], default=None)
+        latest_round, rounds = {}, {}
+        for key in models:
+            match = ROUND_PATTERN.match(key)
+            if not match:
+                continue
+            series, round_number = match.group('series'), int(match.group('round'))
+            if round_number > rounds.get(series, -1):
+                latest_round[series], rounds[series] = key, round_number
+
+        data = {
+            'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'latest': latest,
+            'latest_round': latest_round,
+            'models': models,
+        }
+        tmp_path = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, self.path)
+        with self._lock:
+            self._data, self._mtime = data, os.stat(self.path).st_mtime_ns
+
+    # ---- Watcher ----
+
+    def watch(self, interval=None):
+        """Chạy thread nền kiểm tra index mỗi `interval` giây; reader dùng bản in-memory."""
+        if self._watcher is not None:
+            return
+        interval = interval or MODEL_INDEX_CONFIG['watch_interval']
+        self.refresh()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh()
+                except (OSError, ValueError) as e:
+                    print(f"Warning: could not refresh model index: {e}")
+
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._stop.clear()
+            self._watcher = threading.Thread(target=run, name='model-index-watcher', daemon=True)
+            self._watcher.start()
+
+    def stop(self):
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+
+_default_index = None
+
+
+def get_model_index():
+    """ModelIndex mặc định tại `MODEL_INDEX_CONFIG['path']` (tạo một lần mỗi process)."""
+    global _default_index
+    if _default_index is None:
+        _default_index = ModelIndex()
+    return _default_index
@@ -0,0 +1,253 @@
+import io
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from flwr.common import Parameters
+from .config import CPU_CONFIG
+from .cpu import get_available_cores
+
+
+class ParameterVector:
+    """Flat contiguous float32 buffer chứa toàn bộ weights của model.
+
+    Mỗi layer là một view (zero-copy) vào `buffer`, xác định bởi bảng `shapes`.
+    Masking, aggregation và serialization đều chạy trên buffer phẳng này thay vì
+    trên list các ndarray riêng lẻ. Masked updates của secure aggregation dùng
+    `dtype=np.uint32` (fixed point trong vành Z_2^32).
+    """
+
+    TENSOR_TYPE = "numpy.ndarray"
+
+    def __init__(self, buffer, shapes, dtype=np.float32):
+        self.shapes = [tuple(int(d) for d in shape) for shape in shapes]
+        sizes = [int(np.prod(shape, dtype=np.int64)) for shape in self.shapes]
+        self.offsets = np.concatenate(([0], np.cumsum(sizes, dtype=np.int64)))
+
+        # Chỉ copy khi buffer chưa đúng dtype và contiguous
+        self.buffer = np.ascontiguousarray(buffer, dtype=dtype).reshape(-1)
+        if self.buffer.size != self.offsets[-1]:
+            raise ValueError(
+                f"Buffer size {self.buffer.size} does not match layer shapes "
+                f"(expected {int(self.offsets[-1])})"
+            )
+
+    @classmethod
+    def zeros(cls, shapes, dtype=np.float32):
+        """Tạo vector toàn số 0 với bảng shape cho trước."""
+        size = sum(int(np.prod(shape, dtype=np.int64)) for shape in shapes)
+        return cls(np.zeros(size, dtype=dtype), shapes, dtype)
+
+    @classmethod
+    def from_ndarrays(cls, arrays):
+        """Gom list ndarray (ví dụ `model.get_weights()`) vào một buffer duy nhất."""
+        vector = cls.zeros([a.shape for a in arrays])
+        return vector.assign(arrays)
+
+    @classmethod
+    def from_parameters(cls, parameters, out=None, dtype=np.float32):
+        """Decode Flower `Parameters` thẳng vào buffer phẳng.
+
+        Mỗi tensor được đọc qua `np.frombuffer` (không tạo ndarray trung gian) và
+        copy một lần vào buffer. Nếu truyền `out`, dữ liệu được ghi vào vector đó.
+        Raise ValueError nếu shapes không khớp `out` hoặc dtype của tensor không
+        chuyển được sang dtype của buffer (same_kind).
+        """
+        headers = [_read_npy_header(tensor) for tensor in parameters.tensors]
+        shapes = [shape for shape, _, _, _ in headers]
+        if out is None:
+            out = cls.zeros(shapes, dtype)
+        elif out.shapes != shapes:
+            raise ValueError("Parameters shapes do not match the output vector")
+
+        for i, (tensor, (shape, src_dtype, fortran_order, offset)) in enumerate(
+            zip(parameters.tensors, headers)
+        ):
+            count = int(np.prod(shape, dtype=np.int64))
+            src = np.frombuffer(tensor, dtype=src_dtype, count=count, offset=offset)
+            dst = out.layer(i)
+            if fortran_order:
+                src = src.reshape(shape[::-1]).T
+            else:
+                src = src.reshape(shape)
+            try:
+                np.copyto(dst, src, casting='same_kind')
+            except TypeError:
+                # Vd. update float32 gửi tới round secure aggregation (buffer uint32)
+                raise ValueError(
+                    f"Parameters dtype {src_dtype} cannot be decoded into {out.dtype} (layer {i})"
+                ) from None
+        return out
+
+    @classmethod
+    def from_parameters_list(cls, parameters_list, dtype=np.float32):
+        """Decode nhiều `Parameters` (mỗi client một vector) song song trên thread pool."""
+        return parallel_map(lambda parameters: cls.from_parameters(parameters, dtype=dtype),
+                            parameters_list)
+
+    @property
+    def size(self):
+        return self.buffer.size
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes
+
+    @property
+    def dtype(self):
+        return self.buffer.dtype
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def layer(self, i):
+        """View của layer thứ i (không copy)."""
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].reshape(self.shapes[i])
+
+    def to_ndarrays(self):
+        """List các view theo layer, dùng trực tiếp cho `model.set_weights()`."""
+        return [self.layer(i) for i in range(len(self.shapes))]
+
+    def to_parameters(self):
+        """Serialize sang Flower `Parameters` theo đúng định dạng .npy của Flower.
+
+        Mỗi tensor chỉ gồm header + dữ liệu lấy thẳng từ view của buffer.
+        """
+        tensors = []
+        for i in range(len(self.shapes)):
+            view = self.layer(i)
+            header = io.BytesIO()
+            np.lib.format.write_array_header_1_0(
+                header, np.lib.format.header_data_from_array_1_0(view)
+            )
+            # Bytes của layer qua view uint8 phẳng (memoryview.cast không nhận layer rỗng)
+            data = self.buffer[self.offsets[i]:self.offsets[i + 1]].view(np.uint8)
+            tensors.append(b"".join((header.getvalue(), data)))
+        return Parameters(tensors=tensors, tensor_type=self.TENSOR_TYPE)
+
+    def assign(self, arrays):
+        """Copy list ndarray vào buffer hiện có (in-place)."""
+        if len(arrays) != len(self.shapes):
+            raise ValueError(
+                f"Expected {len(self.shapes)} arrays, got {len(arrays)}"
+            )
+        for i, array in enumerate(arrays):
+            np.copyto(self.layer(i), array, casting='same_kind')
+        return self
+
+    def like(self, buffer):
+        """Tạo vector mới dùng chung bảng shape (và dtype) với buffer khác."""
+        return ParameterVector(buffer, self.shapes, self.dtype)
+
+    def copy(self):
+        return self.like(self.buffer.copy())
+
+    @staticmethod
+    def weighted_average(vectors, weights):
+        """Weighted average của nhiều vector, tính trên buffer phẳng.
+
+        Buffer được chia chunk và các chunk cộng dồn song song; trong mỗi chunk các
+        vector luôn được cộng theo thứ tự của `vectors`, nên kết quả không phụ thuộc
+        số threads (bit-reproducible với cùng thứ tự đầu vào).
+        """
+        shapes = _check_shapes(vectors)
+        total = float(sum(weights))
+        if total == 0:
+            raise ValueError("Sum of aggregation weights is zero")
+        scales = [weight / total for weight in weights]
+
+        result = np.empty(vectors[0].size, dtype=np.float32)
+
+        def accumulate(bounds):
+            start, stop = bounds
+            out = result[start:stop]
+            out.fill(0)
+            scratch = np.empty_like(out)
+            for vector, scale in zip(vectors, scales):
+                np.multiply(vector.buffer[start:stop], scale, out=scratch)
+                out += scratch
+
+        parallel_map(accumulate, _chunks(result.size))
+        return ParameterVector(result, shapes)
+
+    @staticmethod
+    def ring_sum(vectors):
+        """Tổng (uint32, có wrap-around) của các masked updates, cộng song song theo chunk."""
+        shapes = _check_shapes(vectors)
+        result = np.empty(vectors[0].size, dtype=np.uint32)
+
+        def accumulate(bounds):
+            start, stop = bounds
+            out = result[start:stop]
+            out.fill(0)
+            for vector in vectors:
+                out += vector.buffer[start:stop]
+
+        parallel_map(accumulate, _chunks(result.size))
+        return ParameterVector(result, shapes, np.uint32)
+
+
+def _check_shapes(vectors):
+    if not vectors:
+        raise ValueError("No parameter vectors to aggregate")
+    shapes = vectors[0].shapes
+    for vector in vectors[1:]:
+        if vector.shapes != shapes:
+            raise ValueError("Cannot aggregate vectors with different layer shapes")
+    return shapes
+
+
+def _chunks(size):
+    """Các khoảng [start, stop) cố định theo `aggregation_chunk_size`."""
+    chunk = CPU_CONFIG['aggregation_chunk_size']
+    return [(start, min(start + chunk, size)) for start in range(0, size, chunk)]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def aggregation_threads():
+    return CPU_CONFIG['aggregation_threads'] or len(get_available_cores())
+
+
+def _get_executor():
+    """Thread pool dùng chung của process (tạo lần đầu khi cần)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=aggregation_threads(),
+                                           thread_name_prefix='aggregate')
+        return _executor
+
+
+def parallel_map(fn, items):
+    """`[fn(x) for x in items]` trên thread pool, giữ nguyên thứ tự kết quả.
+
+    Chạy tuần tự khi chỉ có một item hoặc `aggregation_threads` là 1. `fn` không
+    được gọi lại `parallel_map` (pool có kích thước cố định).
+    """
+    items = list(items)
+    if len(items) <= 1 or aggregation_threads() <= 1:
+        return [fn(item) for item in items]
+    return list(_get_executor().map(fn, items))
+
+
+def parameters_digest(parameters):
+    """Digest (hex) của Flower `Parameters`, tính thẳng trên bytes đã serialize."""
+    h = hashlib.blake2b(digest_size=16)
+    for tensor in parameters.tensors:
+        h.update(len(tensor).to_bytes(8, 'little'))
+        h.update(tensor)
+    return h.hexdigest()
+
+
+def _read_npy_header(tensor):
+    """Đọc header .npy, trả về (shape, dtype, fortran_order, data_offset)."""
+    stream = io.BytesIO(tensor)
+    version = np.lib.format.read_magic(stream)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+    return shape, dtype, fortran_order, stream.tell()
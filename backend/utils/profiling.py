@@ -0,0 +1,131 @@
+import os
+import io
+import random
+import pstats
+import cProfile
+import functools
+import threading
+import tracemalloc
+from datetime import datetime
+from .config import PROFILING_CONFIG
+
+COMPONENTS = ('fit', 'aggregate_fit', 'recognize')
+
+_rng = random.Random()
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+_tf_profiler_lock = threading.Lock()
+
+
+def profiling_settings():
+    """PROFILING_CONFIG sau khi áp dụng các biến môi trường FL_PROFILE*."""
+    settings = dict(PROFILING_CONFIG)
+    components = os.environ.get('FL_PROFILE')
+    if components is not None:
+        components = [c.strip() for c in components.split(',') if c.strip()]
+        settings['components'] = list(COMPONENTS) if 'all' in components else components
+    if 'FL_PROFILE_SAMPLE_RATE' in os.environ:
+        settings['sample_rate'] = float(os.environ['FL_PROFILE_SAMPLE_RATE'])
+    if 'FL_PROFILE_TF' in os.environ:
+        settings['tf_profiler'] = os.environ['FL_PROFILE_TF'].lower() in ('1', 'true', 'yes')
+    return settings
+
+
+def profiled(component, tag=None):
+    """Decorator profile `component` cho một phần các lần gọi (theo `sample_rate`).
+
+    `tag(*args, **kwargs)` trả về phần tên file (vd. 'round3', 'req1a2b'). Nếu
+    component không được bật lúc import, trả về đúng hàm gốc: không có overhead.
+    """
+    def decorator(fn):
+        settings = profiling_settings()
+        if component not in settings['components']:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _rng.random() >= settings['sample_rate']:
+                return fn(*args, **kwargs)
+            name = f"{component}_{tag(*args, **kwargs)}" if tag else component
+            with ProfileSession(name, settings):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class ProfileSession:
+    """cProfile (thread hiện tại) + tracemalloc + TF profiler (tuỳ chọn) cho một lần chạy.
+
+    Kết quả trong `output_dir`: `<name>_<timestamp>.prof` (pstats),
+    `.txt` (top hàm theo cumulative time và top allocations), thư mục `_tf/`.
+    """
+
+    def __init__(self, name, settings=None):
+        self.settings = settings or profiling_settings()
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        self.prefix = os.path.join(self.settings['output_dir'], f'{name}_{timestamp}')
+        self.profiler = cProfile.Profile()
+        self.tf_trace = False
+
+    def __enter__(self):
+        os.makedirs(self.settings['output_dir'], exist_ok=True)
+        if self.settings['tracemalloc']:
+            _start_tracemalloc()
+        # TF profiler là global: chỉ một session được trace tại một thời điểm
+        if self.settings['tf_profiler'] and _tf_profiler_lock.acquire(blocking=False):
+            import tensorflow as tf
+            tf.profiler.experimental.start(f'{self.prefix}_tf')
+            self.tf_trace = True
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.disable()
+        if self.tf_trace:
+            import tensorflow as tf
+            tf.profiler.experimental.stop()
+            _tf_profiler_lock.release()
+        snapshot = None
+        if self.settings['tracemalloc']:
+            snapshot = tracemalloc.take_snapshot()
+            _stop_tracemalloc()
+
+        self.profiler.dump_stats(f'{self.prefix}.prof')
+        with open(f'{self.prefix}.txt', 'w') as f:
+            f.write(self._cprofile_summary())
+            if snapshot is not None:
+                f.write(self._tracemalloc_summary(snapshot))
+        return False
+
+    def _cprofile_summary(self):
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(self.settings['cprofile_top'])
+        return stream.getvalue()
+
+    def _tracemalloc_summary(self, snapshot):
+        lines = [f"\nTop {self.settings['tracemalloc_top']} allocations (tracemalloc)\n"]
+        for stat in snapshot.statistics('lineno')[:self.settings['tracemalloc_top']]:
+            lines.append(f"{stat}\n")
+        return ''.join(lines)
+
+
+def _start_tracemalloc():
+    """tracemalloc là global: đếm số session đang dùng để chỉ bật/tắt một lần
+    (không tắt nếu tracemalloc đã được bật từ trước bởi code khác)."""
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0:
+            _tracemalloc_owned = not tracemalloc.is_tracing()
+            if _tracemalloc_owned:
+                tracemalloc.start()
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
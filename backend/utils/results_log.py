@@ -0,0 +1,95 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+
+class ResultsLog:
+    """Log kết quả training dạng JSON-lines, mỗi dòng một record.
+
+    - `start` (đầu mỗi lần chạy, file được thay bằng file mới)
+    - `round` (ghi ngay khi round xong: metrics toàn cục, metrics và thời gian
+      của từng client)
+    - `summary` (cuối lần chạy: thông tin clients và thống kê dataset)
+
+    Mỗi record được flush + fsync ngay nên server crash giữa chừng vẫn giữ
+    được lịch sử các round đã xong.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def start(self, **info):
+        # Ghi ra file tạm rồi os.replace: lần chạy mới có inode mới nên reader đang
+        # tail không đọc tiếp từ offset cũ vào giữa một dòng của file mới
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        self._write({'type': 'start', **info}, mode='w', path=tmp_path)
+        os.replace(tmp_path, self.path)
+
+    def append(self, record_type, record):
+        self._write({'type': record_type, **record}, mode='a')
+
+    def _write(self, record, mode, path=None):
+        record.setdefault('timestamp', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        line = json.dumps(record) + '\n'
+        with open(path or self.path, mode) as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class ResultsLogTail:
+    """Đọc tăng dần một `ResultsLog`: mỗi lần `poll()` chỉ parse các dòng mới.
+
+    Giữ offset đã đọc; dòng chưa ghi xong (thiếu '\\n') để lại cho lần sau, dòng
+    không parse được bị bỏ qua. Khi file bị thay thế (lần chạy mới) hoặc bị cắt
+    ngắn, trạng thái được reset qua `on_reset()`. Subclass xử lý từng record trong
+    `on_record()` (mặc định bỏ qua, như `on_reset()`).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._offset = 0
+        self._inode = None
+
+    def poll(self):
+        """Đọc các record mới; trả về True nếu có thay đổi."""
+        with self.lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return False
+
+            changed = False
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                self._inode, self._offset = stat.st_ino, 0
+                self.on_reset()
+                changed = True
+            if stat.st_size == self._offset:
+                return changed
+
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                chunk = f.read(stat.st_size - self._offset)
+            end = chunk.rfind(b'\n') + 1
+            for line in chunk[:end].splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    print(f"Warning: skipping malformed record in {self.path}")
+                    continue
+                self.on_record(record)
+            self._offset += end
+            return changed or end > 0
+
+    def on_reset(self):
+        """Log được thay thế hoặc cắt ngắn: bỏ trạng thái đã tích luỹ."""
+        pass
+
+    def on_record(self, record):
+        """Một record mới (dict) của log."""
+        pass
@@ -0,0 +1,125 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+import numpy as np
+from .config import WEIGHTS_STORE_CONFIG
+from .parameters import ParameterVector
+
+
+def model_key(name):
+    """Tên model trong store: bỏ thư mục và đuôi `.keras` (vd. 'global_model_round_3')."""
+    name = os.path.basename(name)
+    return name[:-len('.keras')] if name.endswith('.keras') else name
+
+
+class WeightsStore:
+    """Kho weights định danh theo nội dung (content hash).
+
+    - `objects/<hash>.npy`: buffer float32 phẳng, không nén, load bằng mmap.
+    - `manifests/<name>.json`: map tên (initial, round N, best, final...) sang hash
+      cùng bảng shape và metadata.
+
+    Weights giống nhau lưu dưới nhiều tên chỉ chiếm một object.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or WEIGHTS_STORE_CONFIG['dir']
+        self.objects_dir = os.path.join(self.root, 'objects')
+        self.manifests_dir = os.path.join(self.root, 'manifests')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+
+    @staticmethod
+    def compute_hash(vector):
+        h = hashlib.sha256()
+        h.update(json.dumps(vector.shapes).encode())
+        h.update(memoryview(vector.buffer).cast('B'))
+        return h.hexdigest()
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, f'{digest}.npy')
+
+    def manifest_path(self, name):
+        return os.path.join(self.manifests_dir, f'{model_key(name)}.json')
+
+    @staticmethod
+    def _atomic_write(path, write):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def put(self, name, vector, metadata=None):
+        """Lưu `vector` dưới tên `name`; object chỉ được ghi nếu hash chưa có."""
+        digest = self.compute_hash(vector)
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            self._atomic_write(object_path, lambda f: np.save(f, vector.buffer))
+
+        manifest = {
+            'name': model_key(name),
+            'hash': digest,
+            'shapes': vector.shapes,
+            'dtype': 'float32',
+            'size': int(vector.size),
+            'nbytes': int(vector.nbytes),
+            'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'metadata': metadata or {},
+        }
+        self._atomic_write(
+            self.manifest_path(name),
+            lambda f: f.write(json.dumps(manifest, indent=4).encode())
+        )
+        return digest
+
+    def manifest(self, name):
+        """Manifest của `name`, hoặc None nếu chưa có."""
+        path = self.manifest_path(name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def exists(self, name):
+        return os.path.exists(self.manifest_path(name))
+
+    def get(self, name, mmap=True):
+        """Load weights của `name` thành ParameterVector (buffer memory-mapped, read-only)."""
+        manifest = self.manifest(name)
+        if manifest is None:
+            raise ValueError(f"Model {model_key(name)} does not exist in weights store")
+        buffer = np.load(self._object_path(manifest['hash']), mmap_mode='r' if mmap else None)
+        return ParameterVector(buffer, manifest['shapes'])
+
+    def names(self):
+        return sorted(
+            f[:-len('.json')] for f in os.listdir(self.manifests_dir) if f.endswith('.json')
+        )
+
+    def delete(self, name):
+        """Xoá tên khỏi store (object được dọn bởi `gc`)."""
+        path = self.manifest_path(name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def gc(self):
+        """Xoá các object không còn manifest nào trỏ tới; trả về số object đã xoá."""
+        referenced = {self.manifest(name)['hash'] for name in self.names()}
+        removed = 0
+        for filename in os.listdir(self.objects_dir):
+            if filename.endswith('.npy') and filename[:-len('.npy')] not in referenced:
+                os.remove(os.path.join(self.objects_dir, filename))
+                removed += 1
+        return removed
+
+
+_default_store = None
+
+
+def get_weights_store():
+    """WeightsStore mặc định tại `WEIGHTS_STORE_CONFIG['dir']` (tạo một lần mỗi process)."""
+    global _default_store
+    if _default_store is None:
+        _default_store = WeightsStore()
+    return _default_store